@@ -10,7 +10,9 @@ DEBUG = False
 # Add WhiteNoise middleware if available
 try:
     import whitenoise
-    MIDDLEWARE.insert(1, 'whitenoise.middleware.WhiteNoiseMiddleware')
+    # Right after SecurityMiddleware
+    MIDDLEWARE.insert(MIDDLEWARE.index('django.middleware.security.SecurityMiddleware') + 1,
+                      'whitenoise.middleware.WhiteNoiseMiddleware')
     STATICFILES_STORAGE = 'whitenoise.storage.CompressedStaticFilesStorage'
     WHITENOISE_SKIP_COMPRESS_EXTENSIONS = ['jpg', 'jpeg', 'png', 'gif', 'webp', 'zip', 'gz', 'tgz', 'bz2', 'tbz', 'xz', 'br', 'map']
     WHITENOISE_USE_FINDERS = True
@@ -25,10 +27,21 @@ SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
 # Allow all hosts when behind proxy (nginx validates the host)
 ALLOWED_HOSTS = ['*']
 
-# Use SQLite with optimizations
+# Use SQLite with optimizations (pragmas are applied in price.sqlite)
 DATABASES['default'].update({
     'CONN_MAX_AGE': 60,
 })
+HISTORY_WRITE_QUEUE = os.getenv('HISTORY_WRITE_QUEUE', 'True').lower() == 'true'
+LEADER_ELECTION = os.getenv('LEADER_ELECTION', 'True').lower() == 'true'
+TRADES_INGESTION = os.getenv('TRADES_INGESTION', 'True').lower() == 'true'
+
+# JSON lines written by a listener thread, off the request path
+LOG_ASYNC = os.getenv('LOG_ASYNC', 'True').lower() == 'true'
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')
+LOGGING['handlers']['console'].update({
+    'class': 'price.logs.QueueStreamHandler' if LOG_ASYNC else 'logging.StreamHandler',
+    'formatter': 'json' if LOG_FORMAT == 'json' else 'simple',
+})
 
 # Session configuration
 SESSION_ENGINE = 'django.contrib.sessions.backends.db'
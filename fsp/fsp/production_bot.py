@@ -0,0 +1,14 @@
+"""
+Production settings for the Telegram bot container - only what telegrambot needs
+"""
+from .production import *
+
+# The bot serves no HTTP: no admin, auth, sessions, messages or static files
+INSTALLED_APPS = [
+    'price.apps.PriceConfig',
+    'telegrambot',
+]
+
+MIDDLEWARE = []
+
+TEMPLATES[0]['OPTIONS']['context_processors'] = []
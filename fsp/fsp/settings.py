@@ -1,4 +1,5 @@
 import os
+import sys
 from pathlib import Path
 import logging.config
 from dotenv import load_dotenv
@@ -46,10 +47,15 @@ if not DEBUG:
 # Sber Configuration
 SBER_STOCKS_QUANTITY = int(os.getenv('SBER_STOCKS_QUANTITY', '22586948000'))
 CBR_BASE_URL = os.getenv('CBR_BASE_URL', 'https://www.cbr.ru/banking_sector/credit/coinfo/f123/')
+# Dividend ex-dates for fair value adjustment: "YYYY-MM-DD:rub_per_share,..."
+SBER_DIVIDENDS = os.getenv('SBER_DIVIDENDS', '')
 
 # Cache Configuration - simple in-memory cache
 CACHE_TIMEOUT = int(os.getenv('CACHE_TIMEOUT', '60'))  # 1 minute default
 
+# State shared between processes and containers (lives on the db volume)
+STATE_DIR = Path(os.getenv('STATE_DIR', BASE_DIR / 'db'))
+
 
 # Application definition
 
@@ -65,15 +71,31 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so that profiles cover the whole middleware chain
+    'price.middleware.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'price.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
+    'price.middleware.AuthenticationMiddleware',
+    'price.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Sessions, auth and messages run only here; everything else is anonymous
+STATEFUL_PATH_PREFIXES = ['/admin/', '/ops/']
+
+# Fraction of requests and bot updates profiled (price.profiling), 0 disables sampling
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', '0'))
+# Token for /ops/ endpoints (X-Ops-Token header) and on-demand profiling (X-Profile header)
+OPS_TOKEN = os.getenv('OPS_TOKEN', '')
+
+# tracemalloc diffs, RSS and LocMemCache sizes per process (price.memory), see /ops/memory/
+MEMORY_DIAGNOSTICS = os.getenv('MEMORY_DIAGNOSTICS', 'False').lower() == 'true'
+MEMORY_SNAPSHOT_INTERVAL = int(os.getenv('MEMORY_SNAPSHOT_INTERVAL', '300'))
+# Frames kept per allocation: 1 is cheap, more gives tracebacks at extra cost
+MEMORY_TRACE_FRAMES = int(os.getenv('MEMORY_TRACE_FRAMES', '1'))
+
 ROOT_URLCONF = 'fsp.urls'
 
 TEMPLATES_DIR = BASE_DIR / 'templates'
@@ -104,9 +126,38 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db' / 'db.sqlite3',
+        'OPTIONS': {
+            # Busy timeout, seconds to wait for the write lock
+            'timeout': 10,
+            # Prepared statements kept per connection (sqlite3 default is 128)
+            'cached_statements': 256,
+        },
     }
 }
 
+# History inserts go through a per-process background writer (price.writer)
+HISTORY_WRITE_QUEUE = os.getenv('HISTORY_WRITE_QUEUE', 'False').lower() == 'true'
+
+# Ingest SBER trades into minute bars on every refresh (price.trades): VWAP and minute history
+TRADES_INGESTION = os.getenv('TRADES_INGESTION', 'False').lower() == 'true'
+MINUTE_BARS_RETENTION_DAYS = int(os.getenv('MINUTE_BARS_RETENTION_DAYS', '90'))
+
+# Internal nginx server re-fetching microcached pages after a data change, e.g.
+# http://nginx:8081 (price.microcache); empty disables the purge
+MICROCACHE_PURGE_URL = os.getenv('MICROCACHE_PURGE_URL', '')
+
+# Extra non-trading dates (YYYY-MM-DD, comma separated) on top of price.exchange holidays
+EXCHANGE_HOLIDAYS = os.getenv('EXCHANGE_HOLIDAYS', '')
+
+# Only the holder of the refresh lease fetches MOEX/CBR, other processes and
+# replicas read its published snapshot (price.leader)
+LEADER_ELECTION = os.getenv('LEADER_ELECTION', 'False').lower() == 'true'
+# database (SQLite row), file (flock under STATE_DIR) or redis (REDIS_URL)
+LEADER_LEASE_BACKEND = os.getenv('LEADER_LEASE_BACKEND', 'database')
+# A bit longer than the snapshot TTL: an active leader renews before it expires
+LEADER_LEASE_SECONDS = int(os.getenv('LEADER_LEASE_SECONDS', '150'))
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -154,16 +205,38 @@ STATICFILES_DIRS = [
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-# Cache Configuration - simple in-memory
+# Cache Configuration - simple in-memory, a file-based cache for transient
+# data shared between workers (circuit breakers, charts, profiles), culled
+# once it holds MAX_ENTRIES files, and a never culled one for durable state
+# (last known good snapshot, exchange calendar, HTTP validators)
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
         'LOCATION': 'fsp-cache',
         'TIMEOUT': CACHE_TIMEOUT,
-    }
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': STATE_DIR / 'cache',
+        'TIMEOUT': None,
+    },
+    'state': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': STATE_DIR / 'state',
+        'TIMEOUT': None,
+        # Culling deletes random entries; this cache only holds a handful of keys
+        'OPTIONS': {'MAX_ENTRIES': sys.maxsize},
+    },
 }
 
-# Logging Configuration - console only
+# Logging Configuration - console only. LOG_ASYNC moves formatting and writes
+# to a queue listener thread (price.logs); LOG_FORMAT is text or json; at most
+# LOG_RATE_LIMIT records of one message per LOG_RATE_WINDOW seconds (0 - no limit)
+LOG_ASYNC = os.getenv('LOG_ASYNC', 'False').lower() == 'true'
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')
+LOG_RATE_LIMIT = int(os.getenv('LOG_RATE_LIMIT', '30'))
+LOG_RATE_WINDOW = int(os.getenv('LOG_RATE_WINDOW', '60'))
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -172,12 +245,23 @@ LOGGING = {
             'format': '{levelname} {asctime} {message}',
             'style': '{',
         },
+        'json': {
+            '()': 'price.logs.JsonFormatter',
+        },
+    },
+    'filters': {
+        'rate_limit': {
+            '()': 'price.logs.RateLimitFilter',
+            'limit': LOG_RATE_LIMIT,
+            'window': LOG_RATE_WINDOW,
+        },
     },
     'handlers': {
         'console': {
             'level': 'INFO',
-            'class': 'logging.StreamHandler',
-            'formatter': 'simple',
+            'class': 'price.logs.QueueStreamHandler' if LOG_ASYNC else 'logging.StreamHandler',
+            'formatter': 'json' if LOG_FORMAT == 'json' else 'simple',
+            'filters': ['rate_limit'],
         },
     },
     'loggers': {
@@ -13,9 +13,11 @@ worker_connections = 1000
 timeout = 90
 keepalive = 2
 
-# Restart workers after this many requests, to prevent memory leaks
-max_requests = 1000
-max_requests_jitter = 50
+# Workers run indefinitely: recycling threw away the warm snapshot and caches.
+# Memory growth is tracked by price.memory (MEMORY_DIAGNOSTICS, /ops/memory/);
+# GUNICORN_MAX_REQUESTS is left as an emergency switch only.
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = 50 if max_requests else 0
 
 # Preload app for better performance
 preload_app = True
@@ -41,4 +43,39 @@ tmp_upload_dir = None
 # certfile = None
 
 # Performance tuning
-worker_tmp_dir = '/dev/shm'  # Use memory for temporary files
\ No newline at end of file
+worker_tmp_dir = '/dev/shm'  # Use memory for temporary files
+
+# Snapshot warm-up: the master loads the latest persisted snapshot once, before
+# the first fork, so workers inherit it copy-on-write. The master makes no
+# upstream calls and starts no threads; each new or recycled worker reloads the
+# snapshot file on its own and refreshes data that is about to expire in the
+# background instead of on a request.
+STALE_MARGIN_SECONDS = 30
+
+
+def when_ready(server):
+    if not server.cfg.preload_app:
+        return
+    from price.services import sber_service
+
+    try:
+        sber_service.warm()
+    except Exception as e:
+        server.log.warning("Snapshot warm-up failed: %s", e)
+
+
+def post_fork(server, worker):
+    if not server.cfg.preload_app:
+        return
+    from price.services import sber_service
+
+    sber_service.reset_after_fork()
+    sber_service.load_snapshot()
+    sber_service.refresh_in_background(margin=STALE_MARGIN_SECONDS)
+
+
+def post_worker_init(worker):
+    # After the app is loaded, with or without preload_app
+    from price.memory import memory_monitor
+
+    memory_monitor.start("web")
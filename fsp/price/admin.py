@@ -1,2 +1,32 @@
-# Simplified version - no models to register in admin
-# Admin panel is available only for Django built-in models (users, sessions, etc.)
+from django.contrib import admin
+
+from .models import LeaderLease, MinuteBar, PriceHistory, PriceRollup, TradeCursor
+
+
+@admin.register(PriceHistory)
+class PriceHistoryAdmin(admin.ModelAdmin):
+    list_display = ('timestamp', 'moex_price', 'fair_price', 'pb_ratio')
+    date_hierarchy = 'timestamp'
+
+
+@admin.register(PriceRollup)
+class PriceRollupAdmin(admin.ModelAdmin):
+    list_display = ('resolution', 'bucket_start', 'count', 'price_last', 'pb_min', 'pb_max', 'pb_last')
+    list_filter = ('resolution',)
+    date_hierarchy = 'bucket_start'
+
+
+@admin.register(LeaderLease)
+class LeaderLeaseAdmin(admin.ModelAdmin):
+    list_display = ('name', 'holder', 'expires_at')
+
+
+@admin.register(MinuteBar)
+class MinuteBarAdmin(admin.ModelAdmin):
+    list_display = ('timestamp', 'open', 'high', 'low', 'close', 'volume', 'trades')
+    date_hierarchy = 'timestamp'
+
+
+@admin.register(TradeCursor)
+class TradeCursorAdmin(admin.ModelAdmin):
+    list_display = ('name', 'tradeno', 'trade_date', 'updated_at')
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class PriceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'price'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from .sqlite import configure_connection
+        connection_created.connect(configure_connection)
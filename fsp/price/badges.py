@@ -0,0 +1,118 @@
+"""Embeddable "SBER P/B" badges for partner sites, SVG or PNG.
+
+A badge shows only P/B and its score, so it is rendered once per distinct
+value and kept in process memory together with its ETag: snapshot refreshes
+that do not move P/B keep the same body and ETag, and embeds revalidate with
+a 304 instead of downloading the image again.
+"""
+import hashlib
+import io
+from collections import namedtuple
+from typing import Dict, Optional, Tuple
+
+from .snapshot import CurrentSnapshot
+
+BADGE_LABEL = 'SBER P/B'
+BADGE_HEIGHT = 20
+# Scale of PNG badges, crisp on high density screens
+PNG_SCALE = 2
+SCORE_COLORS = {
+    'дешево': '#4c1',
+    'справедливо': '#007ec6',
+    'чуть дорого': '#dfb317',
+    'дорого': '#e05d44',
+}
+UNKNOWN_COLOR = '#9f9f9f'
+LABEL_COLOR = '#555'
+# Average Verdana 11px advance, close enough for short labels and numbers
+SVG_CHAR_WIDTH = 7
+SVG_PADDING = 6
+
+SVG_TEMPLATE = (
+    '<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" role="img" aria-label="{title}">'
+    '<title>{title}</title>'
+    '<linearGradient id="s" x2="0" y2="100%"><stop offset="0" stop-color="#bbb" stop-opacity=".1"/>'
+    '<stop offset="1" stop-opacity=".1"/></linearGradient>'
+    '<clipPath id="r"><rect width="{width}" height="{height}" rx="3" fill="#fff"/></clipPath>'
+    '<g clip-path="url(#r)"><rect width="{label_width}" height="{height}" fill="{label_color}"/>'
+    '<rect x="{label_width}" width="{value_width}" height="{height}" fill="{color}"/>'
+    '<rect width="{width}" height="{height}" fill="url(#s)"/></g>'
+    '<g fill="#fff" text-anchor="middle" font-family="Verdana,Geneva,DejaVu Sans,sans-serif" font-size="11">'
+    '<text x="{label_x}" y="14">{label}</text><text x="{value_x}" y="14">{value}</text></g></svg>'
+)
+
+Badge = namedtuple('Badge', 'key body etag content_type')
+
+
+class BadgeUnavailable(Exception):
+    """Badge can not be rendered: no Pillow for PNG"""
+
+
+def badge_text(snapshot: CurrentSnapshot) -> Tuple[str, str]:
+    """Value and color of the badge"""
+    if snapshot.pb_ratio is None:
+        return 'Н/Д', UNKNOWN_COLOR
+    return f'{snapshot.pb_ratio:.2f}', SCORE_COLORS.get(snapshot.price_score, UNKNOWN_COLOR)
+
+
+def render_svg(snapshot: CurrentSnapshot) -> bytes:
+    value, color = badge_text(snapshot)
+    label_width = len(BADGE_LABEL) * SVG_CHAR_WIDTH + 2 * SVG_PADDING
+    value_width = len(value) * SVG_CHAR_WIDTH + 2 * SVG_PADDING
+    return SVG_TEMPLATE.format(
+        width=label_width + value_width, height=BADGE_HEIGHT, label_width=label_width, value_width=value_width,
+        label_x=label_width / 2, value_x=label_width + value_width / 2, label_color=LABEL_COLOR, color=color,
+        label=BADGE_LABEL, value=value, title=f'{BADGE_LABEL}: {value} ({snapshot.price_score})',
+    ).encode()
+
+
+def render_png(snapshot: CurrentSnapshot) -> bytes:
+    try:
+        from PIL import Image, ImageDraw, ImageFont
+    except ImportError:
+        raise BadgeUnavailable('Pillow is not installed')
+
+    value, color = badge_text(snapshot)
+    height = BADGE_HEIGHT * PNG_SCALE
+    try:
+        font = ImageFont.load_default(size=11 * PNG_SCALE)
+    except TypeError:  # Pillow < 10.1, fixed size bitmap font
+        font = ImageFont.load_default()
+    measure = ImageDraw.Draw(Image.new('RGBA', (1, 1)))
+    padding = SVG_PADDING * PNG_SCALE
+    label_width = int(measure.textlength(BADGE_LABEL, font=font)) + 2 * padding
+    value_width = int(measure.textlength(value, font=font)) + 2 * padding
+
+    image = Image.new('RGBA', (label_width + value_width, height), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    radius = 3 * PNG_SCALE
+    draw.rounded_rectangle((0, 0, label_width + value_width - 1, height - 1), radius, fill=color)
+    draw.rounded_rectangle((0, 0, label_width - 1, height - 1), radius, fill=LABEL_COLOR)
+    draw.rectangle((label_width - radius, 0, label_width - 1, height - 1), fill=LABEL_COLOR)
+    draw.text((label_width / 2, height / 2), BADGE_LABEL, fill='white', font=font, anchor='mm')
+    draw.text((label_width + value_width / 2, height / 2), value, fill='white', font=font, anchor='mm')
+
+    output = io.BytesIO()
+    image.save(output, format='PNG', optimize=True)
+    return output.getvalue()
+
+
+BADGE_FORMATS = {
+    'svg': (render_svg, 'image/svg+xml'),
+    'png': (render_png, 'image/png'),
+}
+
+# Format -> last rendered badge, shared by all requests of the process
+_rendered: Dict[str, Badge] = {}
+
+
+def get_badge(snapshot: CurrentSnapshot, badge_format: str = 'svg') -> Badge:
+    """Rendered badge for the snapshot, reused while P/B and score stay the same"""
+    key = (snapshot.pb_ratio, snapshot.price_score)
+    badge: Optional[Badge] = _rendered.get(badge_format)
+    if badge is None or badge.key != key:
+        render, content_type = BADGE_FORMATS[badge_format]
+        body = render(snapshot)
+        badge = Badge(key, body, f'"{hashlib.sha1(body).hexdigest()[:20]}"', content_type)
+        _rendered[badge_format] = badge
+    return badge
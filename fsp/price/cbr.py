@@ -0,0 +1,101 @@
+"""Streaming parser for the CBR form 123 (own capital) report page"""
+import logging
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger('price')
+
+# Row code of the "own funds (capital), total" line of form 123
+OWN_CAPITAL_CODE = '000'
+
+
+class _Form123Target:
+    """lxml parser target collecting table rows without building a tree"""
+
+    def __init__(self):
+        self.rows: List[List[str]] = []
+        self._table_depth = 0
+        self._row: Optional[List[str]] = None
+        self._cell: Optional[List[str]] = None
+        self._done = False
+
+    def start(self, tag, attrib):
+        if self._done:
+            return
+        if tag == 'table':
+            self._table_depth += 1
+        elif tag == 'tr' and self._table_depth:
+            self._row = []
+        elif tag in ('td', 'th') and self._row is not None:
+            self._cell = []
+
+    def end(self, tag):
+        if self._done:
+            return
+        if tag in ('td', 'th') and self._cell is not None:
+            self._row.append(' '.join(''.join(self._cell).split()))
+            self._cell = None
+        elif tag == 'tr' and self._row is not None:
+            if self._row:
+                self.rows.append(self._row)
+            self._row = None
+        elif tag == 'table' and self._table_depth:
+            self._table_depth -= 1
+            # The report is the first table with data rows; skip the rest of the page
+            if not self._table_depth and any(_parse_amount(row) is not None for row in self.rows):
+                self._done = True
+            elif not self._table_depth:
+                self.rows = []
+
+    def data(self, data):
+        if self._cell is not None:
+            self._cell.append(data)
+
+    def close(self):
+        return self.rows
+
+
+def _parse_amount(row: List[str]) -> Optional[int]:
+    """Return the value column (thousands of rubles) of a report row"""
+    if len(row) < 3:
+        return None
+    try:
+        return int(''.join(row[2].split()))
+    except ValueError:
+        return None
+
+
+def parse_form123(content: bytes) -> List[Dict[str, Any]]:
+    """Extract all capital components of the form 123 table in one pass.
+
+    Values are converted from thousands of rubles to rubles.
+    """
+    # lxml is only needed once a month, keep it out of process startup
+    from lxml import etree
+
+    target = _Form123Target()
+    parser = etree.HTMLParser(target=target, encoding='utf-8')
+    parser.feed(content)
+    rows = parser.close()
+
+    components = []
+    for row in rows:
+        value = _parse_amount(row)
+        if value is None:
+            continue
+        components.append({
+            'code': row[0],
+            'name': row[1],
+            'value': value * 1000,
+        })
+    return components
+
+
+def get_own_capital(components: List[Dict[str, Any]]) -> Optional[int]:
+    """Return own capital total from parsed form 123 components"""
+    for component in components:
+        if component['code'] == OWN_CAPITAL_CODE:
+            return component['value']
+    # Older page layouts have no row codes; the total is always the first row
+    if components:
+        return components[0]['value']
+    return None
@@ -0,0 +1,153 @@
+"""MOEX stock market calendar: trading days and sessions.
+
+Sessions follow the MOEX equities schedule (Moscow time): a morning session,
+the main session with its opening and closing auctions and an evening session
+on weekdays, and a single session on weekends. Non-trading days come from a
+bundled table of public holidays, overridden per date by EXCHANGE_HOLIDAYS and
+by the ISS calendar synced with ``manage.py syncexchangecalendar``.
+
+All lookups are a set/dict membership test plus a scan of at most three
+sessions, so they are cheap enough for every cache write.
+"""
+import datetime as dt
+import logging
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+logger = logging.getLogger('price')
+
+
+@dataclass(frozen=True)
+class Session:
+    name: str
+    title: str
+    start: dt.time
+    end: dt.time
+
+
+WEEKDAY_SESSIONS = (
+    Session('morning', 'утренняя сессия', dt.time(6, 50), dt.time(9, 50)),
+    Session('main', 'основная сессия', dt.time(9, 50), dt.time(18, 50)),
+    Session('evening', 'вечерняя сессия', dt.time(19, 0), dt.time(23, 50)),
+)
+WEEKEND_SESSIONS = (
+    Session('weekend', 'сессия выходного дня', dt.time(9, 50), dt.time(19, 0)),
+)
+# (month, day) of the public holidays the exchange is closed on
+FIXED_HOLIDAYS = frozenset([(1, 1), (1, 2), (1, 7), (2, 23), (3, 8), (5, 1), (5, 9), (6, 12), (11, 4), (12, 31)])
+OVERRIDES_CACHE_KEY = 'exchange_calendar_overrides'
+# Other processes pick up a synced calendar within this time
+RELOAD_SECONDS = 3600
+# Look this far ahead for the next session; longer closures do not happen
+MAX_LOOKAHEAD_DAYS = 14
+
+
+def parse_dates(value: str) -> List[dt.date]:
+    """Comma separated ISO dates"""
+    return [dt.date.fromisoformat(item.strip()) for item in value.split(',') if item.strip()]
+
+
+class ExchangeCalendar:
+    def __init__(self, overrides: Optional[Dict[dt.date, bool]] = None, extra_holidays: Iterable[dt.date] = ()):
+        # date -> is a trading day; anything not listed follows FIXED_HOLIDAYS
+        self.overrides = {day: False for day in extra_holidays}
+        self.overrides.update(overrides or {})
+
+    def is_trading_day(self, day: dt.date) -> bool:
+        trading = self.overrides.get(day)
+        if trading is None:
+            trading = (day.month, day.day) not in FIXED_HOLIDAYS
+        return trading
+
+    def sessions_for(self, day: dt.date) -> Tuple[Session, ...]:
+        if not self.is_trading_day(day):
+            return ()
+        return WEEKEND_SESSIONS if day.weekday() >= 5 else WEEKDAY_SESSIONS
+
+    def current_session(self, moment: Optional[dt.datetime] = None) -> Optional[Session]:
+        local = timezone.localtime(moment or timezone.now())
+        now = local.time()
+        for session in self.sessions_for(local.date()):
+            if session.start <= now < session.end:
+                return session
+        return None
+
+    def next_open(self, moment: Optional[dt.datetime] = None) -> Optional[Tuple[dt.datetime, Session]]:
+        """Start of the next session after the moment"""
+        local = timezone.localtime(moment or timezone.now())
+        for offset in range(MAX_LOOKAHEAD_DAYS + 1):
+            day = local.date() + dt.timedelta(days=offset)
+            for session in self.sessions_for(day):
+                start = timezone.make_aware(dt.datetime.combine(day, session.start))
+                if start > local:
+                    return start, session
+        return None
+
+    def ttl(self, in_session: int, closed_max: int, moment: Optional[dt.datetime] = None) -> int:
+        """Cache TTL: ``in_session`` while trading, otherwise up to the next open (capped)"""
+        moment = moment or timezone.now()
+        if self.current_session(moment) is not None:
+            return in_session
+        next_open = self.next_open(moment)
+        if next_open is None:
+            return closed_max
+        until_open = int((next_open[0] - moment).total_seconds())
+        return max(in_session, min(closed_max, until_open))
+
+    def describe(self, moment: Optional[dt.datetime] = None) -> str:
+        """Market status for users, e.g. 'идет основная сессия до 18:50'"""
+        moment = moment or timezone.now()
+        session = self.current_session(moment)
+        if session is not None:
+            return f'идет {session.title} до {session.end:%H:%M}'
+        next_open = self.next_open(moment)
+        if next_open is None:
+            return 'торги закрыты'
+        start, session = next_open
+        if start.date() == timezone.localtime(moment).date():
+            when = f'в {start:%H:%M}'
+        else:
+            when = f'{start:%d.%m} в {start:%H:%M}'
+        return f'торги закрыты, {session.title} начнется {when}'
+
+
+def load_calendar() -> ExchangeCalendar:
+    overrides = caches['state'].get(OVERRIDES_CACHE_KEY) or {}
+    return ExchangeCalendar(overrides, parse_dates(settings.EXCHANGE_HOLIDAYS))
+
+
+_calendar: Optional[Tuple[float, ExchangeCalendar]] = None
+
+
+def get_calendar() -> ExchangeCalendar:
+    """Calendar of this process, reloaded from the state cache once an hour"""
+    global _calendar
+    if _calendar is None or time.monotonic() >= _calendar[0]:
+        _calendar = (time.monotonic() + RELOAD_SECONDS, load_calendar())
+    return _calendar[1]
+
+
+def reset_calendar() -> None:
+    global _calendar
+    _calendar = None
+
+
+def parse_iss_calendar(data: dict) -> Dict[dt.date, bool]:
+    """Trading flags per date from the ISS calendar (``off_days`` block)"""
+    block = data['off_days']
+    columns = block['columns']
+    date_index = columns.index('tradedate')
+    flag_column = 'stock_workday' if 'stock_workday' in columns else 'is_work_day'
+    flag_index = columns.index(flag_column)
+    return {dt.date.fromisoformat(row[date_index]): bool(row[flag_index]) for row in block['data']}
+
+
+def save_overrides(overrides: Dict[dt.date, bool]) -> None:
+    caches['state'].set(OVERRIDES_CACHE_KEY, overrides, None)
+    reset_calendar()
+    logger.info('Saved exchange calendar with %s dates', len(overrides))
@@ -0,0 +1,118 @@
+"""Streaming serializers for history export"""
+import csv
+import json
+from typing import Iterable, Iterator, Tuple
+
+EXPORT_FIELDS = ('timestamp', 'moex_price', 'fair_price', 'pb_ratio')
+
+# Rows fetched from the database per round-trip
+EXPORT_CHUNK_SIZE = 5000
+
+
+class _Echo:
+    """File-like object returning what is written, for csv.writer"""
+
+    def write(self, value):
+        return value
+
+
+class _ChunkSink:
+    """Append-only binary sink handing out written bytes between row groups"""
+
+    closed = False
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def pop(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _iter_chunks(rows: Iterable[Tuple]) -> Iterator[list]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= EXPORT_CHUNK_SIZE:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_csv(rows: Iterable[Tuple]) -> Iterator[str]:
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for timestamp, *values in rows:
+        yield writer.writerow([timestamp.isoformat(), *values])
+
+
+def iter_ndjson(rows: Iterable[Tuple]) -> Iterator[str]:
+    for timestamp, *values in rows:
+        yield json.dumps(dict(zip(EXPORT_FIELDS, [timestamp.isoformat(), *values]))) + '\n'
+
+
+def _get_schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ('timestamp', pa.timestamp('us', tz='UTC')),
+        *[(name, pa.float64()) for name in EXPORT_FIELDS[1:]],
+    ])
+
+
+def _iter_pyarrow(rows: Iterable[Tuple], open_writer) -> Iterator[bytes]:
+    """Write one batch per chunk, yielding encoded bytes as soon as they exist"""
+    import pyarrow as pa
+
+    schema = _get_schema()
+    sink = _ChunkSink()
+    writer = open_writer(sink, schema)
+    for chunk in _iter_chunks(rows):
+        columns = list(zip(*chunk))
+        writer.write_batch(pa.record_batch(
+            [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+            schema=schema,
+        ))
+        yield sink.pop()
+    writer.close()
+    yield sink.pop()
+
+
+def iter_parquet(rows: Iterable[Tuple]) -> Iterator[bytes]:
+    """Parquet file with one row group per chunk"""
+    import pyarrow.parquet as pq
+
+    return _iter_pyarrow(rows, pq.ParquetWriter)
+
+
+def iter_arrow(rows: Iterable[Tuple]) -> Iterator[bytes]:
+    """Arrow IPC stream with one record batch per chunk"""
+    import pyarrow as pa
+
+    return _iter_pyarrow(rows, pa.ipc.new_stream)
+
+
+# format -> (serializer, content type, file extension, requires pyarrow)
+EXPORT_FORMATS = {
+    'csv': (iter_csv, 'text/csv; charset=utf-8', 'csv', False),
+    'ndjson': (iter_ndjson, 'application/x-ndjson', 'ndjson', False),
+    'parquet': (iter_parquet, 'application/vnd.apache.parquet', 'parquet', True),
+    'arrow': (iter_arrow, 'application/vnd.apache.arrow.stream', 'arrows', True),
+}
@@ -0,0 +1,123 @@
+"""Own capital interpolated between monthly CBR reports"""
+import datetime as dt
+import logging
+from typing import List, Optional, Sequence, Tuple
+
+from django.utils import timezone
+
+logger = logging.getLogger('price')
+
+DAY_SECONDS = 86400
+
+
+def parse_dividends(value: str) -> List[Tuple[dt.date, float]]:
+    """Parse ``YYYY-MM-DD:amount`` comma separated list of ex-dates"""
+    dividends = []
+    for item in value.split(','):
+        if not item.strip():
+            continue
+        try:
+            ex_date, amount = item.strip().split(':')
+            dividends.append((dt.date.fromisoformat(ex_date), float(amount)))
+        except ValueError:
+            logger.warning('Skipping invalid dividend entry: %r', item)
+    return sorted(dividends)
+
+
+def _to_epoch(date: dt.date) -> float:
+    """Local midnight of the date as UNIX timestamp"""
+    return timezone.make_aware(dt.datetime.combine(date, dt.time())).timestamp()
+
+
+class CapitalCurve:
+    """Piecewise-linear own capital between CBR report dates.
+
+    Dividends are handled as a step on the ex-date: the curve interpolates
+    capital *including* dividends paid since the first report and subtracts
+    the cumulative payout, so capital drops together with the share price
+    instead of sliding down over the whole month.
+
+    After the last report the trend of the last segment continues for
+    ``max_extrapolation_days``, then the value stays flat.
+
+    A per-day lookup table (base, slope, payout) makes single evaluations
+    O(1); ``values_at`` evaluates whole arrays with numpy.
+    """
+
+    def __init__(self, knots: Sequence[Tuple[dt.date, int]], dividends: Sequence[Tuple[dt.date, float]] = (),
+                 shares: int = 1, max_extrapolation_days: int = 62):
+        if len(knots) < 2:
+            raise ValueError('At least two reports are needed for interpolation')
+
+        knots = sorted(knots)
+        self.shares = shares
+        self.start = _to_epoch(knots[0][0])
+        self.dividend_times = [_to_epoch(ex_date) for ex_date, _ in dividends if ex_date > knots[0][0]]
+        self.dividend_totals = [amount * shares for ex_date, amount in dividends if ex_date > knots[0][0]]
+
+        self.knot_times = [_to_epoch(date) for date, _ in knots]
+        self.knot_values = [capital + self._paid_before(time) for (_, capital), time in zip(knots, self.knot_times)]
+
+        # Continue the last trend for a while instead of jumping on the next report
+        slope = ((self.knot_values[-1] - self.knot_values[-2])
+                 / (self.knot_times[-1] - self.knot_times[-2]))
+        horizon = max_extrapolation_days * DAY_SECONDS
+        self.knot_times.append(self.knot_times[-1] + horizon)
+        self.knot_values.append(self.knot_values[-1] + slope * horizon)
+        self.end = self.knot_times[-1]
+
+        self._build_table()
+
+    def _paid_before(self, timestamp: float) -> float:
+        """Total dividends with ex-date on or before the timestamp"""
+        return sum(total for time, total in zip(self.dividend_times, self.dividend_totals) if time <= timestamp)
+
+    def _build_table(self) -> None:
+        days = int((self.end - self.start) // DAY_SECONDS) + 1
+        self._base, self._slope, self._paid = [], [], []
+        segment = 0
+        for day in range(days):
+            day_start = self.start + day * DAY_SECONDS
+            while segment < len(self.knot_times) - 2 and day_start >= self.knot_times[segment + 1]:
+                segment += 1
+            t0, t1 = self.knot_times[segment], self.knot_times[segment + 1]
+            v0, v1 = self.knot_values[segment], self.knot_values[segment + 1]
+            slope = (v1 - v0) / (t1 - t0)
+            self._base.append(v0 + slope * (day_start - t0))
+            self._slope.append(slope)
+            self._paid.append(self._paid_before(day_start))
+
+    def value_at(self, timestamp: float) -> float:
+        """Own capital at the given UNIX timestamp"""
+        timestamp = min(max(timestamp, self.start), self.end)
+        day = min(int((timestamp - self.start) // DAY_SECONDS), len(self._base) - 1)
+        offset = timestamp - (self.start + day * DAY_SECONDS)
+        return self._base[day] + self._slope[day] * offset - self._paid[day]
+
+    def fair_price_at(self, timestamp: float) -> float:
+        return round(self.value_at(timestamp) / self.shares, 2)
+
+    def values_at(self, timestamps):
+        """Vectorized own capital for an array of UNIX timestamps"""
+        import numpy as np
+
+        timestamps = np.clip(np.asarray(timestamps, dtype=np.float64), self.start, self.end)
+        values = np.interp(timestamps, self.knot_times, self.knot_values)
+        if self.dividend_times:
+            paid = np.concatenate([[0.0], np.cumsum(self.dividend_totals)])
+            values -= paid[np.searchsorted(self.dividend_times, timestamps, side='right')]
+        return values
+
+    def fair_prices_at(self, timestamps):
+        import numpy as np
+
+        return np.round(self.values_at(timestamps) / self.shares, 2)
+
+
+def build_curve(knots: Sequence[Tuple[dt.date, int]], dividends: Sequence[Tuple[dt.date, float]],
+                shares: int) -> Optional[CapitalCurve]:
+    """Build capital curve, None if there are not enough reports"""
+    unique_knots = sorted(dict(knots).items())
+    if len(unique_knots) < 2:
+        return None
+    return CapitalCurve(unique_knots, dividends, shares=shares)
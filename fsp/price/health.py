@@ -0,0 +1,116 @@
+"""Refresh status bookkeeping and read-only probes for health checks"""
+import datetime as dt
+import logging
+import time
+from typing import Any, Dict, Iterable, Optional
+
+from django.core.cache import cache, caches
+from django.utils import timezone
+
+logger = logging.getLogger('price')
+
+REFRESH_STATUS_KEY = 'refresh_status'
+DEEP_CHECK_KEY = 'deep_health_check'
+
+
+def record_refresh(success: bool) -> None:
+    """Record outcome of a data refresh in the shared cache"""
+    try:
+        shared_cache = caches['shared']
+        status = shared_cache.get(REFRESH_STATUS_KEY) or {
+            'last_success': None,
+            'last_error': None,
+            'consecutive_errors': 0,
+            'error_count': 0,
+        }
+        now = time.time()
+        if success:
+            status['last_success'] = now
+            status['consecutive_errors'] = 0
+        else:
+            status['last_error'] = now
+            status['consecutive_errors'] += 1
+            status['error_count'] += 1
+        shared_cache.set(REFRESH_STATUS_KEY, status, None)
+    except Exception as e:
+        logger.error('Could not record refresh status: %s', e)
+
+
+def record_deep_check(result: Dict[str, Any]) -> None:
+    """Store result of the out-of-band deep check"""
+    caches['shared'].set(DEEP_CHECK_KEY, result, None)
+
+
+def _isoformat(timestamp: Optional[float]) -> Optional[str]:
+    if timestamp is None:
+        return None
+    return timezone.localtime(dt.datetime.fromtimestamp(timestamp, tz=dt.timezone.utc)).isoformat()
+
+
+def get_health_status(breakers: Iterable, snapshot=None) -> Dict[str, Any]:
+    """Build readiness status from recorded state without touching upstreams.
+
+    Only a handful of cache reads: local data availability, the shared refresh
+    status, breaker states and the last deep check result. ``snapshot`` is the
+    last current snapshot of this process, if any.
+    """
+    refresh_status = caches['shared'].get(REFRESH_STATUS_KEY) or {}
+    has_data = ((snapshot is not None and snapshot.moex_price is not None)
+                or cache.get('moex_price_fallback') is not None)
+    breaker_states = {breaker.endpoint: breaker.get_status() for breaker in breakers}
+    consecutive_errors = refresh_status.get('consecutive_errors', 0)
+
+    if not has_data and refresh_status.get('last_error') is not None:
+        overall_status = 'unhealthy'
+    elif not has_data or consecutive_errors or 'open' in breaker_states.values():
+        overall_status = 'degraded'
+    else:
+        overall_status = 'healthy'
+
+    return {
+        'status': overall_status,
+        'checks': {
+            'data': 'ok' if has_data else 'missing',
+            'last_success': _isoformat(refresh_status.get('last_success')),
+            'last_error': _isoformat(refresh_status.get('last_error')),
+            'consecutive_errors': consecutive_errors,
+            'error_count': refresh_status.get('error_count', 0),
+            'breakers': breaker_states,
+            'deep_check': caches['shared'].get(DEEP_CHECK_KEY),
+        },
+    }
+
+
+def get_snapshot_age() -> Optional[float]:
+    """Seconds since the last known good snapshot was persisted, None without one"""
+    from .services import SNAPSHOT_CACHE_KEY
+
+    snapshot = caches['state'].get(SNAPSHOT_CACHE_KEY)
+    if snapshot is None:
+        return None
+    return time.time() - snapshot['saved_at']
+
+
+def check_upstreams(service) -> Dict[str, str]:
+    """Probe MOEX and CBR with plain requests.
+
+    Goes around ``_make_api_call``: no validators, fallback prices, breaker
+    state or history are touched, so probing never changes what is served.
+    """
+    probes = {
+        'moex_api': ([f'{base_url}{service.moex_url_templates["current"]}' for base_url in service.moex_base_urls],
+                     service.moex_request_timeout),
+        'cbr': ([service.cbr_base_url], service.cbr_request_timeout),
+    }
+    checks = {}
+    for name, (urls, timeout) in probes.items():
+        checks[name] = 'error: no URL'
+        for url in urls:
+            try:
+                service.session.get(url, timeout=timeout).raise_for_status()
+            except Exception as e:
+                checks[name] = f'error: {str(e)[:100]}'
+                continue
+            checks[name] = 'ok'
+            break
+    return checks
@@ -0,0 +1,158 @@
+"""Lease-based leader election for singleton work such as upstream refreshes.
+
+The leader holds a lease for LEADER_LEASE_SECONDS and renews it every time it
+does the work; when it stops (crash, shutdown, no traffic) the lease expires
+and the next process asking takes over. Backends:
+
+- ``database``: a ``LeaderLease`` row updated with a single conditional
+  UPDATE, works for every process using the same SQLite file;
+- ``file``: a JSON file under STATE_DIR guarded by ``flock``;
+- ``redis``: ``SET NX PX`` at REDIS_URL, for replicas on different hosts.
+
+Leases use wall-clock time, so hosts sharing a lease need synchronized clocks.
+"""
+import atexit
+import datetime as dt
+import json
+import logging
+import os
+import socket
+from pathlib import Path
+from typing import Optional
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
+
+from .models import LeaderLease
+
+logger = logging.getLogger('price')
+
+REFRESH_LEASE = 'price-refresh'
+
+
+class DatabaseLease:
+    def acquire(self, name: str, holder: str, ttl: float) -> bool:
+        """Take the lease if it is free or expired, or renew it for its holder"""
+        now = timezone.now()
+        expires_at = now + dt.timedelta(seconds=ttl)
+        if LeaderLease.objects.filter(Q(holder=holder) | Q(expires_at__lt=now), name=name).update(
+                holder=holder, expires_at=expires_at):
+            return True
+        try:
+            with transaction.atomic():
+                LeaderLease.objects.create(name=name, holder=holder, expires_at=expires_at)
+        except IntegrityError:
+            # Held by someone else
+            return False
+        return True
+
+    def release(self, name: str, holder: str) -> None:
+        LeaderLease.objects.filter(name=name, holder=holder).delete()
+
+
+class FileLease:
+    def __init__(self, directory: Optional[Path] = None):
+        self.directory = Path(directory or Path(settings.STATE_DIR) / 'leases')
+
+    def _locked(self, name: str):
+        import fcntl
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        lease_file = open(self.directory / f'{name}.lease', 'a+')
+        fcntl.flock(lease_file, fcntl.LOCK_EX)
+        lease_file.seek(0)
+        return lease_file
+
+    def acquire(self, name: str, holder: str, ttl: float) -> bool:
+        now = timezone.now().timestamp()
+        with self._locked(name) as lease_file:
+            try:
+                lease = json.loads(lease_file.read() or '{}')
+            except ValueError:
+                lease = {}
+            if lease and lease['holder'] != holder and lease['expires_at'] >= now:
+                return False
+            lease_file.seek(0)
+            lease_file.truncate()
+            json.dump({'holder': holder, 'expires_at': now + ttl}, lease_file)
+        return True
+
+    def release(self, name: str, holder: str) -> None:
+        with self._locked(name) as lease_file:
+            try:
+                lease = json.loads(lease_file.read() or '{}')
+            except ValueError:
+                lease = {}
+            if lease.get('holder') == holder:
+                lease_file.truncate(0)
+
+
+class RedisLease:
+    # Renew or delete only our own lease
+    RENEW_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('pexpire', KEYS[1], ARGV[2]) end return 0"
+    RELEASE_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+    def __init__(self, url: Optional[str] = None):
+        import redis
+
+        self.client = redis.Redis.from_url(url or settings.REDIS_URL)
+
+    def acquire(self, name: str, holder: str, ttl: float) -> bool:
+        key, ttl_ms = f'lease:{name}', int(ttl * 1000)
+        if self.client.set(key, holder, nx=True, px=ttl_ms):
+            return True
+        return bool(self.client.eval(self.RENEW_SCRIPT, 1, key, holder, ttl_ms))
+
+    def release(self, name: str, holder: str) -> None:
+        self.client.eval(self.RELEASE_SCRIPT, 1, f'lease:{name}', holder)
+
+
+BACKENDS = {'database': DatabaseLease, 'file': FileLease, 'redis': RedisLease}
+
+
+class LeaderElection:
+    """Leadership of one named lease for this process"""
+
+    def __init__(self, name: str, backend=None, ttl: Optional[float] = None):
+        self.name = name
+        self.backend = backend if backend is not None else BACKENDS[settings.LEADER_LEASE_BACKEND]()
+        self.ttl = ttl if ttl is not None else settings.LEADER_LEASE_SECONDS
+        self.is_leader = False
+        self._release_registered = False
+
+    @property
+    def holder(self) -> str:
+        # Evaluated on every call: forked workers are different holders
+        return f'{socket.gethostname()}:{os.getpid()}'
+
+    def acquire(self) -> bool:
+        """Become or stay the leader; on backend errors act as one rather than stall"""
+        try:
+            is_leader = self.backend.acquire(self.name, self.holder, self.ttl)
+        except Exception as e:
+            logger.error('Lease %s unavailable, acting as leader: %s', self.name, e)
+            return True
+
+        if is_leader != self.is_leader:
+            logger.info('%s %s lease %s', self.holder, 'acquired' if is_leader else 'lost', self.name)
+            self.is_leader = is_leader
+        if is_leader and not self._release_registered:
+            # Graceful shutdown hands over right away instead of after the TTL
+            atexit.register(self.release)
+            self._release_registered = True
+        return is_leader
+
+    def release(self) -> None:
+        if not self.is_leader:
+            return
+        try:
+            self.backend.release(self.name, self.holder)
+        except Exception as e:
+            logger.error('Could not release lease %s: %s', self.name, e)
+        self.is_leader = False
+
+
+refresh_leader = SimpleLazyObject(lambda: LeaderElection(REFRESH_LEASE))
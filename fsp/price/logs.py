@@ -0,0 +1,146 @@
+"""Logging off the request path: queue handler, JSON lines and rate limiting.
+
+``QueueStreamHandler`` only puts the record on a bounded queue; a listener
+thread of the process formats it (``%``-style arguments included) and writes
+it to the stream, so a request pays for neither. ``RateLimitFilter`` drops
+repeats of one message type beyond LOG_RATE_LIMIT per LOG_RATE_WINDOW before
+they reach the queue. ``JsonFormatter`` writes one JSON object per line with
+``extra`` fields and the drop counters. Hot-path messages log with lazy
+arguments (``logger.debug('Using cached MOEX price: %s', price)``) so that
+all of them count as one message type.
+"""
+import datetime as dt
+import json
+import logging
+import queue
+import threading
+import time
+
+from .threads import ProcessThread
+
+# Attributes every LogRecord has; anything else came from ``extra``
+RECORD_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+def message_type(record: logging.LogRecord):
+    """Unformatted template of a record, the same for every lazy call site"""
+    msg = record.msg if isinstance(record.msg, str) else type(record.msg).__name__
+    return record.name, msg
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': dt.datetime.fromtimestamp(record.created, dt.timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'pid': record.process,
+            'thread': record.threadName,
+        }
+        if record.args and isinstance(record.msg, str):
+            entry['template'] = record.msg
+        entry.update((key, value) for key, value in vars(record).items() if key not in RECORD_ATTRS)
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """At most ``limit`` records of one message type per ``window`` seconds.
+
+    Errors always pass. The first record of a type in a new window carries
+    ``suppressed``, the number dropped in the previous one.
+    """
+
+    def __init__(self, limit: int = 0, window: float = 60):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self._counts = {}
+        self._suppressed = {}
+        self._window_end = 0.0
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not self.limit or record.levelno >= logging.ERROR:
+            return True
+        key = message_type(record)
+        now = time.monotonic()
+        with self._lock:
+            if now >= self._window_end:
+                self._suppressed = {key: count - self.limit for key, count in self._counts.items()
+                                    if count > self.limit}
+                self._counts = {}
+                self._window_end = now + self.window
+            count = self._counts.get(key, 0) + 1
+            self._counts[key] = count
+            if count > self.limit:
+                return False
+            suppressed = self._suppressed.pop(key, None)
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class QueueStreamHandler(logging.Handler):
+    """StreamHandler whose formatting and writes happen on a listener thread.
+
+    A plain Handler owning its queue and listener rather than a QueueHandler
+    subclass, which ``dictConfig`` of Python 3.12+ configures specially.
+    Records are queued as they are, without formatting, so arguments mutated
+    right after the call may be logged with their new value. When the queue
+    is full records are dropped rather than blocking the caller; the next
+    record written carries ``dropped``.
+    """
+
+    def __init__(self, stream=None, queue_size: int = 10000):
+        super().__init__()
+        self.queue = queue.Queue(queue_size)
+        self.target = logging.StreamHandler(stream)
+        self.dropped = 0
+        self._listener = ProcessThread(self._listen, 'log-listener', on_start=self._on_start)
+
+    def setFormatter(self, fmt) -> None:
+        super().setFormatter(fmt)
+        self.target.setFormatter(fmt)
+
+    def _on_start(self) -> None:
+        # The inherited queue may hold a mutex locked at fork time
+        self.queue = queue.Queue(self.queue.maxsize)
+
+    def _listen(self) -> None:
+        while True:
+            record = self.queue.get()
+            try:
+                if record is None:
+                    return
+                self.target.handle(record)
+            finally:
+                self.queue.task_done()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self._listener.ensure_started()
+        if self.dropped:
+            record.dropped = self.dropped
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+        else:
+            self.dropped = 0
+
+    def flush(self) -> None:
+        """Wait until the listener has written everything queued so far"""
+        if self._listener.is_running:
+            self.queue.join()
+        self.target.flush()
+
+    def close(self) -> None:
+        if self._listener.is_running:
+            self.queue.put(None)
+            self._listener.join()
+        self.target.close()
+        super().close()
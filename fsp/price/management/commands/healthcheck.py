@@ -0,0 +1,50 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from price.health import check_upstreams, get_snapshot_age, record_deep_check
+from price.services import sber_service
+
+
+class Command(BaseCommand):
+    help = 'Глубокая проверка: база данных, кэш, доступность MOEX/ЦБ и возраст снимка данных'
+
+    def handle(self, *args, **options):
+        checks = {}
+        overall_status = 'healthy'
+
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            checks['database'] = 'ok'
+        except Exception as e:
+            checks['database'] = f'error: {str(e)[:100]}'
+            overall_status = 'unhealthy'
+
+        try:
+            cache.set('health_check_test', 'ok', 10)
+            checks['cache'] = 'ok' if cache.get('health_check_test') == 'ok' else 'error'
+            cache.delete('health_check_test')
+        except Exception as e:
+            checks['cache'] = f'error: {str(e)[:100]}'
+        if checks['cache'] != 'ok' and overall_status == 'healthy':
+            overall_status = 'degraded'
+
+        # Read-only: a probe must not refresh, write history or move the snapshot
+        checks.update(check_upstreams(sber_service))
+        if (checks['moex_api'] != 'ok' or checks['cbr'] != 'ok') and overall_status == 'healthy':
+            overall_status = 'degraded'
+
+        age = get_snapshot_age()
+        checks['snapshot'] = f'{int(age)}s' if age is not None else 'missing'
+        if age is None and overall_status == 'healthy':
+            overall_status = 'degraded'
+
+        record_deep_check({'status': overall_status, 'checked_at': timezone.now().isoformat(), 'checks': checks})
+
+        for name, result in checks.items():
+            self.stdout.write(f'{name}: {result}')
+        if overall_status == 'unhealthy':
+            raise CommandError('❌ Проверка не пройдена')
+        self.stdout.write(self.style.SUCCESS(f'Статус: {overall_status}'))
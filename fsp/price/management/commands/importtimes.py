@@ -0,0 +1,56 @@
+import os
+import subprocess
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+# Startup path of the bot: Django setup followed by the bot module import
+STARTUP_CODE = 'import django; django.setup(); import {module}'
+
+
+class Command(BaseCommand):
+    help = 'Отчет о времени импорта модулей при старте процесса'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--module', default='telegrambot.bot',
+                            help='Модуль, импорт которого измеряется после django.setup()')
+        parser.add_argument('--top', type=int, default=20,
+                            help='Сколько самых медленных модулей показать')
+
+    def handle(self, *args, **options):
+        code = STARTUP_CODE.format(module=options['module'])
+        start_time = time.monotonic()
+        # A fresh interpreter is needed: modules already imported here cost nothing
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', code],
+            capture_output=True,
+            text=True,
+            env=os.environ.copy(),
+        )
+        elapsed = time.monotonic() - start_time
+
+        if result.returncode != 0:
+            self.stdout.write(self.style.ERROR(f'❌ Ошибка импорта:\n{result.stderr[-2000:]}'))
+            return
+
+        timings = parse_importtime(result.stderr)
+        top_level = [item for item in timings if not item[2].startswith(' ')]
+
+        self.stdout.write(f'Модуль: {options["module"]} ({os.getenv("DJANGO_SETTINGS_MODULE")})')
+        self.stdout.write(f'Время до готовности: {elapsed:.2f}s, модулей: {len(timings)}\n')
+        self.stdout.write(f'{"cumulative, ms":>15} {"self, ms":>10}  module')
+        for self_us, cumulative_us, name in sorted(top_level, key=lambda item: -item[1])[:options['top']]:
+            self.stdout.write(f'{cumulative_us / 1000:>15.1f} {self_us / 1000:>10.1f}  {name.strip()}')
+
+
+def parse_importtime(output: str) -> list[tuple[int, int, str]]:
+    """Parse ``-X importtime`` lines into (self_us, cumulative_us, module) tuples"""
+    timings = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        # Nesting is kept in the leading spaces of the module name (minus the separator space)
+        timings.append((int(self_us), int(cumulative_us), name[1:]))
+    return timings
@@ -0,0 +1,79 @@
+import threading
+import time
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+from price.simulator import STATS_PATH, latency_summary
+
+
+class Command(BaseCommand):
+    help = 'Нагрузочный тест веб-эндпоинтов: RPS, задержки и ошибки'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Адрес веб-приложения')
+        parser.add_argument('--path', action='append', dest='paths',
+                            help='Путь для запросов, можно указать несколько раз (по умолчанию / и /api/current/)')
+        parser.add_argument('--concurrency', type=int, default=10, help='Число параллельных клиентов')
+        parser.add_argument('--duration', type=float, default=30, help='Длительность теста, секунд')
+        parser.add_argument('--timeout', type=float, default=10, help='Таймаут одного запроса, секунд')
+        parser.add_argument('--simulator', help='Адрес симулятора, чтобы вывести его статистику после теста')
+
+    def handle(self, *args, **options):
+        import requests
+
+        paths = options['paths'] or ['/', '/api/current/']
+        base_url = options['url'].rstrip('/')
+        deadline = time.monotonic() + options['duration']
+        lock = threading.Lock()
+        latencies = defaultdict(list)
+        errors = defaultdict(int)
+
+        def client(index):
+            session = requests.Session()
+            request_number = index
+            while time.monotonic() < deadline:
+                path = paths[request_number % len(paths)]
+                request_number += 1
+                start_time = time.monotonic()
+                try:
+                    response = session.get(f'{base_url}{path}', timeout=options['timeout'])
+                    failed = response.status_code >= 400
+                except requests.RequestException:
+                    failed = True
+                elapsed = time.monotonic() - start_time
+                with lock:
+                    latencies[path].append(elapsed)
+                    if failed:
+                        errors[path] += 1
+
+        self.stdout.write(f'🚀 {options["concurrency"]} клиентов, {options["duration"]:.0f}s, {base_url}')
+        started = time.monotonic()
+        threads = [threading.Thread(target=client, args=(index,), daemon=True)
+                   for index in range(options['concurrency'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+
+        total = sum(len(values) for values in latencies.values())
+        if not total:
+            raise CommandError('❌ Ни одного запроса не выполнено')
+
+        self.stdout.write(f'{"path":<30} {"requests":>9} {"errors":>7} {"rps":>8} {"p50":>8} {"p95":>8} {"p99":>8}')
+        for path in paths:
+            summary = latency_summary(latencies[path])
+            self.stdout.write(
+                f'{path:<30} {len(latencies[path]):>9} {errors[path]:>7} {len(latencies[path]) / elapsed:>8.1f} '
+                f'{summary["p50"] or 0:>8.1f} {summary["p95"] or 0:>8.1f} {summary["p99"] or 0:>8.1f}'
+            )
+        self.stdout.write(self.style.SUCCESS(f'Итого: {total / elapsed:.1f} запросов/с, '
+                                             f'ошибок: {sum(errors.values())}'))
+
+        if options['simulator']:
+            stats = requests.get(f'{options["simulator"].rstrip("/")}{STATS_PATH}', timeout=options['timeout']).json()
+            telegram = stats['telegram']
+            self.stdout.write(f'Симулятор: запросы {stats["requests"]}, ошибки {stats["errors"]}')
+            self.stdout.write(f'Бот: сообщений {telegram["updates"]}, ответов {telegram["replies"]}, '
+                              f'без ответа {telegram["unanswered"]}, задержка ответа (мс) {telegram["reply_latency_ms"]}')
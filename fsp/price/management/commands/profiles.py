@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from price.profiling import get_profile, list_profiles, to_collapsed
+
+
+class Command(BaseCommand):
+    help = 'Список сохраненных профилей или свернутые стеки профиля для flamegraph.pl/speedscope'
+
+    def add_arguments(self, parser):
+        parser.add_argument('profile_id', nargs='?', help='Id профиля; без него выводится список')
+        parser.add_argument('--mode', choices=['wall', 'cpu'], default='wall')
+
+    def handle(self, *args, **options):
+        if not options['profile_id']:
+            for meta in list_profiles():
+                self.stdout.write(f"{meta['id']}  {meta['started_at']}  {meta['duration_ms']:>8} ms  "
+                                  f"cpu {meta['cpu_ms']:>8} ms  {meta['name']}")
+            return
+
+        profile = get_profile(options['profile_id'])
+        if profile is None:
+            raise CommandError(f"Профиль {options['profile_id']} не найден")
+        self.stdout.write(to_collapsed(profile[options['mode']]), ending='')
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from price.models import PriceHistory
+from price.rollups import rebuild_rollups
+from price.services import sber_service
+
+BATCH_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = 'Пересчет справедливой цены и P/B в истории по интерполированному капиталу'
+
+    def handle(self, *args, **options):
+        first = PriceHistory.objects.order_by('timestamp').first()
+        if first is None:
+            self.stdout.write('История пуста')
+            return
+
+        # Reports covering the whole history plus the one before it
+        now = timezone.localtime(timezone.now())
+        start = timezone.localtime(first.timestamp)
+        months = (now.year - start.year) * 12 + now.month - start.month + 2
+        curve = sber_service.get_capital_curve(months=months)
+        if curve is None:
+            raise CommandError('❌ Недостаточно отчетов ЦБ для интерполяции')
+
+        updated = 0
+        last_id = 0
+        while True:
+            batch = list(PriceHistory.objects.filter(id__gt=last_id).order_by('id')[:BATCH_SIZE])
+            if not batch:
+                break
+
+            fair_prices = curve.fair_prices_at([row.timestamp.timestamp() for row in batch])
+            for row, fair_price in zip(batch, fair_prices.tolist()):
+                row.fair_price = fair_price
+                row.pb_ratio = round(row.moex_price / fair_price, 2)
+            PriceHistory.objects.bulk_update(batch, ['fair_price', 'pb_ratio'])
+
+            updated += len(batch)
+            last_id = batch[-1].id
+
+        # P/B changed in place, running aggregates have to be recomputed
+        buckets = rebuild_rollups()
+        self.stdout.write(self.style.SUCCESS(f'Пересчитано записей: {updated}, агрегатов: {buckets}'))
@@ -0,0 +1,65 @@
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+from django.core.management.base import BaseCommand
+
+from price.simulator import SimulatorConfig, UpstreamSimulator
+
+
+class _ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class _QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = 'Локальный симулятор MOEX ISS, ЦБ (форма 123) и Telegram Bot API для нагрузочных тестов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8090)
+        parser.add_argument('--latency', type=float, default=0.05, help='Средняя задержка ответа MOEX/ЦБ, секунд')
+        parser.add_argument('--jitter', type=float, default=0.02, help='Разброс задержки, секунд')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Доля ответов 503 от MOEX/ЦБ')
+        parser.add_argument('--start-price', type=float, default=300.0)
+        parser.add_argument('--volatility', type=float, default=0.001,
+                            help='Стандартное отклонение шага цены, доля от цены')
+        parser.add_argument('--capital-growth', type=float, default=0.012, help='Рост капитала за месяц')
+        parser.add_argument('--updates-rate', type=float, default=0.0,
+                            help='Сообщений боту в секунду (0 — без нагрузки на бота)')
+        parser.add_argument('--chats', type=int, default=100, help='Число пользователей бота')
+        parser.add_argument('--trades-rate', type=float, default=50.0, help='Сделок в секунду в ленте сделок ISS')
+        parser.add_argument('--seed', type=int)
+
+    def handle(self, *args, **options):
+        simulator = UpstreamSimulator(SimulatorConfig(
+            latency=options['latency'],
+            jitter=options['jitter'],
+            error_rate=options['error_rate'],
+            start_price=options['start_price'],
+            volatility=options['volatility'],
+            monthly_capital_growth=options['capital_growth'],
+            updates_rate=options['updates_rate'],
+            chats=options['chats'],
+            trades_rate=options['trades_rate'],
+            seed=options['seed'],
+        ))
+        base_url = f'http://{options["host"]}:{options["port"]}'
+        server = make_server(options['host'], options['port'], simulator,
+                             server_class=_ThreadingWSGIServer, handler_class=_QuietRequestHandler)
+
+        self.stdout.write(self.style.SUCCESS(f'🧪 Симулятор запущен на {base_url}'))
+        self.stdout.write(f'MOEX_BASE_URLS={base_url}')
+        self.stdout.write(f'CBR_BASE_URL={base_url}/f123/')
+        self.stdout.write(f'TELEGRAM_API_BASE_URL={base_url}')
+        self.stdout.write(f'Статистика: {base_url}/_simulator/stats')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('⏹️ Симулятор остановлен'))
+        finally:
+            server.server_close()
@@ -0,0 +1,110 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+
+from price.sqlite import DEFAULT_PRAGMAS, SQLITE_PRAGMAS, apply_pragmas
+
+PROFILES = {'default': DEFAULT_PRAGMAS, 'tuned': SQLITE_PRAGMAS}
+
+SCHEMA = '''
+CREATE TABLE history (id INTEGER PRIMARY KEY, timestamp REAL NOT NULL, moex_price REAL, pb_ratio REAL);
+CREATE INDEX history_timestamp ON history (timestamp);
+'''
+# Same shape as the web reads: the latest record and a recent range aggregate
+READ_QUERIES = [
+    'SELECT timestamp, moex_price, pb_ratio FROM history ORDER BY timestamp DESC LIMIT 1',
+    'SELECT MIN(pb_ratio), MAX(pb_ratio), COUNT(*) FROM history WHERE timestamp >= ?',
+]
+
+
+class Command(BaseCommand):
+    help = 'Бенчмарк SQLite: параллельные чтения и запись истории для настроек по умолчанию и WAL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profile', choices=['default', 'tuned', 'both'], default='both')
+        parser.add_argument('--duration', type=float, default=5, help='Длительность каждого прогона, секунд')
+        parser.add_argument('--readers', type=int, default=4, help='Число читающих потоков')
+        parser.add_argument('--batch', type=int, action='append', dest='batches',
+                            help='Записей в транзакции писателя, можно указать несколько раз (по умолчанию 1 и 50)')
+        parser.add_argument('--rows', type=int, default=50000, help='Записей в таблице перед стартом')
+
+    def handle(self, *args, **options):
+        profiles = ['default', 'tuned'] if options['profile'] == 'both' else [options['profile']]
+        batches = options['batches'] or [1, 50]
+
+        self.stdout.write(f'{"profile":<8} {"batch":>5} {"reads/s":>10} {"writes/s":>10} {"busy":>6}')
+        for profile in profiles:
+            for batch in batches:
+                with tempfile.TemporaryDirectory() as directory:
+                    reads, writes, busy = run_benchmark(
+                        os.path.join(directory, 'bench.sqlite3'), PROFILES[profile],
+                        options['readers'], batch, options['duration'], options['rows'],
+                    )
+                self.stdout.write(f'{profile:<8} {batch:>5} {reads / options["duration"]:>10.0f} '
+                                  f'{writes / options["duration"]:>10.0f} {busy:>6}')
+
+
+def _connect(path, pragmas):
+    # Django's own settings: busy timeout and statement cache from DATABASES OPTIONS
+    connection = sqlite3.connect(path, timeout=10, cached_statements=256, check_same_thread=False)
+    apply_pragmas(connection.cursor(), pragmas)
+    return connection
+
+
+def run_benchmark(path, pragmas, readers, batch, duration, rows):
+    """Run readers and one writer concurrently, (reads, written rows, busy errors)"""
+    setup = _connect(path, pragmas)
+    setup.executescript(SCHEMA)
+    now = time.time()
+    setup.executemany('INSERT INTO history (timestamp, moex_price, pb_ratio) VALUES (?, ?, ?)',
+                      [(now - rows + i, 300.0, 1.0) for i in range(rows)])
+    setup.commit()
+    setup.close()
+
+    deadline = time.monotonic() + duration
+    counts = {'reads': 0, 'writes': 0, 'busy': 0}
+    lock = threading.Lock()
+
+    def reader():
+        connection = _connect(path, pragmas)
+        reads = busy = 0
+        while time.monotonic() < deadline:
+            try:
+                connection.execute(READ_QUERIES[0]).fetchone()
+                connection.execute(READ_QUERIES[1], (time.time() - 3600,)).fetchone()
+                reads += 1
+            except sqlite3.OperationalError:
+                busy += 1
+        connection.close()
+        with lock:
+            counts['reads'] += reads
+            counts['busy'] += busy
+
+    def writer():
+        connection = _connect(path, pragmas)
+        writes = busy = 0
+        while time.monotonic() < deadline:
+            try:
+                with connection:
+                    connection.executemany(
+                        'INSERT INTO history (timestamp, moex_price, pb_ratio) VALUES (?, ?, ?)',
+                        [(time.time(), 300.0, 1.0)] * batch,
+                    )
+                writes += batch
+            except sqlite3.OperationalError:
+                busy += 1
+        connection.close()
+        with lock:
+            counts['writes'] += writes
+            counts['busy'] += busy
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)] + [threading.Thread(target=writer)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return counts['reads'], counts['writes'], counts['busy']
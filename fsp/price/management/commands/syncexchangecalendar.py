@@ -0,0 +1,46 @@
+import datetime as dt
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from price.exchange import get_calendar, parse_iss_calendar, save_overrides
+from price.services import sber_service
+
+ISS_CALENDAR_PATH = '/iss/calendars.json'
+
+
+class Command(BaseCommand):
+    help = 'Загрузка торгового календаря фондового рынка из ISS MOEX (праздники и перенесенные дни)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=365, help='На сколько дней вперед загрузить календарь')
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        params = {
+            'from': today.isoformat(),
+            'till': (today + dt.timedelta(days=options['days'])).isoformat(),
+            'show_all_days': 1,
+            'iss.only': 'off_days',
+            'iss.meta': 'off',
+        }
+        errors = []
+        for base_url in sber_service.moex_base_urls:
+            try:
+                response = sber_service.session.get(f'{base_url}{ISS_CALENDAR_PATH}', params=params,
+                                                    timeout=sber_service.moex_request_timeout * 3)
+                response.raise_for_status()
+                overrides = parse_iss_calendar(response.json())
+                break
+            except Exception as e:
+                errors.append(f'{base_url}: {e}')
+        else:
+            raise CommandError(f'❌ Не удалось загрузить календарь: {"; ".join(errors)}')
+
+        save_overrides(overrides)
+        closed = sorted(day for day, trading in overrides.items() if not trading)
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Календарь загружен: {len(overrides)} дней, неторговых: {len(closed)}'))
+        for day in closed[:20]:
+            self.stdout.write(f'  {day.isoformat()}')
+        self.stdout.write(f'Сейчас: {get_calendar().describe()}')
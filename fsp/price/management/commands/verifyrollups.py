@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from price.rollups import rebuild_rollups, verify_rollups
+
+
+class Command(BaseCommand):
+    help = 'Сверка почасовых/дневных/месячных агрегатов истории с сырыми данными'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Пересобрать агрегаты, если найдены расхождения')
+        parser.add_argument('--show', type=int, default=20, help='Сколько расхождений показать')
+
+    def handle(self, *args, **options):
+        problems = verify_rollups()
+        if not problems:
+            self.stdout.write(self.style.SUCCESS('✅ Агрегаты совпадают с историей'))
+            return
+
+        for problem in problems[:options['show']]:
+            self.stdout.write(problem)
+        self.stdout.write(self.style.WARNING(f'Расхождений: {len(problems)}'))
+
+        if not options['rebuild']:
+            raise CommandError('❌ Агрегаты расходятся с историей, запустите с --rebuild')
+        buckets = rebuild_rollups()
+        self.stdout.write(self.style.SUCCESS(f'Агрегаты пересобраны: {buckets}'))
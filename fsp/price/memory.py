@@ -0,0 +1,185 @@
+"""Memory diagnostics: RSS, LocMemCache sizes and tracemalloc growth.
+
+With MEMORY_DIAGNOSTICS enabled every web worker and the bot start
+tracemalloc and a thread that snapshots allocations every
+MEMORY_SNAPSHOT_INTERVAL seconds, logs the lines whose allocations grew
+since the previous snapshot and publishes a summary per process to the
+shared cache. /ops/memory/ shows those summaries and the top allocators of
+the serving process.
+"""
+import datetime as dt
+import logging
+import os
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+
+from .threads import ProcessThread
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger('price')
+
+PROCESS_INDEX_KEY = 'memory_processes'
+GROUP_BY = ('lineno', 'filename', 'traceback')
+# Allocations of the diagnostics themselves and of the import machinery
+SNAPSHOT_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+]
+
+
+def get_rss_bytes() -> Optional[int]:
+    """Current resident set size of this process"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def get_peak_rss_bytes() -> Optional[int]:
+    if resource is None:
+        return None
+    # Kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def get_locmem_sizes() -> Dict[str, Dict[str, int]]:
+    """Entries and pickled bytes held by every LocMemCache alias"""
+    sizes = {}
+    for alias in settings.CACHES:
+        cache = caches[alias]
+        if not isinstance(cache, LocMemCache):
+            continue
+        with cache._lock:
+            entries = len(cache._cache)
+            size = sum(len(key) + len(value) for key, value in cache._cache.items())
+        sizes[alias] = {'entries': entries, 'bytes': size}
+    return sizes
+
+
+def take_snapshot() -> tracemalloc.Snapshot:
+    return tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS)
+
+
+def _where(stat) -> str:
+    return ' <- '.join(f'{frame.filename}:{frame.lineno}' for frame in reversed(stat.traceback))
+
+
+def format_statistics(stats, limit: int) -> List[Dict[str, Any]]:
+    return [{'where': _where(stat), 'size_bytes': stat.size, 'count': stat.count} for stat in stats[:limit]]
+
+
+def format_growth(diffs, limit: int) -> List[Dict[str, Any]]:
+    """Largest positive differences only"""
+    growth = [diff for diff in diffs if diff.size_diff > 0][:limit]
+    return [{'where': _where(diff), 'size_bytes': diff.size, 'size_diff_bytes': diff.size_diff,
+             'count_diff': diff.count_diff} for diff in growth]
+
+
+def top_allocators(limit: int = 20, group_by: str = 'lineno') -> List[Dict[str, Any]]:
+    """Largest live allocations traced by tracemalloc right now"""
+    return format_statistics(take_snapshot().statistics(group_by), limit)
+
+
+def get_process_report(name: str) -> Dict[str, Any]:
+    report = {
+        'pid': os.getpid(),
+        'name': name,
+        'timestamp': dt.datetime.now(dt.timezone.utc).isoformat(),
+        'rss_bytes': get_rss_bytes(),
+        'peak_rss_bytes': get_peak_rss_bytes(),
+        'locmem': get_locmem_sizes(),
+        'tracing': tracemalloc.is_tracing(),
+    }
+    if report['tracing']:
+        report['traced_bytes'], report['traced_peak_bytes'] = tracemalloc.get_traced_memory()
+    return report
+
+
+def list_process_reports() -> List[Dict[str, Any]]:
+    """Latest published summaries of the processes still alive"""
+    pids = caches['shared'].get(PROCESS_INDEX_KEY) or []
+    reports = caches['shared'].get_many([f'memory_{pid}' for pid in pids])
+    return sorted(reports.values(), key=lambda report: report['pid'])
+
+
+class MemoryMonitor:
+    """Per-process thread diffing tracemalloc snapshots over time"""
+
+    def __init__(self):
+        self.name = 'web'
+        self.baseline: Optional[tracemalloc.Snapshot] = None
+        self.previous: Optional[tracemalloc.Snapshot] = None
+        self._thread = ProcessThread(self._run, 'memory-monitor', on_start=self._on_start)
+
+    def _on_start(self) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(settings.MEMORY_TRACE_FRAMES)
+        # Snapshots taken in the parent describe another process
+        self.baseline = self.previous = None
+
+    def start(self, name: str) -> bool:
+        """Start tracing in this process if MEMORY_DIAGNOSTICS is on"""
+        if not settings.MEMORY_DIAGNOSTICS:
+            return False
+        self.name = name
+        if self._thread.ensure_started():
+            logger.info('Memory diagnostics started for %s (pid %s)', name, os.getpid())
+        return True
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.check()
+            except Exception as e:
+                logger.error('Memory check failed: %s', e)
+            time.sleep(settings.MEMORY_SNAPSHOT_INTERVAL)
+
+    def check(self, limit: int = 10) -> Dict[str, Any]:
+        """Snapshot, diff against the previous and the first one, publish"""
+        snapshot = take_snapshot()
+        report = get_process_report(self.name)
+        if self.baseline is None:
+            self.baseline = snapshot
+        else:
+            report['growth_since_start'] = format_growth(snapshot.compare_to(self.baseline, 'lineno'), limit)
+        if self.previous is not None:
+            report['growth_since_last'] = format_growth(snapshot.compare_to(self.previous, 'lineno'), limit)
+        self.previous = snapshot
+
+        rss_mb = (report['rss_bytes'] or 0) / 2 ** 20
+        top = ', '.join(f"{item['where']} +{item['size_diff_bytes'] // 1024}KiB"
+                        for item in report.get('growth_since_last', [])[:3])
+        logger.info('Memory %s pid %s: RSS %.1f MiB, traced %.1f MiB, locmem %s%s',
+                    self.name, report['pid'], rss_mb, report.get('traced_bytes', 0) / 2 ** 20, report['locmem'],
+                    f', grew: {top}' if top else '')
+        self.publish(report)
+        return report
+
+    def growth_since_start(self, limit: int = 20, group_by: str = 'lineno') -> List[Dict[str, Any]]:
+        if self.baseline is None or not tracemalloc.is_tracing():
+            return []
+        return format_growth(take_snapshot().compare_to(self.baseline, group_by), limit)
+
+    def publish(self, report: Dict[str, Any]) -> None:
+        timeout = 3 * settings.MEMORY_SNAPSHOT_INTERVAL
+        shared_cache = caches['shared']
+        shared_cache.set(f'memory_{report["pid"]}', report, timeout)
+        # Dead pids drop out of list_process_reports once their report expires
+        alive = set(shared_cache.get_many([f'memory_{pid}' for pid in shared_cache.get(PROCESS_INDEX_KEY) or []]))
+        pids = [int(key.split('_', 1)[1]) for key in alive] + [report['pid']]
+        shared_cache.set(PROCESS_INDEX_KEY, sorted(set(pids)), None)
+
+
+memory_monitor = MemoryMonitor()
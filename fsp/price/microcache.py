@@ -0,0 +1,57 @@
+"""Support for the nginx microcache in front of the anonymous pages.
+
+nginx keeps index, thesis, /api/current/ and /badge/ for as long as
+X-Accel-Expires allows, which is what is left of the snapshot TTL; browsers
+get a short max-age on top. When a refresh produces different data, the refresher asks
+the internal nginx server at MICROCACHE_PURGE_URL to fetch those paths again:
+it bypasses the cache and replaces the stored entries, so almost every
+request is served by nginx and none of them sees data older than the
+snapshot (see nginx.conf).
+"""
+import logging
+import threading
+from typing import Optional
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+logger = logging.getLogger('price')
+
+MICROCACHE_PATHS = ('/', '/thesis/', '/api/current/', '/badge/', '/badge/?format=png')
+# Sent by the internal nginx server only, public locations clear it
+REFRESH_HEADER = 'X-Microcache-Refresh'
+
+
+def set_microcache_headers(response, browser_max_age: int, proxy_max_age: int):
+    """Browser and nginx lifetimes; gzip is negotiated by nginx per Accept-Encoding"""
+    proxy_max_age = max(1, int(proxy_max_age))
+    response['Cache-Control'] = f'public, max-age={min(browser_max_age, proxy_max_age)}'
+    response['X-Accel-Expires'] = str(proxy_max_age)
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
+def purge_microcache(base_url: Optional[str] = None) -> int:
+    """Make nginx re-fetch the cached paths, number of paths refreshed"""
+    import requests
+
+    base_url = (base_url or settings.MICROCACHE_PURGE_URL).rstrip('/')
+    refreshed = 0
+    for path in MICROCACHE_PATHS:
+        try:
+            response = requests.get(f'{base_url}{path}', headers={REFRESH_HEADER: '1'}, timeout=5)
+            response.raise_for_status()
+            refreshed += 1
+        except requests.RequestException as e:
+            logger.warning('Microcache refresh of %s failed: %s', path, e)
+    logger.info('Refreshed %s/%s microcached paths', refreshed, len(MICROCACHE_PATHS))
+    return refreshed
+
+
+def purge_in_background() -> Optional[threading.Thread]:
+    """Purge without holding up the refresh, no-op without MICROCACHE_PURGE_URL"""
+    if not settings.MICROCACHE_PURGE_URL:
+        return None
+    thread = threading.Thread(target=purge_microcache, name='microcache-purge', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,64 @@
+"""Session, auth and messages middleware limited to the paths that need them.
+
+Public pages and the API are anonymous and read-only; running the stock
+middleware for them only costs session lookups in SQLite.
+"""
+import random
+
+from django.conf import settings
+from django.contrib.auth import middleware as auth_middleware
+from django.contrib.messages import middleware as messages_middleware
+from django.contrib.sessions import middleware as sessions_middleware
+from django.utils.crypto import constant_time_compare
+
+from .profiling import SamplingProfiler
+
+
+class StatefulPathsOnlyMixin:
+    """Pass requests outside settings.STATEFUL_PATH_PREFIXES straight through"""
+
+    def __call__(self, request):
+        if not request.path_info.startswith(tuple(settings.STATEFUL_PATH_PREFIXES)):
+            return self.get_response(request)
+        return super().__call__(request)
+
+
+class SessionMiddleware(StatefulPathsOnlyMixin, sessions_middleware.SessionMiddleware):
+    pass
+
+
+class AuthenticationMiddleware(StatefulPathsOnlyMixin, auth_middleware.AuthenticationMiddleware):
+    pass
+
+
+class MessageMiddleware(StatefulPathsOnlyMixin, messages_middleware.MessageMiddleware):
+    pass
+
+
+class ProfilingMiddleware:
+    """Profile a sampled fraction of requests, or ones carrying the ops token.
+
+    Requests with ``X-Profile: <OPS_TOKEN>`` are always profiled; otherwise
+    PROFILING_SAMPLE_RATE of them are. When off the cost is one random() call
+    and a header lookup. Profiles are listed at /ops/profiles/.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def should_profile(self, request) -> bool:
+        sample_rate = settings.PROFILING_SAMPLE_RATE
+        if sample_rate and random.random() < sample_rate:
+            return True
+        token = request.headers.get('X-Profile')
+        return bool(token) and bool(settings.OPS_TOKEN) and constant_time_compare(token, settings.OPS_TOKEN)
+
+    def __call__(self, request):
+        if not self.should_profile(request):
+            return self.get_response(request)
+
+        with SamplingProfiler(f'{request.method} {request.path_info}') as profiler:
+            response = self.get_response(request)
+        if profiler.profile_id:
+            response['X-Profile-Id'] = profiler.profile_id
+        return response
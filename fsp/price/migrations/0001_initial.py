@@ -0,0 +1,28 @@
+# Generated by Django 4.2.8 on 2026-10-19 19:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField(db_index=True)),
+                ('moex_price', models.FloatField()),
+                ('fair_price', models.FloatField()),
+                ('pb_ratio', models.FloatField()),
+            ],
+            options={
+                'verbose_name_plural': 'price history',
+                'ordering': ['timestamp'],
+            },
+        ),
+    ]
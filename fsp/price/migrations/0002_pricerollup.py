@@ -0,0 +1,41 @@
+# Generated by Django 4.2.8 on 2026-10-19 19:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('price', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(choices=[('hour', 'hour'), ('day', 'day'), ('month', 'month')], max_length=5)),
+                ('bucket_start', models.DateTimeField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('first_timestamp', models.DateTimeField()),
+                ('last_timestamp', models.DateTimeField()),
+                ('price_first', models.FloatField()),
+                ('price_last', models.FloatField()),
+                ('price_min', models.FloatField()),
+                ('price_max', models.FloatField()),
+                ('price_sum', models.FloatField()),
+                ('pb_first', models.FloatField()),
+                ('pb_last', models.FloatField()),
+                ('pb_min', models.FloatField()),
+                ('pb_max', models.FloatField()),
+                ('pb_sum', models.FloatField()),
+            ],
+            options={
+                'ordering': ['resolution', 'bucket_start'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='pricerollup',
+            constraint=models.UniqueConstraint(fields=('resolution', 'bucket_start'), name='unique_rollup_bucket'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.8 on 2026-10-19 20:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('price', '0003_leaderlease'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MinuteBar',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField(unique=True)),
+                ('open', models.FloatField()),
+                ('high', models.FloatField()),
+                ('low', models.FloatField()),
+                ('close', models.FloatField()),
+                ('volume', models.BigIntegerField()),
+                ('value', models.FloatField()),
+                ('trades', models.PositiveIntegerField()),
+                ('first_tradeno', models.BigIntegerField()),
+                ('last_tradeno', models.BigIntegerField()),
+            ],
+            options={
+                'ordering': ['timestamp'],
+            },
+        ),
+        migrations.CreateModel(
+            name='TradeCursor',
+            fields=[
+                ('name', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('tradeno', models.BigIntegerField(null=True)),
+                ('trade_date', models.DateField(null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -1,2 +1,109 @@
-# Simplified version - no database models
-# All data is fetched in real-time from APIs
\ No newline at end of file
+from django.db import models
+
+
+class PriceHistory(models.Model):
+    """Price and P/B recorded on every successful data refresh"""
+
+    timestamp = models.DateTimeField(db_index=True)
+    moex_price = models.FloatField()
+    fair_price = models.FloatField()
+    pb_ratio = models.FloatField()
+
+    class Meta:
+        ordering = ['timestamp']
+        verbose_name_plural = 'price history'
+
+    def __str__(self):
+        return f'{self.timestamp:%Y-%m-%d %H:%M} {self.moex_price} (P/B {self.pb_ratio})'
+
+
+class PriceRollup(models.Model):
+    """Running aggregates of the price history per hour/day/month bucket.
+
+    Maintained incrementally on every history insert (see ``price.rollups``),
+    so range queries read one row per bucket instead of every raw record.
+    """
+
+    HOUR = 'hour'
+    DAY = 'day'
+    MONTH = 'month'
+    RESOLUTION_CHOICES = [(HOUR, 'hour'), (DAY, 'day'), (MONTH, 'month')]
+
+    resolution = models.CharField(max_length=5, choices=RESOLUTION_CHOICES)
+    # Local (TIME_ZONE) start of the bucket
+    bucket_start = models.DateTimeField()
+    count = models.PositiveIntegerField(default=0)
+    first_timestamp = models.DateTimeField()
+    last_timestamp = models.DateTimeField()
+    price_first = models.FloatField()
+    price_last = models.FloatField()
+    price_min = models.FloatField()
+    price_max = models.FloatField()
+    price_sum = models.FloatField()
+    pb_first = models.FloatField()
+    pb_last = models.FloatField()
+    pb_min = models.FloatField()
+    pb_max = models.FloatField()
+    pb_sum = models.FloatField()
+
+    class Meta:
+        ordering = ['resolution', 'bucket_start']
+        constraints = [
+            models.UniqueConstraint(fields=['resolution', 'bucket_start'], name='unique_rollup_bucket'),
+        ]
+
+    def __str__(self):
+        return f'{self.resolution} {self.bucket_start:%Y-%m-%d %H:%M} (P/B {self.pb_last})'
+
+    @property
+    def price_avg(self) -> float:
+        return self.price_sum / self.count
+
+    @property
+    def pb_avg(self) -> float:
+        return self.pb_sum / self.count
+
+
+class LeaderLease(models.Model):
+    """Time-limited lease naming the process allowed to do a singleton job (see ``price.leader``)"""
+
+    name = models.CharField(max_length=64, primary_key=True)
+    holder = models.CharField(max_length=128)
+    expires_at = models.DateTimeField()
+
+    def __str__(self):
+        return f'{self.name}: {self.holder} until {self.expires_at:%Y-%m-%d %H:%M:%S}'
+
+
+class MinuteBar(models.Model):
+    """SBER trades aggregated per minute, ingested incrementally from ISS (see ``price.trades``)"""
+
+    timestamp = models.DateTimeField(unique=True)
+    open = models.FloatField()
+    high = models.FloatField()
+    low = models.FloatField()
+    close = models.FloatField()
+    # Shares and rubles traded, VWAP = value / volume
+    volume = models.BigIntegerField()
+    value = models.FloatField()
+    trades = models.PositiveIntegerField()
+    first_tradeno = models.BigIntegerField()
+    last_tradeno = models.BigIntegerField()
+
+    class Meta:
+        ordering = ['timestamp']
+
+    def __str__(self):
+        return f'{self.timestamp:%Y-%m-%d %H:%M} {self.close} ({self.volume})'
+
+
+class TradeCursor(models.Model):
+    """Last ingested ISS trade number per feed"""
+
+    name = models.CharField(max_length=64, primary_key=True)
+    tradeno = models.BigIntegerField(null=True)
+    trade_date = models.DateField(null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.name}: {self.tradeno} ({self.trade_date})'
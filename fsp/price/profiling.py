@@ -0,0 +1,165 @@
+"""Sampling profiler for requests and bot handlers.
+
+A helper thread periodically grabs the stacks of the profiled threads via
+``sys._current_frames()`` and accumulates wall-clock time and, where the
+platform exposes per-thread CPU clocks, CPU time per collapsed stack. The
+result is stored in the shared cache in the collapsed ("folded") format read
+by flamegraph.pl, speedscope and inferno.
+
+Nothing runs unless a request or handler is actually profiled.
+"""
+import datetime as dt
+import logging
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional
+
+from django.core.cache import caches
+
+logger = logging.getLogger('price')
+
+PROFILE_INDEX_KEY = 'profile_index'
+PROFILE_TIMEOUT = 24 * 3600
+MAX_STORED_PROFILES = 50
+MAX_STACK_DEPTH = 100
+DEFAULT_INTERVAL = 0.005
+
+
+def _collapse(frame) -> str:
+    """``module:function`` names from the outermost frame, ';' separated"""
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        names.append(f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+def _cpu_clock(thread_id: int) -> Optional[int]:
+    """Per-thread CPU clock id, None where not supported"""
+    try:
+        return time.pthread_getcpuclockid(thread_id)
+    except (AttributeError, OSError):
+        return None
+
+
+class SamplingProfiler:
+    """Context manager profiling the given threads (default: the calling one)"""
+
+    def __init__(self, name: str, thread_ids: Optional[Iterable[int]] = None, all_threads: bool = False,
+                 interval: float = DEFAULT_INTERVAL):
+        self.name = name
+        self.all_threads = all_threads
+        self.thread_ids = set(thread_ids) if thread_ids is not None else {threading.get_ident()}
+        self.interval = interval
+        self.wall: Counter = Counter()
+        self.cpu: Counter = Counter()
+        self.samples = 0
+        self.profile_id: Optional[str] = None
+        self._clocks: Dict[int, Optional[int]] = {}
+        self._cpu_seen: Dict[int, int] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self) -> 'SamplingProfiler':
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self._start
+        try:
+            self.profile_id = save_profile(self)
+        except Exception as e:
+            logger.error('Could not save profile %s: %s', self.name, e)
+
+    def _targets(self) -> Iterable[int]:
+        if self.all_threads:
+            return [ident for ident in sys._current_frames() if ident != threading.get_ident()]
+        return self.thread_ids
+
+    def _cpu_delta(self, thread_id: int) -> int:
+        """CPU nanoseconds the thread used since the previous sample"""
+        if thread_id not in self._clocks:
+            self._clocks[thread_id] = _cpu_clock(thread_id)
+        clock = self._clocks[thread_id]
+        if clock is None:
+            return 0
+        try:
+            now = time.clock_gettime_ns(clock)
+        except OSError:
+            return 0
+        previous = self._cpu_seen.get(thread_id, now)
+        self._cpu_seen[thread_id] = now
+        return now - previous
+
+    def _run(self) -> None:
+        for thread_id in self._targets():
+            self._cpu_delta(thread_id)
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            elapsed_us = int((now - last) * 1_000_000)
+            last = now
+            frames = sys._current_frames()
+            for thread_id in self._targets():
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                stack = _collapse(frame)
+                self.wall[stack] += elapsed_us
+                cpu_us = self._cpu_delta(thread_id) // 1000
+                if cpu_us:
+                    self.cpu[stack] += cpu_us
+            self.samples += 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'id': uuid.uuid4().hex[:12],
+            'name': self.name,
+            'started_at': dt.datetime.fromtimestamp(self.started_at, tz=dt.timezone.utc).isoformat(),
+            'duration_ms': round(self.duration * 1000, 1),
+            'samples': self.samples,
+            'cpu_ms': round(sum(self.cpu.values()) / 1000, 1),
+            'wall': dict(self.wall),
+            'cpu': dict(self.cpu),
+        }
+
+
+def save_profile(profiler: SamplingProfiler) -> str:
+    """Store the profile in the shared cache, return its id"""
+    profile = profiler.as_dict()
+    shared_cache = caches['shared']
+    shared_cache.set(f"profile_{profile['id']}", profile, PROFILE_TIMEOUT)
+    meta = {key: profile[key] for key in ('id', 'name', 'started_at', 'duration_ms', 'samples', 'cpu_ms')}
+    index = [meta] + (shared_cache.get(PROFILE_INDEX_KEY) or [])
+    shared_cache.set(PROFILE_INDEX_KEY, index[:MAX_STORED_PROFILES], PROFILE_TIMEOUT)
+    logger.info('Saved profile %s for %s (%sms)', profile['id'], profiler.name, profile['duration_ms'])
+    return profile['id']
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    return caches['shared'].get(PROFILE_INDEX_KEY) or []
+
+
+def get_profile(profile_id: str) -> Optional[Dict[str, Any]]:
+    return caches['shared'].get(f'profile_{profile_id}')
+
+
+def to_collapsed(stacks: Dict[str, int]) -> str:
+    """Folded stacks, one ``frame;frame;frame value`` line per stack"""
+    return ''.join(f'{stack} {value}\n' for stack, value in sorted(stacks.items()))
+
+
+def top_functions(stacks: Dict[str, int], limit: int = 10) -> List[tuple]:
+    """Self time per innermost frame, largest first"""
+    totals = Counter()
+    for stack, value in stacks.items():
+        totals[stack.rsplit(';', 1)[-1]] += value
+    return totals.most_common(limit)
@@ -0,0 +1,100 @@
+"""Circuit breaker and adaptive timeouts for upstream endpoints"""
+import logging
+import math
+import time
+from typing import Any, Dict
+from urllib.parse import urlsplit
+
+from django.core.cache import caches
+
+logger = logging.getLogger('price')
+
+
+def get_endpoint(url: str) -> str:
+    """Return scheme://host part of the URL used as breaker identity"""
+    parts = urlsplit(url)
+    return f'{parts.scheme}://{parts.netloc}'
+
+
+class CircuitBreaker:
+    """Per-endpoint circuit breaker.
+
+    State lives in the ``shared`` cache so that all gunicorn workers and the
+    bot container see the same breaker: once an endpoint is open, every
+    process short-circuits without touching the network.
+    """
+
+    # Number of latency samples kept for timeout estimation
+    latency_window = 50
+
+    def __init__(self, endpoint: str, failure_threshold: int = 3, recovery_timeout: float = 60,
+                 min_timeout: float = 1.0):
+        self.endpoint = endpoint
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.min_timeout = min_timeout
+        self.cache_key = f'breaker_{endpoint}'
+
+    def _get_state(self) -> Dict[str, Any]:
+        return caches['shared'].get(self.cache_key) or {'failures': 0, 'opened_at': None, 'latencies': []}
+
+    def _set_state(self, state: Dict[str, Any]) -> None:
+        caches['shared'].set(self.cache_key, state, None)
+
+    def get_status(self) -> str:
+        """Return closed, open or half_open"""
+        opened_at = self._get_state()['opened_at']
+        if opened_at is None:
+            return 'closed'
+        if time.time() - opened_at < self.recovery_timeout:
+            return 'open'
+        return 'half_open'
+
+    def allow(self) -> bool:
+        """Check whether a request to the endpoint may be attempted"""
+        state = self._get_state()
+        if state['opened_at'] is None:
+            return True
+        if time.time() - state['opened_at'] < self.recovery_timeout:
+            return False
+
+        # Half-open: this process takes the single trial request, the others
+        # stay short-circuited for another recovery period.
+        state['opened_at'] = time.time()
+        self._set_state(state)
+        logger.info('Circuit breaker for %s is half-open, sending trial request', self.endpoint)
+        return True
+
+    def record_success(self, latency: float) -> None:
+        """Close the breaker and remember request latency (seconds)"""
+        state = self._get_state()
+        if state['opened_at'] is not None:
+            logger.info('Circuit breaker for %s closed', self.endpoint)
+        state['failures'] = 0
+        state['opened_at'] = None
+        state['latencies'] = (state['latencies'] + [latency])[-self.latency_window:]
+        self._set_state(state)
+
+    def record_failure(self) -> None:
+        """Count a failure and open the breaker once the threshold is reached"""
+        state = self._get_state()
+        state['failures'] += 1
+        if state['failures'] >= self.failure_threshold:
+            if state['opened_at'] is None:
+                logger.warning('Circuit breaker for %s opened after %s failures', self.endpoint, state['failures'])
+            state['opened_at'] = time.time()
+        self._set_state(state)
+
+    def get_timeout(self, max_timeout: float) -> float:
+        """Derive request timeout from observed p95 latency.
+
+        Without enough samples the configured timeout is used as is; it also
+        stays the upper bound afterwards.
+        """
+        latencies = sorted(self._get_state()['latencies'])
+        if len(latencies) < 5:
+            return max_timeout
+
+        p95 = latencies[min(len(latencies) - 1, math.ceil(len(latencies) * 0.95) - 1)]
+        return round(min(max_timeout, max(self.min_timeout, p95 * 3)), 2)
+
@@ -0,0 +1,149 @@
+"""Incremental hour/day/month rollups of the price history"""
+import datetime as dt
+import logging
+from typing import Any, Dict, Iterable, List, Tuple
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Greatest, Least
+from django.utils import timezone
+
+from .models import PriceHistory, PriceRollup
+
+logger = logging.getLogger('price')
+
+RESOLUTIONS = [PriceRollup.HOUR, PriceRollup.DAY, PriceRollup.MONTH]
+# Sums of many floats may differ in the last digits depending on the order
+SUM_TOLERANCE = 1e-6
+
+
+def get_bucket_start(timestamp: dt.datetime, resolution: str) -> dt.datetime:
+    """Start of the local-time bucket containing the timestamp"""
+    local = timezone.localtime(timestamp).replace(minute=0, second=0, microsecond=0)
+    if resolution in (PriceRollup.DAY, PriceRollup.MONTH):
+        local = local.replace(hour=0)
+    if resolution == PriceRollup.MONTH:
+        local = local.replace(day=1)
+    # Re-localize: the UTC offset of midnight may differ from the one of the timestamp
+    return timezone.make_aware(local.replace(tzinfo=None))
+
+
+def _new_bucket(record: PriceHistory) -> Dict[str, Any]:
+    return {
+        'count': 1,
+        'first_timestamp': record.timestamp, 'last_timestamp': record.timestamp,
+        'price_first': record.moex_price, 'price_last': record.moex_price,
+        'price_min': record.moex_price, 'price_max': record.moex_price, 'price_sum': record.moex_price,
+        'pb_first': record.pb_ratio, 'pb_last': record.pb_ratio,
+        'pb_min': record.pb_ratio, 'pb_max': record.pb_ratio, 'pb_sum': record.pb_ratio,
+    }
+
+
+def _fold(bucket: Dict[str, Any], record: PriceHistory) -> None:
+    """Add a record to in-memory bucket values, same rules as ``update_rollups``"""
+    bucket['count'] += 1
+    bucket['price_sum'] += record.moex_price
+    bucket['pb_sum'] += record.pb_ratio
+    bucket['price_min'] = min(bucket['price_min'], record.moex_price)
+    bucket['price_max'] = max(bucket['price_max'], record.moex_price)
+    bucket['pb_min'] = min(bucket['pb_min'], record.pb_ratio)
+    bucket['pb_max'] = max(bucket['pb_max'], record.pb_ratio)
+    if record.timestamp < bucket['first_timestamp']:
+        bucket.update(first_timestamp=record.timestamp, price_first=record.moex_price, pb_first=record.pb_ratio)
+    if record.timestamp >= bucket['last_timestamp']:
+        bucket.update(last_timestamp=record.timestamp, price_last=record.moex_price, pb_last=record.pb_ratio)
+
+
+def _add_to_bucket(record: PriceHistory, resolution: str, bucket_start: dt.datetime) -> int:
+    """Single UPDATE folding the record into an existing bucket, number of rows updated"""
+    price, pb_ratio, timestamp = record.moex_price, record.pb_ratio, record.timestamp
+    # All right-hand sides see the old row, so first/last compare with the old timestamps
+    return PriceRollup.objects.filter(resolution=resolution, bucket_start=bucket_start).update(
+        count=F('count') + 1,
+        price_sum=F('price_sum') + price,
+        pb_sum=F('pb_sum') + pb_ratio,
+        price_min=Least('price_min', Value(price)),
+        price_max=Greatest('price_max', Value(price)),
+        pb_min=Least('pb_min', Value(pb_ratio)),
+        pb_max=Greatest('pb_max', Value(pb_ratio)),
+        price_first=Case(When(first_timestamp__gt=timestamp, then=Value(price)), default=F('price_first')),
+        pb_first=Case(When(first_timestamp__gt=timestamp, then=Value(pb_ratio)), default=F('pb_first')),
+        first_timestamp=Least('first_timestamp', Value(timestamp)),
+        price_last=Case(When(last_timestamp__lte=timestamp, then=Value(price)), default=F('price_last')),
+        pb_last=Case(When(last_timestamp__lte=timestamp, then=Value(pb_ratio)), default=F('pb_last')),
+        last_timestamp=Greatest('last_timestamp', Value(timestamp)),
+    )
+
+
+def update_rollups(record: PriceHistory) -> None:
+    """Add one history record to its hour, day and month buckets.
+
+    The running aggregates are computed by the database in one UPDATE per
+    bucket, so concurrent writers never lose increments; the bucket row is
+    created by the first record that falls into it.
+    """
+    for resolution in RESOLUTIONS:
+        bucket_start = get_bucket_start(record.timestamp, resolution)
+        if _add_to_bucket(record, resolution, bucket_start):
+            continue
+        try:
+            with transaction.atomic():
+                PriceRollup.objects.create(resolution=resolution, bucket_start=bucket_start, **_new_bucket(record))
+        except IntegrityError:
+            # Another process created the bucket in between
+            _add_to_bucket(record, resolution, bucket_start)
+
+
+def compute_rollups(records: Iterable[PriceHistory]) -> Dict[Tuple[str, dt.datetime], Dict[str, Any]]:
+    """Rollups of the given records computed from scratch"""
+    buckets: Dict[Tuple[str, dt.datetime], Dict[str, Any]] = {}
+    for record in records:
+        for resolution in RESOLUTIONS:
+            key = (resolution, get_bucket_start(record.timestamp, resolution))
+            if key in buckets:
+                _fold(buckets[key], record)
+            else:
+                buckets[key] = _new_bucket(record)
+    return buckets
+
+
+def _iter_history() -> Iterable[PriceHistory]:
+    return PriceHistory.objects.order_by('timestamp').only(
+        'timestamp', 'moex_price', 'pb_ratio').iterator(chunk_size=5000)
+
+
+def verify_rollups() -> List[str]:
+    """Compare stored rollups with ones recomputed from raw history"""
+    expected = compute_rollups(_iter_history())
+    stored = {(rollup.resolution, rollup.bucket_start): rollup for rollup in PriceRollup.objects.all()}
+    problems = []
+
+    for key in sorted(expected.keys() - stored.keys()):
+        problems.append(f'missing {key[0]} {key[1].isoformat()}')
+    for key in sorted(stored.keys() - expected.keys()):
+        problems.append(f'orphan {key[0]} {key[1].isoformat()}')
+    for key in sorted(expected.keys() & stored.keys()):
+        rollup = stored[key]
+        for name, value in expected[key].items():
+            actual = getattr(rollup, name)
+            if name.endswith('_sum'):
+                matches = abs(actual - value) <= SUM_TOLERANCE * max(1.0, abs(value))
+            else:
+                matches = actual == value
+            if not matches:
+                problems.append(f'{key[0]} {key[1].isoformat()} {name}: {actual} != {value}')
+    return problems
+
+
+def rebuild_rollups() -> int:
+    """Replace all rollups with ones recomputed from raw history"""
+    buckets = compute_rollups(_iter_history())
+    with transaction.atomic():
+        PriceRollup.objects.all().delete()
+        PriceRollup.objects.bulk_create(
+            [PriceRollup(resolution=resolution, bucket_start=bucket_start, **values)
+             for (resolution, bucket_start), values in buckets.items()],
+            batch_size=1000,
+        )
+    logger.info('Rebuilt %s history rollups', len(buckets))
+    return len(buckets)
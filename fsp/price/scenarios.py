@@ -0,0 +1,121 @@
+"""What-if calculator: fair price, P/B and score over parameter grids"""
+import base64
+import hashlib
+import json
+import math
+from typing import Any, Dict, List
+
+from django.core.cache import caches
+
+# Score codes used in the score matrix, same bands as SberPriceService.get_price_score
+SCORE_LABELS = ['дешево', 'справедливо', 'чуть дорого', 'дорого']
+
+MAX_AXIS_STEPS = 1000
+MAX_SHARES_VARIANTS = 10
+# prices x growth rates x shares: a full 1000 x 1000 grid for one share count,
+# about 4 MB of JSON with the packed matrices
+MAX_CELLS = 1_000_000
+# P/B hundredths are packed as uint16, higher values saturate
+MAX_PB_RATIO_X100 = 2 ** 16 - 1
+SCENARIO_CACHE_TIMEOUT = 600
+
+
+class ScenarioError(ValueError):
+    """Invalid scenario parameters"""
+
+
+def parse_axis(value: str, name: str) -> List[float]:
+    """Parse ``start:stop:steps`` range or comma separated list of values"""
+    try:
+        if ':' in value:
+            start, stop, steps = value.split(':')
+            start, stop, steps = float(start), float(stop), int(steps)
+        else:
+            values = [float(item) for item in value.split(',') if item.strip()]
+    except ValueError:
+        raise ScenarioError(f'{name}: ожидается диапазон start:stop:steps или список через запятую')
+
+    if ':' in value:
+        if not 1 <= steps <= MAX_AXIS_STEPS:
+            raise ScenarioError(f'{name}: число шагов должно быть от 1 до {MAX_AXIS_STEPS}')
+        step = (stop - start) / (steps - 1) if steps > 1 else 0
+        values = [start + step * i for i in range(steps)]
+
+    if not 1 <= len(values) <= MAX_AXIS_STEPS:
+        raise ScenarioError(f'{name}: число значений должно быть от 1 до {MAX_AXIS_STEPS}')
+    # nan and inf parse as floats but turn into garbage P/B integers
+    if not all(math.isfinite(item) for item in values):
+        raise ScenarioError(f'{name}: значения должны быть конечными числами')
+    return values
+
+
+def build_scenario(own_capital: int, prices: List[float], growth_rates: List[float],
+                   shares: List[float]) -> Dict[str, Any]:
+    """Compute scenario matrices.
+
+    ``fair_price`` has shape (shares, growth) and ``pb_ratio_x100``/``score``
+    have shape (shares, growth, price), ready to be drawn as one heatmap per
+    share count. Both are sent as base64 of packed little-endian arrays
+    (``uint16`` P/B hundredths, saturating at 655.35, and ``uint8`` score
+    codes): a million cells are 3 MB instead of tens of MB of JSON lists.
+    """
+    import numpy as np
+
+    if len(shares) > MAX_SHARES_VARIANTS:
+        raise ScenarioError(f'shares: не больше {MAX_SHARES_VARIANTS} вариантов')
+    if len(prices) * len(growth_rates) * len(shares) > MAX_CELLS:
+        raise ScenarioError(f'Не больше {MAX_CELLS} сочетаний price × growth × shares')
+    if any(quantity <= 0 for quantity in shares):
+        raise ScenarioError('shares: количество акций должно быть положительным')
+    if any(rate <= -1 for rate in growth_rates):
+        raise ScenarioError('growth: изменение капитала должно быть больше -100%')
+    if any(price < 0 for price in prices):
+        raise ScenarioError('price: цена не может быть отрицательной')
+
+    price_axis = np.asarray(prices, dtype=np.float64)
+    growth_axis = np.asarray(growth_rates, dtype=np.float64)
+    shares_axis = np.asarray(shares, dtype=np.float64)
+
+    capital = own_capital * (1 + growth_axis)
+    fair_price = np.round(capital[None, :] / shares_axis[:, None], 2)
+    if not (fair_price > 0).all():
+        raise ScenarioError('shares: слишком много акций, справедливая цена округляется до нуля')
+
+    pb_ratio_x100 = np.rint(price_axis[None, None, :] * 100 / fair_price[:, :, None])
+    score = np.select([pb_ratio_x100 < 100, pb_ratio_x100 <= 120, pb_ratio_x100 < 140], [0, 1, 2], 3)
+    pb_ratio_x100 = np.minimum(pb_ratio_x100, MAX_PB_RATIO_X100)
+
+    return {
+        'own_capital': own_capital,
+        'prices': price_axis.round(2).tolist(),
+        'growth_rates': growth_axis.round(4).tolist(),
+        'shares': shares_axis.tolist(),
+        'fair_price': fair_price.tolist(),
+        'pb_ratio_x100': _pack(pb_ratio_x100, '<u2'),
+        'score': _pack(score, 'u1'),
+        'score_labels': SCORE_LABELS,
+    }
+
+
+def _pack(matrix, dtype: str) -> str:
+    return base64.b64encode(matrix.astype(dtype).tobytes()).decode('ascii')
+
+
+def get_scenario_json(own_capital: int, prices: List[float], growth_rates: List[float],
+                      shares: List[float]) -> bytes:
+    """Return pre-encoded scenario JSON, cached per parameter set.
+
+    Kept in the on-disk shared cache: a few responses of several MB would
+    otherwise sit in the memory of every worker.
+    """
+    params = json.dumps([own_capital, prices, growth_rates, shares])
+    cache_key = f'scenario_{hashlib.sha1(params.encode()).hexdigest()}'
+    cached = caches['shared'].get(cache_key)
+    if cached is not None:
+        return cached
+
+    scenario = build_scenario(own_capital, prices, growth_rates, shares)
+    content = json.dumps({'success': True, 'data': scenario}, ensure_ascii=False,
+                         separators=(',', ':')).encode()
+    caches['shared'].set(cache_key, content, SCENARIO_CACHE_TIMEOUT)
+    return content
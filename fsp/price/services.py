@@ -1,17 +1,52 @@
 import datetime as dt
+import hashlib
 import os
+import threading
 import time
-import requests
-from lxml import html
-from typing import Optional, Dict, Any
+from typing import TYPE_CHECKING, Optional, Dict, Any, List, Tuple
 
 from django.conf import settings
-from django.core.cache import cache
+from django.core.cache import cache, caches
+from django.db import connections
 from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
 import logging
 
+from .cbr import get_own_capital, parse_form123
+from .exchange import get_calendar
+from .fairvalue import CapitalCurve, build_curve, parse_dividends
+from .health import record_refresh
+from .leader import refresh_leader
+from .microcache import purge_in_background
+from .models import PriceHistory
+from .resilience import CircuitBreaker, get_endpoint
+from .snapshot import CurrentSnapshot
+from .trades import get_vwap, ingest_trades
+from .writer import history_writer, write_history
+
+if TYPE_CHECKING:
+    import requests
+
 logger = logging.getLogger('price')
 
+# Last known good data, kept on disk so that restarts start warm
+SNAPSHOT_CACHE_KEY = 'last_known_good_snapshot'
+# How soon a follower looks again when the leader has not published fresh data yet
+FOLLOWER_RETRY_SECONDS = 5
+
+
+def get_score(pb_ratio: Optional[float]) -> str:
+    """Price evaluation for the given P/B ratio"""
+    if pb_ratio is None:
+        return 'неизвестно'
+    if pb_ratio < 1:
+        return 'дешево'
+    elif 1 <= pb_ratio <= 1.2:
+        return 'справедливо'
+    elif 1.2 < pb_ratio < 1.4:
+        return 'чуть дорого'
+    return 'дорого'
+
 
 class SberPriceService:
     """Service class for handling Sber price calculations and data fetching"""
@@ -21,8 +56,25 @@ class SberPriceService:
         self.cbr_base_url = settings.CBR_BASE_URL
         self.headers = {
             'User-Agent': ('Mozilla/5.0 (Macintosh; Intel Mac OS X 10.9; rv:45.0)'
-                          'Gecko/20100101 Firefox/45.0')
+                          'Gecko/20100101 Firefox/45.0'),
         }
+        # Created on first use to keep requests out of the startup path
+        self._session: Optional['requests.Session'] = None
+        # ETag/Last-Modified validators (with the last body) per URL, in the
+        # on-disk state cache so revalidation survives restarts and recycling
+        self.http_validators_timeout = 604800
+        # In-session TTLs; while the exchange is closed data lives until the
+        # next session opens, up to the closed_* caps (price.exchange)
+        self.current_data_timeout = 120
+        self.closed_current_data_timeout = 1800
+        self.price_timeout = 300
+        self.closed_price_timeout = 6 * 3600
+        # (expires_at on the monotonic clock, snapshot): kept as a plain object
+        # so readers in this process share it without pickling on every read
+        self._current: Optional[Tuple[float, CurrentSnapshot]] = None
+        # The persisted snapshot is read on first use, not at import
+        self._snapshot_loaded = False
+        self._refresh_lock = threading.Lock()
         
         # MOEX API URLs: try HTTPS first, then HTTP fallback if configured
         self.moex_url_templates = {
@@ -36,30 +88,134 @@ class SberPriceService:
         self.moex_max_total_seconds = float(os.getenv('MOEX_MAX_TOTAL_SECONDS', '12'))
         self.cbr_request_timeout = float(os.getenv('CBR_REQUEST_TIMEOUT', '8'))
         self.cbr_retries = int(os.getenv('CBR_RETRIES', '2'))
+        # Request timeouts above are upper bounds; actual ones follow observed latency
+        self.breaker_failure_threshold = int(os.getenv('BREAKER_FAILURE_THRESHOLD', '3'))
+        self.breaker_recovery_timeout = float(os.getenv('BREAKER_RECOVERY_SECONDS', '60'))
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        # Form 123 is published monthly: keep a report well past the next
+        # publication and retry a missing one at most once per interval
+        self.cbr_report_cache_timeout = 40 * 24 * 3600
+        self.cbr_retry_interval = int(os.getenv('CBR_RETRY_INTERVAL', '3600'))
+        # 'interpolated' smooths capital between reports, 'monthly' uses the latest report as is
+        self.fair_value_model = os.getenv('FAIR_VALUE_MODEL', 'interpolated')
+        self.fair_value_months = 3
+        self.dividends = parse_dividends(settings.SBER_DIVIDENDS)
+        self._curve: Optional[Tuple[Any, Optional[CapitalCurve]]] = None
     
-    def _make_api_call(self, url: str, api_name: str, timeout: int = 20, retries: int = 3) -> Optional[requests.Response]:
-        """Make API call with error handling and retry logic"""
+    @property
+    def session(self) -> 'requests.Session':
+        """Keep-alive HTTP session to MOEX/CBR shared between calls"""
+        if self._session is None:
+            import requests
+
+            self._session = requests.Session()
+            self._session.headers.update(self.headers)
+            # Includes br when brotli is installed (urllib3 decodes it transparently)
+            self._session.headers['Accept-Encoding'] = requests.utils.DEFAULT_ACCEPT_ENCODING
+        return self._session
+
+    def _make_api_call(self, url: str, api_name: str, timeout: int = 20, retries: int = 3) -> Optional['requests.Response']:
+        """Make conditional API call with error handling and retry logic.
+
+        A 304 Not Modified answer is returned as a 200 response carrying the
+        body stored with the validators, so callers don't have to care.
+        """
+        import requests
+
+        validators_key = self._get_validators_key(url)
+        breaker = self.get_breaker(url)
+
         for attempt in range(retries):
+            if not breaker.allow():
+                logger.warning('API call to %s skipped: circuit breaker for %s is open', api_name, breaker.endpoint)
+                return None
+
             start_time = time.time()
             
             try:
-                response = requests.get(url, headers=self.headers, timeout=timeout)
+                validators = caches['state'].get(validators_key)
+                response = self.session.get(
+                    url,
+                    headers=self._get_conditional_headers(validators),
+                    timeout=breaker.get_timeout(timeout),
+                )
+
+                elapsed = time.time() - start_time
+                response_time = int(elapsed * 1000)
+                if response.status_code == 304 and validators is not None:
+                    response.status_code = 200
+                    response._content = validators['content']
+                    caches['state'].set(validators_key, validators, self.http_validators_timeout)
+                    breaker.record_success(elapsed)
+                    logger.info('API call to %s not modified: 304 (%sms) [attempt %s/%s]', api_name, response_time,
+                                attempt + 1, retries)
+                    return response
+
                 response.raise_for_status()
-                
-                response_time = int((time.time() - start_time) * 1000)
-                logger.info(f"API call to {api_name} successful: {response.status_code} ({response_time}ms) [attempt {attempt + 1}/{retries}]")
+                self._store_validators(validators_key, response)
+                breaker.record_success(elapsed)
+
+                logger.info('API call to %s successful: %s (%sms) [attempt %s/%s]', api_name, response.status_code, response_time,
+                            attempt + 1, retries)
                 return response
                 
             except requests.exceptions.RequestException as e:
-                response_time = int((time.time() - start_time) * 1000)
+                # Client errors (e.g. unpublished CBR report) don't mean the endpoint is down
+                if not (isinstance(e, requests.HTTPError) and e.response is not None
+                        and e.response.status_code < 500):
+                    breaker.record_failure()
                 if attempt < retries - 1:
-                    logger.warning(f"API call to {api_name} failed (attempt {attempt + 1}/{retries}): {e}, retrying...")
+                    logger.warning('API call to %s failed (attempt %s/%s): %s, retrying...', api_name, attempt + 1, retries, e)
                     time.sleep(1)  # Wait 1 second before retry
                 else:
-                    logger.error(f"API call to {api_name} failed after {retries} attempts: {e}")
+                    logger.error('API call to %s failed after %s attempts: %s', api_name, retries, e)
         
         return None
-    
+
+    def get_breaker(self, url: str) -> CircuitBreaker:
+        """Get circuit breaker for the endpoint serving the given URL"""
+        endpoint = get_endpoint(url)
+        breaker = self._breakers.get(endpoint)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                endpoint,
+                failure_threshold=self.breaker_failure_threshold,
+                recovery_timeout=self.breaker_recovery_timeout,
+            )
+            self._breakers[endpoint] = breaker
+        return breaker
+
+    def get_breakers(self) -> list[CircuitBreaker]:
+        """Get circuit breakers of all configured upstream endpoints"""
+        return [self.get_breaker(url) for url in [*self.moex_base_urls, self.cbr_base_url]]
+
+    def _get_validators_key(self, url: str) -> str:
+        """Cache key for HTTP validators of the given URL"""
+        return f'http_validators_{hashlib.sha1(url.encode()).hexdigest()}'
+
+    def _get_conditional_headers(self, validators: Optional[Dict[str, Any]]) -> Dict[str, str]:
+        """Build If-None-Match/If-Modified-Since headers from stored validators"""
+        headers = {}
+        if validators is None:
+            return headers
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+        return headers
+
+    def _store_validators(self, validators_key: str, response: 'requests.Response') -> None:
+        """Remember response validators so the next call can be revalidated"""
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if not etag and not last_modified:
+            return
+
+        caches['state'].set(validators_key, {
+            'etag': etag,
+            'last_modified': last_modified,
+            'content': response.content,
+        }, self.http_validators_timeout)
 
     def _get_moex_base_urls(self) -> list[str]:
         """Return MOEX base URLs in priority order."""
@@ -77,8 +233,8 @@ class SberPriceService:
             return now.strftime('%m')
         return (now - dt.timedelta(days=27)).strftime('%m')
     
-    def get_cbr_url(self, used_month: str) -> str:
-        """Generate CBR URL for the given month"""
+    def get_cbr_report_date(self, used_month: str) -> str:
+        """Get the CBR report date (first day of month) for the given month"""
         now = timezone.localtime(timezone.now())
         used_month_int = int(used_month)
 
@@ -88,67 +244,114 @@ class SberPriceService:
         if now.day <= 25 and used_month_int > now.month:
             year -= 1
 
-        return f'{self.cbr_base_url}?regnum=1481&dt={year}-{used_month}-01'
-    
-    def parse_own_capital(self) -> Optional[int]:
-        """Parse own capital from CBR website with caching"""
-        cache_key = f'own_capital_{self.get_used_month()}'
-        cached_value = cache.get(cache_key)
-        
-        if cached_value is not None:
-            logger.info(f'Using cached own capital: {cached_value}')
-            return cached_value
-        
+        return f'{year}-{used_month}-01'
+
+    def get_cbr_url(self, used_month: str) -> str:
+        """Generate CBR URL for the given month"""
+        return f'{self.cbr_base_url}?regnum=1481&dt={self.get_cbr_report_date(used_month)}'
+
+    def get_capital_report(self, report_date: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Get the complete form 123 report for the given date.
+
+        Without a date the current report is returned, reusing the latest
+        available one until the new month's report is published.
+        """
+        is_current = report_date is None
+        if is_current:
+            report_date = self.get_cbr_report_date(self.get_used_month())
+        cache_key = f'cbr_form123_{report_date}'
+        cached_report = cache.get(cache_key)
+
+        if cached_report is not None:
+            return cached_report
+
+        # Don't hammer CBR while the new month's report is not published yet
+        if cache.get(f'{cache_key}_missing') is None:
+            report = self._fetch_capital_report(report_date)
+            if report is not None:
+                cache.set(cache_key, report, self.cbr_report_cache_timeout)
+                if is_current:
+                    cache.set('cbr_form123_latest', report, self.cbr_report_cache_timeout)
+                logger.info('Parsed and cached form 123 report for %s: %s components',
+                            report_date, len(report['components']))
+                return report
+            cache.set(f'{cache_key}_missing', True, self.cbr_retry_interval)
+
+        if not is_current:
+            return None
+
+        latest_report = cache.get('cbr_form123_latest')
+        if latest_report is not None:
+            logger.warning('Form 123 report for %s is unavailable, using report for %s',
+                           report_date, latest_report['report_date'])
+        return latest_report
+
+    def _fetch_capital_report(self, report_date: str) -> Optional[Dict[str, Any]]:
+        """Download and parse the form 123 report for the given date"""
         try:
-            url = self.get_cbr_url(self.get_used_month())
+            url = f'{self.cbr_base_url}?regnum=1481&dt={report_date}'
             response = self._make_api_call(url, 'cbr', timeout=self.cbr_request_timeout, retries=self.cbr_retries)
-            
+
             if not response:
                 return None
-            
-            tree = html.fromstring(response.content)
-            
-            # Try multiple XPath expressions for robustness
-            xpath_expressions = [
-                '/html/body/main/div/div/div/div[3]/div[2]/table/tr[2]/td[3]/text()',
-                '//table//tr[2]/td[3]/text()',
-                '//td[contains(@class, "capital")]/text()',
-            ]
-            
-            parsed_string = None
-            for xpath in xpath_expressions:
-                try:
-                    result = tree.xpath(xpath)
-                    if result:
-                        parsed_string = result[0]
-                        break
-                except Exception as e:
-                    logger.warning(f"XPath {xpath} failed: {e}")
-                    continue
-            
-            if not parsed_string:
-                logger.error("Could not parse own capital from CBR website")
+
+            components = parse_form123(response.content)
+            if not components:
+                logger.error('Could not parse form 123 report for %s from CBR website', report_date)
                 return None
-            
-            own_capital = int(parsed_string.replace(' ', '')) * 1000
-            
-            # Cache for 1 hour
-            cache.set(cache_key, own_capital, 3600)
-            logger.info(f'Parsed and cached own capital: {own_capital}')
-            
-            return own_capital
-            
+
+            return {'report_date': report_date, 'components': components}
+
         except Exception as e:
-            logger.error(f"Error parsing own capital: {e}")
+            logger.error('Error parsing form 123 report: %s', e)
             return None
-    
+
+    def get_capital_knots(self, months: int) -> List[Tuple[dt.date, int]]:
+        """Own capital of the last ``months`` monthly reports as (report date, capital)"""
+        current_report = self.get_capital_report()
+        if current_report is None:
+            return []
+
+        report_date = dt.date.fromisoformat(current_report['report_date'])
+        knots = []
+        for _ in range(months):
+            report = (current_report if report_date.isoformat() == current_report['report_date']
+                      else self.get_capital_report(report_date.isoformat()))
+            own_capital = get_own_capital(report['components']) if report is not None else None
+            if own_capital is not None:
+                knots.append((report_date, own_capital))
+            report_date = (report_date - dt.timedelta(days=1)).replace(day=1)
+        return knots
+
+    def get_capital_curve(self, months: Optional[int] = None) -> Optional[CapitalCurve]:
+        """Interpolated capital curve over recent reports, rebuilt only when they change"""
+        knots = self.get_capital_knots(months or self.fair_value_months)
+        curve_key = (tuple(knots), tuple(self.dividends), self.stocks_quantity)
+        if self._curve is not None and self._curve[0] == curve_key:
+            return self._curve[1]
+
+        curve = build_curve(knots, self.dividends, self.stocks_quantity)
+        self._curve = (curve_key, curve)
+        return curve
+
+    def parse_own_capital(self) -> Optional[int]:
+        """Get own capital from the current form 123 report"""
+        report = self.get_capital_report()
+        if report is None:
+            return None
+
+        own_capital = get_own_capital(report['components'])
+        if own_capital is None:
+            logger.error("Could not find own capital in form 123 report")
+        return own_capital
+
     def get_moex_price(self) -> Optional[float]:
         """Get MOEX price with fallback options and caching"""
         cache_key = 'moex_price'
         cached_value = cache.get(cache_key)
         
         if cached_value is not None:
-            logger.info(f'Using cached MOEX price: {cached_value}')
+            logger.debug('Using cached MOEX price: %s', cached_value)
             return cached_value
         
         # Try different price sources in order of preference and base URL failover
@@ -156,10 +359,14 @@ class SberPriceService:
         deadline = start_time + self.moex_max_total_seconds
 
         for base_url in self.moex_base_urls:
+            if self.get_breaker(base_url).get_status() == 'open':
+                logger.warning('Skipping %s: circuit breaker is open', base_url)
+                continue
+
             for price_type, url_template in self.moex_url_templates.items():
                 if time.monotonic() >= deadline:
                     elapsed = round(time.monotonic() - start_time, 2)
-                    logger.warning(f"MOEX lookup budget exceeded ({elapsed}s). Returning best available data.")
+                    logger.warning('MOEX lookup budget exceeded (%ss). Returning best available data.', elapsed)
                     break
 
                 try:
@@ -183,16 +390,14 @@ class SberPriceService:
                         price = data['marketdata']['data'][0][0]
 
                     if price is not None:
-                        # Cache for 5 minutes during trading hours, 30 minutes otherwise
-                        cache_timeout = 300 if self._is_trading_hours() else 1800
-                        cache.set(cache_key, price, cache_timeout)
+                        cache.set(cache_key, price, self.get_price_timeout())
                         # Also save as fallback with longer TTL (7 days)
                         cache.set(f'{cache_key}_fallback', price, 604800)
-                        logger.info(f'Got MOEX price from {price_type} ({base_url}): {price}')
+                        logger.info('Got MOEX price from %s (%s): %s', price_type, base_url, price)
                         return price
 
                 except (KeyError, IndexError, ValueError) as e:
-                    logger.warning(f"Failed to parse {price_type} price from {base_url}: {e}")
+                    logger.warning('Failed to parse %s price from %s: %s', price_type, base_url, e)
                     continue
             else:
                 continue
@@ -201,25 +406,45 @@ class SberPriceService:
         # If all sources failed, try to use fallback cache
         fallback_value = cache.get(f'{cache_key}_fallback')
         if fallback_value is not None:
-            logger.warning(f'Using fallback MOEX price (may be stale): {fallback_value}')
+            logger.warning('Using fallback MOEX price (may be stale): %s', fallback_value)
             return fallback_value
         
         logger.error("Could not get MOEX price from any source")
         return None
     
     def _is_trading_hours(self) -> bool:
-        """Check if current time is during trading hours"""
-        now = timezone.localtime(timezone.now())
-        return (now.weekday() < 5 and 10 <= now.hour < 19)
+        """Check if a MOEX session (morning, main, evening or weekend) is running"""
+        return get_calendar().current_session() is not None
+
+    def get_price_timeout(self) -> int:
+        """MOEX price TTL: 5 minutes in a session, until the next session otherwise"""
+        if self._is_trading_hours():
+            return self.price_timeout
+        return get_calendar().ttl(self.price_timeout, self.closed_price_timeout)
+
+    def get_current_data_timeout(self) -> int:
+        """Snapshot TTL, i.e. refresh cadence: the price does not move while the market is closed"""
+        return get_calendar().ttl(self.current_data_timeout, self.closed_current_data_timeout)
     
     def get_fair_price(self) -> Optional[float]:
-        """Calculate fair price based on own capital"""
+        """Calculate fair price based on own capital.
+
+        With the interpolated model capital moves smoothly between monthly
+        reports instead of jumping when the report month rolls over.
+        """
+        if self.fair_value_model == 'interpolated':
+            curve = self.get_capital_curve()
+            if curve is not None:
+                fair_price = curve.fair_price_at(timezone.now().timestamp())
+                logger.info('Calculated interpolated fair price: %s', fair_price)
+                return fair_price
+
         own_capital = self.parse_own_capital()
         if own_capital is None:
             return None
         
         fair_price = round(own_capital / self.stocks_quantity, 2)
-        logger.info(f'Calculated fair price: {fair_price}')
+        logger.info('Calculated fair price: %s', fair_price)
         return fair_price
     
     def get_pb_ratio(self) -> Optional[float]:
@@ -231,66 +456,228 @@ class SberPriceService:
             return None
         
         pb_ratio = round(moex_price / fair_price, 2)
-        logger.info(f'Calculated P/B ratio: {pb_ratio}')
+        logger.info('Calculated P/B ratio: %s', pb_ratio)
         return pb_ratio
     
     def get_price_score(self) -> str:
         """Get price evaluation based on P/B ratio"""
-        pb_ratio = self.get_pb_ratio()
-        
-        if pb_ratio is None:
-            return 'неизвестно'
-        
-        if pb_ratio < 1:
-            return 'дешево'
-        elif 1 <= pb_ratio <= 1.2:
-            return 'справедливо'
-        elif 1.2 < pb_ratio < 1.4:
-            return 'чуть дорого'
-        return 'дорого'
+        return get_score(self.get_pb_ratio())
     
+    def get_current_snapshot(self) -> CurrentSnapshot:
+        """Get current price snapshot, refreshing it once it expires.
+
+        Only one thread refreshes at a time; while it does, others get the
+        expired snapshot instead of waiting (unless there is none yet). The
+        first call of a process starts from the persisted snapshot.
+        """
+        current = self._current
+        if current is not None and time.monotonic() < current[0]:
+            return current[1]
+        if not self._refresh_lock.acquire(blocking=current is None):
+            return current[1]
+        try:
+            if self._current is None and not self._snapshot_loaded:
+                self.load_snapshot()
+            current = self._current
+            if current is not None and time.monotonic() < current[0]:
+                return current[1]
+            return self.refresh_or_follow()
+        finally:
+            self._refresh_lock.release()
+
+    def refresh_or_follow(self) -> CurrentSnapshot:
+        """Refresh as the leader; followers take the snapshot the leader published.
+
+        With LEADER_ELECTION only the lease holder calls MOEX/CBR, so upstream
+        load does not grow with the number of replicas. A follower with
+        nothing to serve at all (cold start) refreshes by itself.
+        """
+        if not settings.LEADER_ELECTION or refresh_leader.acquire():
+            return self.refresh()
+
+        self.load_snapshot()
+        current = self._current
+        if current is None:
+            logger.warning('No published snapshot yet, refreshing as follower')
+            return self.refresh()
+        if time.monotonic() >= current[0]:
+            self.set_current_snapshot(current[1], FOLLOWER_RETRY_SECONDS)
+        return current[1]
+
+    def is_current_stale(self, margin: float = 0) -> bool:
+        """Whether the snapshot is missing or expires within ``margin`` seconds"""
+        return self._current is None or time.monotonic() + margin >= self._current[0]
+
+    def current_expires_in(self) -> float:
+        """Seconds until the held snapshot is due for a refresh, 0 when stale"""
+        if self._current is None:
+            return 0
+        return max(0.0, self._current[0] - time.monotonic())
+
+    def peek_current_snapshot(self) -> Optional[CurrentSnapshot]:
+        """Last computed snapshot, even if expired, without refreshing"""
+        return self._current[1] if self._current is not None else None
+
     def get_current_data(self) -> Dict[str, Any]:
-        """Get all current price data with caching"""
-        cache_key = 'current_data_complete'
-        cached_data = cache.get(cache_key)
-        
-        if cached_data is not None:
-            logger.info('Using cached complete current data')
-            return cached_data
-        
+        """Get all current price data as a dict"""
+        return self.get_current_snapshot().as_dict()
+
+    def set_current_snapshot(self, snapshot: CurrentSnapshot, timeout: Optional[float] = None) -> None:
+        if timeout is None:
+            timeout = self.get_current_data_timeout()
+        self._current = (time.monotonic() + timeout, snapshot)
+
+    def reset_current_snapshot(self) -> None:
+        self._current = None
+
+    def ingest_trades(self) -> Optional[float]:
+        """Pull new SBER trades into minute bars, return today's VWAP.
+
+        Once ingestion has caught up, the last trade price is cached as the
+        MOEX price, so a refresh with new trades needs no separate LAST request.
+        """
+        try:
+            new_trades, last_price = ingest_trades(self)
+            if new_trades and last_price is not None:
+                cache.set('moex_price', last_price, self.get_price_timeout())
+                cache.set('moex_price_fallback', last_price, 604800)
+            return get_vwap()
+        except Exception as e:
+            logger.error('Trades ingestion failed: %s', e)
+            return None
+
+    def refresh(self) -> CurrentSnapshot:
+        """Compute fresh current data, cache it and persist it as last known good"""
+        vwap = self.ingest_trades() if settings.TRADES_INGESTION else None
         moex_price = self.get_moex_price()
         fair_price = self.get_fair_price()
         
-        pb_ratio = None
+        pb_ratio = pb_vwap = None
         if moex_price is not None and fair_price is not None:
             pb_ratio = round(moex_price / fair_price, 2)
+        if vwap is not None and fair_price is not None:
+            pb_vwap = round(vwap / fair_price, 2)
         
-        price_score = 'неизвестно'
-        if pb_ratio is not None:
-            if pb_ratio < 1:
-                price_score = 'дешево'
-            elif 1 <= pb_ratio <= 1.2:
-                price_score = 'справедливо'
-            elif 1.2 < pb_ratio < 1.4:
-                price_score = 'чуть дорого'
-            else:
-                price_score = 'дорого'
-        
-        data = {
-            'moex_price': moex_price,
-            'fair_price': fair_price,
-            'fair_price_20_percent': round(fair_price * 1.2, 2) if fair_price else None,
-            'pb_ratio': pb_ratio,
-            'price_score': price_score,
-            'timestamp': timezone.now()
-        }
+        snapshot = CurrentSnapshot.create(
+            moex_price=moex_price,
+            fair_price=fair_price,
+            fair_price_20_percent=round(fair_price * 1.2, 2) if fair_price else None,
+            pb_ratio=pb_ratio,
+            price_score=get_score(pb_ratio),
+            timestamp=timezone.now(),
+            vwap=vwap,
+            pb_vwap=pb_vwap,
+        )
         
-        # Cache for 2 minutes
-        cache.set(cache_key, data, 120)
+        previous = self.peek_current_snapshot()
+        self.set_current_snapshot(snapshot)
         logger.info('Cached complete current data')
+
+        if snapshot.is_complete:
+            self.save_snapshot(snapshot)
+            self.record_history(snapshot)
+            record_refresh(success=True)
+            # Pages cached by nginx show the old values until refreshed
+            if previous is None or previous.as_dict() | {'timestamp': None} != snapshot.as_dict() | {'timestamp': None}:
+                purge_in_background()
+        else:
+            record_refresh(success=False)
         
-        return data
+        return snapshot
+
+    def record_history(self, snapshot: CurrentSnapshot) -> None:
+        """Append refreshed data to the price history and its rollups"""
+        try:
+            if settings.HISTORY_WRITE_QUEUE:
+                history_writer.submit(snapshot)
+            else:
+                write_history([snapshot])
+        except Exception as e:
+            logger.error('Could not record price history: %s', e)
+
+    def save_snapshot(self, current: CurrentSnapshot) -> None:
+        """Persist the last known good snapshot to the on-disk state cache"""
+        # Stored as plain dict so the file format does not depend on the class layout
+        snapshot = {
+            'current_data': current.as_dict(),
+            'capital_report': cache.get('cbr_form123_latest'),
+            'saved_at': time.time(),
+        }
+        try:
+            caches['state'].set(SNAPSHOT_CACHE_KEY, snapshot, None)
+        except Exception as e:
+            logger.error('Could not persist snapshot: %s', e)
+
+    def load_snapshot(self) -> bool:
+        """Warm the in-memory cache from the persisted snapshot.
+
+        Values are only served as fresh for what is left of their usual TTL;
+        beyond that they remain available as fallback during upstream outages.
+        """
+        self._snapshot_loaded = True
+        try:
+            snapshot = caches['state'].get(SNAPSHOT_CACHE_KEY)
+        except Exception as e:
+            logger.error('Could not load snapshot: %s', e)
+            return False
+
+        if snapshot is None:
+            return False
+
+        age = time.time() - snapshot['saved_at']
+        data = snapshot['current_data']
+
+        cache.set('moex_price_fallback', data['moex_price'], 604800)
+        price_timeout = self.get_price_timeout() - age
+        if price_timeout > 0:
+            cache.set('moex_price', data['moex_price'], price_timeout)
+        # Kept even when expired: served while the first refresh is in flight
+        current = self.peek_current_snapshot()
+        if current is None or current.timestamp < data['timestamp']:
+            self.set_current_snapshot(CurrentSnapshot.from_dict(data), self.get_current_data_timeout() - age)
+
+        report = snapshot['capital_report']
+        if report is not None:
+            cache.set('cbr_form123_latest', report, self.cbr_report_cache_timeout)
+            cache.set(f'cbr_form123_{report["report_date"]}', report, self.cbr_report_cache_timeout)
+
+        logger.info('Loaded snapshot saved %ss ago', int(age))
+        return True
+
+    def warm(self) -> None:
+        """Load the persisted snapshot in the gunicorn master before the first fork.
+
+        Workers inherit it copy-on-write. No upstream calls, leases or threads
+        here: the master outlives workers and whatever it opens is shared with
+        every child, so a missing snapshot is fetched by the workers instead.
+        """
+        self.load_snapshot()
+        self.reset_after_fork()
+        connections.close_all()
+
+    def reset_after_fork(self) -> None:
+        """Drop the HTTP session, its sockets belong to the parent process"""
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    def refresh_in_background(self, margin: float = 0) -> Optional[threading.Thread]:
+        """Refresh a stale snapshot in a thread while requests keep the old one"""
+        if not self.is_current_stale(margin):
+            return None
+
+        def run():
+            try:
+                self.get_current_snapshot()
+            except Exception as e:
+                logger.error('Background refresh failed: %s', e)
+            finally:
+                connections.close_all()
+
+        thread = threading.Thread(target=run, name='snapshot-refresh', daemon=True)
+        thread.start()
+        return thread
 
 
-# Global service instance
-sber_service = SberPriceService()
+# Global service instance, created on first use
+sber_service = SimpleLazyObject(SberPriceService)
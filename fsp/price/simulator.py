@@ -0,0 +1,344 @@
+"""Local MOEX ISS / CBR form 123 / Telegram Bot API simulator for load tests.
+
+A single WSGI app serves:
+
+* ``/iss/...SBER.json`` – ISS market data with a random-walk price;
+* ``/iss/...SBER/trades.json`` – trades along the same walk, honouring the
+  ``tradeno``/``next_trade`` cursor and ``limit``;
+* ``/f123/`` – form 123 HTML with own capital growing month to month;
+* ``/bot<token>/<method>`` – just enough of the Bot API for ``run_polling``:
+  ``getUpdates`` hands out synthetic ``/info`` commands and button presses at
+  a fixed rate and ``sendMessage``/``sendPhoto`` record the time to answer them;
+* ``/_simulator/stats`` – request counters and bot reply latencies.
+
+Point ``MOEX_BASE_URLS``, ``CBR_BASE_URL`` and ``TELEGRAM_API_BASE_URL`` at it.
+"""
+import datetime as dt
+import email.parser
+import email.policy
+import json
+import math
+import random
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence
+from urllib.parse import parse_qs
+
+ISS_PATH = '/iss/engines/stock/markets/shares/boards/TQBR/securities/SBER.json'
+ISS_TRADES_PATH = '/iss/engines/stock/markets/shares/boards/TQBR/securities/SBER/trades.json'
+CBR_PATH = '/f123/'
+STATS_PATH = '/_simulator/stats'
+
+# Own capital in thousands of rubles at the base date, as published in form 123
+BASE_CAPITAL = 7_500_000_000
+BASE_CAPITAL_DATE = dt.date(2026, 1, 1)
+
+
+@dataclass
+class SimulatorConfig:
+    latency: float = 0.05
+    jitter: float = 0.02
+    error_rate: float = 0.0
+    start_price: float = 300.0
+    # Standard deviation of the price per step, relative to the price
+    volatility: float = 0.001
+    monthly_capital_growth: float = 0.012
+    # Synthetic bot traffic: updates per second across ``chats`` users
+    updates_rate: float = 0.0
+    chats: int = 100
+    # Synthetic trades per second on the trades endpoint
+    trades_rate: float = 50.0
+    seed: Optional[int] = None
+
+
+def percentile(values: Sequence[float], share: float) -> Optional[float]:
+    """Nearest-rank percentile, None for no values"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(share * len(ordered)) - 1))]
+
+
+def latency_summary(latencies: Sequence[float]) -> Dict[str, Optional[float]]:
+    """p50/p95/p99/max in milliseconds"""
+    summary = {}
+    for name, share in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99), ('max', 1.0)):
+        value = percentile(latencies, share)
+        summary[name] = round(value * 1000, 1) if value is not None else None
+    return summary
+
+
+class PriceWalk:
+    """Thread-safe multiplicative random walk, one step per request"""
+
+    def __init__(self, start: float, volatility: float, rng: random.Random):
+        self.price = start
+        self.volatility = volatility
+        self._rng = rng
+        self._lock = threading.Lock()
+
+    def step(self) -> float:
+        with self._lock:
+            self.price = max(0.01, self.price * (1 + self._rng.gauss(0, self.volatility)))
+            return round(self.price, 2)
+
+
+class TradeTape:
+    """Trades generated at a fixed rate along the price walk, the last hour kept"""
+
+    COLUMNS = ['TRADENO', 'TRADEDATE', 'TRADETIME', 'PRICE', 'QUANTITY', 'VALUE']
+
+    def __init__(self, rate: float, price: PriceWalk, rng: random.Random):
+        self.rate = rate
+        self.price = price
+        self._rng = rng
+        self._lock = threading.Lock()
+        self._trades: deque = deque(maxlen=max(1, int(rate * 3600)))
+        self._tradeno = 10_000_000_000
+        self._generated_until = time.time()
+
+    def _generate(self) -> None:
+        now = time.time()
+        count = int((now - self._generated_until) * self.rate)
+        for index in range(count):
+            moment = dt.datetime.fromtimestamp(self._generated_until + (index + 1) / self.rate)
+            self._tradeno += 1
+            price = self.price.step()
+            quantity = self._rng.randint(1, 500) * 10
+            self._trades.append([self._tradeno, moment.date().isoformat(), moment.strftime('%H:%M:%S'),
+                                 price, quantity, round(price * quantity, 2)])
+        if count:
+            self._generated_until += count / self.rate
+
+    def page(self, query: Dict[str, str]) -> bytes:
+        limit = int(query.get('limit', 5000))
+        with self._lock:
+            self._generate()
+            trades = list(self._trades)
+        if 'tradeno' in query:
+            # Like ISS: from the given trade, or strictly after it with next_trade=1
+            first = int(query['tradeno']) + (1 if query.get('next_trade') == '1' else 0)
+            trades = [trade for trade in trades if trade[0] >= first]
+        else:
+            trades = trades[int(query.get('start', 0)):]
+        return json.dumps({'trades': {'columns': self.COLUMNS, 'data': trades[:limit]}}).encode()
+
+
+class FakeTelegram:
+    """Synthetic Bot API updates and reply latency bookkeeping"""
+
+    bot_user = {'id': 1, 'is_bot': True, 'first_name': 'Simulator', 'username': 'fsp_simulator_bot'}
+
+    def __init__(self, rate: float, chats: int, rng: random.Random):
+        self.rate = rate
+        self.chats = chats
+        self._rng = rng
+        self._lock = threading.Lock()
+        self._next_update_id = 1
+        self._next_message_id = 1
+        self._last_generated = time.monotonic()
+        self._queue: deque = deque()
+        # chat id -> times updates were handed to the bot, answered in order
+        self._pending: Dict[int, deque] = defaultdict(deque)
+        self.latencies: deque = deque(maxlen=100_000)
+        self.sent_updates = 0
+
+    def _make_update(self, now: float) -> Dict[str, Any]:
+        chat_id = self._rng.randint(1, self.chats) + 1000
+        user = {'id': chat_id, 'is_bot': False, 'first_name': f'user{chat_id}'}
+        chat = {'id': chat_id, 'type': 'private'}
+        update_id = self._next_update_id
+        self._next_update_id += 1
+        date = int(time.time())
+
+        # Same as the real traffic mix: mostly /info, some button presses
+        if self._rng.random() < 0.8:
+            update = {'update_id': update_id, 'message': {
+                'message_id': update_id, 'date': date, 'chat': chat, 'from': user, 'text': '/info',
+                'entities': [{'type': 'bot_command', 'offset': 0, 'length': 5}],
+            }}
+        else:
+            update = {'update_id': update_id, 'callback_query': {
+                'id': str(update_id), 'from': user, 'chat_instance': str(chat_id), 'data': 'current',
+                'message': {'message_id': update_id, 'date': date, 'chat': chat,
+                            'from': self.bot_user, 'text': '📊'},
+            }}
+        return update
+
+    def _generate(self) -> None:
+        now = time.monotonic()
+        due = int((now - self._last_generated) * self.rate)
+        if due:
+            self._last_generated += due / self.rate
+            for _ in range(min(due, 1000)):
+                self._queue.append(self._make_update(now))
+
+    def get_updates(self, params: Dict[str, str]) -> List[Dict[str, Any]]:
+        offset = int(params.get('offset') or 0)
+        limit = int(params.get('limit') or 100)
+        deadline = time.monotonic() + min(float(params.get('timeout') or 0), 10)
+        while True:
+            with self._lock:
+                while self._queue and self._queue[0]['update_id'] < offset:
+                    self._queue.popleft()
+                if self.rate > 0:
+                    self._generate()
+                updates = [self._queue.popleft() for _ in range(min(limit, len(self._queue)))]
+                if updates:
+                    now = time.monotonic()
+                    for update in updates:
+                        chat_id = (update.get('message') or update['callback_query']['message'])['chat']['id']
+                        self._pending[chat_id].append(now)
+                    self.sent_updates += len(updates)
+                    return updates
+            if time.monotonic() >= deadline:
+                return []
+            time.sleep(0.01)
+
+    def send_message(self, params: Dict[str, str]) -> Dict[str, Any]:
+        chat_id = int(params.get('chat_id') or 0)
+        with self._lock:
+            pending = self._pending.get(chat_id)
+            if pending:
+                self.latencies.append(time.monotonic() - pending.popleft())
+            message_id = self._next_message_id
+            self._next_message_id += 1
+        return {'message_id': message_id, 'date': int(time.time()), 'from': self.bot_user,
+                'chat': {'id': chat_id, 'type': 'private'}, 'text': params.get('text', '')}
+
+    def call(self, method: str, params: Dict[str, str]) -> Any:
+        if method == 'getMe':
+            return self.bot_user
+        if method == 'getUpdates':
+            return self.get_updates(params)
+        if method in ('sendMessage', 'editMessageText'):
+            return self.send_message(params)
+        if method == 'sendPhoto':
+            message = self.send_message(params)
+            # A string is a reused file_id, uploads get a new one
+            file_id = params.get('photo') or f'sim-photo-{message["message_id"]}'
+            message['photo'] = [{'file_id': file_id, 'file_unique_id': file_id, 'width': 800, 'height': 500}]
+            return message
+        # deleteWebhook, sendChatAction, answerCallbackQuery, ...
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            latencies = list(self.latencies)
+            unanswered = sum(len(pending) for pending in self._pending.values())
+        return {'updates': self.sent_updates, 'replies': len(latencies), 'unanswered': unanswered,
+                'reply_latency_ms': latency_summary(latencies)}
+
+
+def _parse_multipart(content_type: str, body: bytes) -> Dict[str, str]:
+    """Text fields of a multipart body, uploaded files are only acknowledged"""
+    message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+        f'Content-Type: {content_type}\r\n\r\n'.encode() + body)
+    fields = {}
+    for part in message.iter_parts():
+        name = part.get_param('name', header='content-disposition')
+        if name and part.get_filename() is None:
+            fields[name] = part.get_payload(decode=True).decode()
+    return fields
+
+
+class UpstreamSimulator:
+    """WSGI app simulating MOEX ISS, CBR and Telegram Bot API"""
+
+    def __init__(self, config: SimulatorConfig):
+        self.config = config
+        self._rng = random.Random(config.seed)
+        self._rng_lock = threading.Lock()
+        self.price = PriceWalk(config.start_price, config.volatility, random.Random(config.seed))
+        self.telegram = FakeTelegram(config.updates_rate, config.chats, random.Random(config.seed))
+        self.trades = TradeTape(config.trades_rate, self.price, random.Random(config.seed))
+        self.requests = Counter()
+        self.errors = Counter()
+
+    def capital_at(self, report_date: dt.date) -> int:
+        """Own capital (thousands of rubles) in the report for the given month"""
+        months = (report_date.year - BASE_CAPITAL_DATE.year) * 12 + report_date.month - BASE_CAPITAL_DATE.month
+        return round(BASE_CAPITAL * (1 + self.config.monthly_capital_growth) ** months)
+
+    def _delay_and_fail(self) -> bool:
+        """Sleep for the simulated latency, True if this request should fail"""
+        with self._rng_lock:
+            delay = max(0.0, self.config.latency + self._rng.uniform(-1, 1) * self.config.jitter)
+            failed = self._rng.random() < self.config.error_rate
+        if delay:
+            time.sleep(delay)
+        return failed
+
+    def iss(self, query: Dict[str, str]) -> bytes:
+        price = self.price.step()
+        if query.get('iss.only') == 'securities':
+            payload = {'securities': {'columns': ['PREVPRICE'], 'data': [[price]]}}
+        else:
+            column = query.get('marketdata.columns', 'LAST')
+            payload = {'marketdata': {'columns': [column], 'data': [[price]]}}
+        return json.dumps(payload).encode()
+
+    def form123(self, query: Dict[str, str]) -> bytes:
+        report_date = dt.date.fromisoformat(query.get('dt') or BASE_CAPITAL_DATE.isoformat())
+        capital = self.capital_at(report_date)
+        html = (
+            '<html><body><table>'
+            '<tr><th>Номер строки</th><th>Наименование показателя</th><th>Значение</th></tr>'
+            f'<tr><td>000</td><td>Собственные средства (капитал), итого</td><td>{capital:,}</td></tr>'
+            f'<tr><td>000.1</td><td>Базовый капитал</td><td>{int(capital * 0.8):,}</td></tr>'
+            '</table></body></html>'
+        ).replace(',', ' ')
+        return html.encode('utf-8')
+
+    def stats(self) -> Dict[str, Any]:
+        return {'requests': dict(self.requests), 'errors': dict(self.errors),
+                'price': self.price.price, 'telegram': self.telegram.stats()}
+
+    def __call__(self, environ: Dict[str, Any], start_response: Callable) -> List[bytes]:
+        path = environ.get('PATH_INFO', '')
+        query = {key: values[-1] for key, values in parse_qs(environ.get('QUERY_STRING', '')).items()}
+
+        if path.startswith('/bot'):
+            return self._telegram(path, query, environ, start_response)
+        if path == STATS_PATH:
+            return self._respond(start_response, '200 OK', 'application/json', json.dumps(self.stats()).encode())
+
+        if path == ISS_PATH:
+            name, handler, content_type = 'moex', self.iss, 'application/json'
+        elif path == ISS_TRADES_PATH:
+            name, handler, content_type = 'moex_trades', self.trades.page, 'application/json'
+        elif path.rstrip('/') == CBR_PATH.rstrip('/'):
+            name, handler, content_type = 'cbr', self.form123, 'text/html; charset=utf-8'
+        else:
+            return self._respond(start_response, '404 Not Found', 'text/plain', b'not found')
+
+        self.requests[name] += 1
+        if self._delay_and_fail():
+            self.errors[name] += 1
+            return self._respond(start_response, '503 Service Unavailable', 'text/plain', b'simulated failure')
+        return self._respond(start_response, '200 OK', content_type, handler(query))
+
+    def _telegram(self, path: str, query: Dict[str, str], environ: Dict[str, Any],
+                  start_response: Callable) -> List[bytes]:
+        method = path.rsplit('/', 1)[-1]
+        params = dict(query)
+        length = int(environ.get('CONTENT_LENGTH') or 0)
+        body = environ['wsgi.input'].read(length) if length else b''
+        content_type = environ.get('CONTENT_TYPE', '')
+        if body and content_type.startswith('application/json'):
+            params.update({key: str(value) for key, value in json.loads(body).items()})
+        elif body and content_type.startswith('application/x-www-form-urlencoded'):
+            params.update({key: values[-1] for key, values in parse_qs(body.decode()).items()})
+        elif body and content_type.startswith('multipart/form-data'):
+            params.update(_parse_multipart(content_type, body))
+
+        self.requests[f'telegram_{method}'] += 1
+        content = json.dumps({'ok': True, 'result': self.telegram.call(method, params)}).encode()
+        return self._respond(start_response, '200 OK', 'application/json', content)
+
+    @staticmethod
+    def _respond(start_response: Callable, status: str, content_type: str, content: bytes) -> List[bytes]:
+        start_response(status, [('Content-Type', content_type), ('Content-Length', str(len(content)))])
+        return [content]
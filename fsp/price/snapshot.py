@@ -0,0 +1,49 @@
+"""Immutable current data snapshot with pre-encoded API payload"""
+import datetime as dt
+import json
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+SNAPSHOT_FIELDS = ('moex_price', 'fair_price', 'fair_price_20_percent', 'pb_ratio', 'price_score', 'timestamp',
+                   'vwap', 'pb_vwap')
+
+
+@dataclass(frozen=True, slots=True)
+class CurrentSnapshot:
+    """Current price data, built once per refresh and shared by all readers"""
+
+    moex_price: Optional[float]
+    fair_price: Optional[float]
+    fair_price_20_percent: Optional[float]
+    pb_ratio: Optional[float]
+    price_score: str
+    timestamp: dt.datetime
+    # Session VWAP from ingested trades and P/B at it (price.trades), None without trades
+    vwap: Optional[float] = None
+    pb_vwap: Optional[float] = None
+    # /api/current/ response body, encoded once on creation
+    api_json: bytes = field(default=b'', repr=False, compare=False)
+
+    @classmethod
+    def create(cls, **values) -> 'CurrentSnapshot':
+        values.pop('api_json', None)
+        snapshot = cls(**values)
+        object.__setattr__(snapshot, 'api_json', snapshot._encode_api_json())
+        return snapshot
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'CurrentSnapshot':
+        # Snapshots persisted by older versions lack the optional fields
+        return cls.create(**{name: data[name] for name in SNAPSHOT_FIELDS if name in data})
+
+    @property
+    def is_complete(self) -> bool:
+        return self.moex_price is not None and self.fair_price is not None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in SNAPSHOT_FIELDS}
+
+    def _encode_api_json(self) -> bytes:
+        data = self.as_dict()
+        data['timestamp'] = self.timestamp.isoformat()
+        return json.dumps({'success': True, 'data': data}, ensure_ascii=False, separators=(',', ':')).encode()
@@ -1,16 +1,78 @@
+import base64
 import datetime as dt
+import io
+import json
+import logging
+import logging.config
 import os
+import random
+import tempfile
+import threading
+import time
+import tracemalloc
 from unittest import mock
+from urllib.parse import urlencode
+from wsgiref.util import setup_testing_defaults
 
-from django.core.cache import cache
-from django.test import SimpleTestCase
+import requests
 
+from django.core.cache import cache, caches
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from django.http import HttpResponse
+
+from price import badges, views
+from price.middleware import ProfilingMiddleware, SessionMiddleware
+from price.fairvalue import CapitalCurve, parse_dividends
+from price.exchange import ExchangeCalendar, parse_iss_calendar
+from price.leader import DatabaseLease, FileLease, LeaderElection
+from price.logs import JsonFormatter, QueueStreamHandler, RateLimitFilter
+from price.memory import MemoryMonitor, get_locmem_sizes, list_process_reports
+from price.models import MinuteBar, PriceHistory, PriceRollup, TradeCursor
+from price.profiling import SamplingProfiler, get_profile, list_profiles
+from price.rollups import get_bucket_start, update_rollups, verify_rollups
+from price.scenarios import ScenarioError, build_scenario, parse_axis
+from price.cbr import get_own_capital, parse_form123
+from price.resilience import CircuitBreaker
 from price.services import SberPriceService
+from price.sqlite import configure_connection
+from price.threads import ProcessThread
+from price.writer import HistoryWriter
+from price.simulator import ISS_PATH, FakeTelegram, SimulatorConfig, UpstreamSimulator
+from price.snapshot import CurrentSnapshot
+from price.trades import CURSOR_NAME, get_vwap, ingest_trades
+
+
+TEST_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'test-default'},
+    'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'test-shared'},
+    'state': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'test-state'},
+}
+
 
+FORM123_HTML = '''
+<html><body><main>
+  <table class="nav"><tr><td>Меню</td></tr></table>
+  <table class="data">
+    <tr><th>Номер строки</th><th>Наименование показателя</th><th>Значение</th></tr>
+    <tr><td>000</td><td>Собственные средства (капитал), итого</td><td>7\u00a0654\u00a0321</td></tr>
+    <tr><td>000.1</td><td><span>Базовый капитал</span></td><td>6 000 000</td></tr>
+    <tr><td>000.2</td><td>Добавочный капитал</td><td>-</td></tr>
+  </table>
+  <table><tr><td>999</td><td>Чужая таблица</td><td>1</td></tr></table>
+</main></body></html>
+'''.encode('utf-8')
 
-class SberPriceServiceTests(SimpleTestCase):
+
+@override_settings(CACHES=TEST_CACHES)
+class SberPriceServiceTests(TestCase):
     def setUp(self):
         cache.clear()
+        caches['shared'].clear()
+        caches['state'].clear()
         self.service = SberPriceService()
 
     @mock.patch('price.services.timezone.localtime', side_effect=lambda value: value)
@@ -31,6 +93,107 @@ class SberPriceServiceTests(SimpleTestCase):
 
         self.assertIn('dt=2025-12-01', url)
 
+    def test_parse_form123_extracts_all_components(self):
+        components = parse_form123(FORM123_HTML)
+
+        self.assertEqual([c['code'] for c in components], ['000', '000.1'])
+        self.assertEqual(components[1]['name'], 'Базовый капитал')
+        self.assertEqual(get_own_capital(components), 7654321000)
+
+    @mock.patch.object(SberPriceService, 'get_used_month', return_value='09')
+    @mock.patch.object(SberPriceService, 'get_cbr_report_date', return_value='2026-09-01')
+    def test_parse_own_capital_reuses_cached_report(self, _mocked_date, _mocked_month):
+        mock_response = mock.Mock(content=FORM123_HTML)
+
+        with mock.patch.object(self.service, '_make_api_call', return_value=mock_response) as mocked_api:
+            first = self.service.parse_own_capital()
+            second = self.service.parse_own_capital()
+
+        self.assertEqual(first, 7654321000)
+        self.assertEqual(second, 7654321000)
+        self.assertEqual(mocked_api.call_count, 1)
+
+    @mock.patch.object(SberPriceService, 'get_used_month', return_value='10')
+    @mock.patch.object(SberPriceService, 'get_cbr_report_date', return_value='2026-10-01')
+    def test_get_capital_report_uses_latest_until_new_one_published(self, _mocked_date, _mocked_month):
+        cache.set('cbr_form123_latest', {'report_date': '2026-09-01', 'components': []}, 60)
+
+        with mock.patch.object(self.service, '_make_api_call', return_value=None) as mocked_api:
+            first = self.service.get_capital_report()
+            second = self.service.get_capital_report()
+
+        self.assertEqual(first['report_date'], '2026-09-01')
+        self.assertEqual(second['report_date'], '2026-09-01')
+        self.assertEqual(mocked_api.call_count, 1)
+
+    def test_make_api_call_revalidates_with_stored_etag_after_restart(self):
+        first_response = mock.Mock(status_code=200, headers={'ETag': '"v1"'}, content=b'{"a": 1}')
+        not_modified = mock.Mock(status_code=304, headers={})
+
+        with mock.patch('requests.Session.get', side_effect=[first_response, not_modified]) as mocked_get:
+            self.service._make_api_call('https://iss.moex.com/x.json', 'moex_current', retries=1)
+            # A new process: nothing left in its memory
+            cache.clear()
+            response = SberPriceService()._make_api_call('https://iss.moex.com/x.json', 'moex_current', retries=1)
+
+        self.assertEqual(mocked_get.call_args_list[0].kwargs['headers'], {})
+        self.assertEqual(mocked_get.call_args_list[1].kwargs['headers'], {'If-None-Match': '"v1"'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response._content, b'{"a": 1}')
+
+    def test_make_api_call_short_circuits_when_breaker_open(self):
+        self.service.breaker_failure_threshold = 2
+
+        with mock.patch.object(self.service.session, 'get', side_effect=requests.ConnectionError('down')) as mocked_get:
+            with mock.patch('price.services.time.sleep'):
+                first = self.service._make_api_call('https://iss.moex.com/a.json', 'moex_current', retries=3)
+            second = self.service._make_api_call('https://iss.moex.com/b.json', 'moex_current', retries=3)
+
+        self.assertIsNone(first)
+        self.assertIsNone(second)
+        self.assertEqual(mocked_get.call_count, 2)
+        self.assertEqual(self.service.get_breaker('https://iss.moex.com').get_status(), 'open')
+
+    def test_get_moex_price_uses_fallback_when_breakers_open(self):
+        cache.set('moex_price_fallback', 280.5, 60)
+        for base_url in self.service.moex_base_urls:
+            breaker = self.service.get_breaker(base_url)
+            for _ in range(breaker.failure_threshold):
+                breaker.record_failure()
+
+        with mock.patch.object(self.service, '_make_api_call') as mocked_api:
+            result = self.service.get_moex_price()
+
+        self.assertEqual(result, 280.5)
+        mocked_api.assert_not_called()
+
+    def test_breaker_timeout_follows_observed_latency(self):
+        breaker = CircuitBreaker('https://iss.moex.com', min_timeout=0.5)
+        self.assertEqual(breaker.get_timeout(4), 4)
+
+        for latency in [0.1, 0.2, 0.2, 0.3, 0.4]:
+            breaker.record_success(latency)
+
+        self.assertEqual(breaker.get_timeout(4), 1.2)
+        self.assertEqual(breaker.get_timeout(1), 1)
+
+    @mock.patch.object(SberPriceService, 'get_used_month', return_value='09')
+    @mock.patch.object(SberPriceService, 'get_cbr_report_date', return_value='2026-09-01')
+    @mock.patch('price.services.timezone.now')
+    def test_get_fair_price_interpolates_between_reports(self, mocked_now, _mocked_date, _mocked_month):
+        cache.set('cbr_form123_2026-09-01', {'report_date': '2026-09-01', 'components': [
+            {'code': '000', 'name': 'Капитал', 'value': 3000}]}, 60)
+        cache.set('cbr_form123_2026-08-01', {'report_date': '2026-08-01', 'components': [
+            {'code': '000', 'name': 'Капитал', 'value': 2380}]}, 60)
+        self.service.stocks_quantity = 10
+        mocked_now.return_value = dt.datetime(2026, 9, 16, tzinfo=dt.timezone(dt.timedelta(hours=3)))
+
+        with mock.patch.object(self.service, '_make_api_call', return_value=None):
+            fair_price = self.service.get_fair_price()
+
+        # 620 rubles of growth over 31 days continue for 15 more days
+        self.assertEqual(fair_price, 330.0)
+
     @mock.patch.object(SberPriceService, 'get_pb_ratio')
     def test_get_price_score_ranges(self, mocked_pb_ratio):
         mocked_pb_ratio.return_value = None
@@ -110,6 +273,94 @@ class SberPriceServiceTests(SimpleTestCase):
         self.assertIsNone(result)
         self.assertEqual(mocked_api.call_count, 0)
 
+    @mock.patch.object(SberPriceService, 'get_fair_price', return_value=340.0)
+    @mock.patch.object(SberPriceService, 'get_moex_price', return_value=300.0)
+    def test_refresh_persists_snapshot_loaded_by_new_process(self, _mocked_moex, _mocked_fair):
+        cache.set('cbr_form123_latest', {'report_date': '2026-09-01', 'components': []}, 60)
+        self.service.refresh()
+        cache.clear()
+
+        service = SberPriceService()
+        loaded = service.load_snapshot()
+
+        self.assertTrue(loaded)
+        self.assertEqual(cache.get('moex_price_fallback'), 300.0)
+        self.assertEqual(service.get_current_snapshot().pb_ratio, 0.88)
+        self.assertEqual(cache.get('cbr_form123_2026-09-01')['report_date'], '2026-09-01')
+        self.assertEqual(PriceHistory.objects.get().pb_ratio, 0.88)
+
+    @mock.patch.object(SberPriceService, 'refresh')
+    def test_first_snapshot_read_loads_persisted_snapshot(self, mocked_refresh):
+        persisted = CurrentSnapshot.create(moex_price=300.0, fair_price=340.0, fair_price_20_percent=408.0,
+                                           pb_ratio=0.88, price_score='дешево', timestamp=dt.datetime.now(dt.timezone.utc))
+        self.service.save_snapshot(persisted)
+
+        service = SberPriceService()
+        self.assertIsNone(service.peek_current_snapshot())
+
+        self.assertEqual(service.get_current_snapshot(), persisted)
+        mocked_refresh.assert_not_called()
+
+    def test_snapshot_survives_culling_of_transient_cache(self):
+        from django.conf import settings
+
+        with tempfile.TemporaryDirectory() as state_dir:
+            file_caches = {
+                **TEST_CACHES,
+                'shared': {**settings.CACHES['shared'], 'LOCATION': os.path.join(state_dir, 'cache')},
+                'state': {**settings.CACHES['state'], 'LOCATION': os.path.join(state_dir, 'state')},
+            }
+            with override_settings(CACHES=file_caches):
+                self.service.save_snapshot(CurrentSnapshot.create(
+                    moex_price=300.0, fair_price=340.0, fair_price_20_percent=408.0, pb_ratio=0.88,
+                    price_score='дешево', timestamp=dt.datetime.now(dt.timezone.utc)))
+                for index in range(700):
+                    caches['shared'].set(f'chart_png_{index}', b'png', 3600)
+
+                self.assertTrue(SberPriceService().load_snapshot())
+
+    def test_expired_snapshot_is_served_while_another_thread_refreshes(self):
+        stale = CurrentSnapshot.create(moex_price=300.0, fair_price=340.0, fair_price_20_percent=408.0,
+                                       pb_ratio=0.88, price_score='дешево', timestamp=dt.datetime.now(dt.timezone.utc))
+        self.service.set_current_snapshot(stale, timeout=-1)
+
+        with self.service._refresh_lock, mock.patch.object(self.service, 'refresh') as mocked_refresh:
+            self.assertIs(self.service.get_current_snapshot(), stale)
+
+        mocked_refresh.assert_not_called()
+
+    @mock.patch.object(SberPriceService, 'get_fair_price', return_value=340.0)
+    @mock.patch.object(SberPriceService, 'get_moex_price', return_value=300.0)
+    def test_warm_loads_snapshot_without_upstream_calls_or_threads(self, mocked_moex, _mocked_fair):
+        with mock.patch('price.services.threading.Thread') as mocked_thread:
+            self.service.warm()
+        self.assertIsNone(self.service.peek_current_snapshot())
+
+        SberPriceService().refresh()
+        self.service.warm()
+
+        self.assertEqual(mocked_moex.call_count, 1)
+        mocked_thread.assert_not_called()
+        self.assertEqual(self.service.peek_current_snapshot().moex_price, 300.0)
+        self.assertIsNone(self.service._session)
+
+    def test_refresh_in_background_only_when_stale(self):
+        fresh = CurrentSnapshot.create(moex_price=300.0, fair_price=340.0, fair_price_20_percent=408.0,
+                                       pb_ratio=0.88, price_score='дешево', timestamp=dt.datetime.now(dt.timezone.utc))
+        self.service.set_current_snapshot(fresh, timeout=100)
+
+        self.assertIsNone(self.service.refresh_in_background(margin=30))
+        with mock.patch('price.services.threading.Thread') as mocked_thread:
+            self.service.refresh_in_background(margin=200)
+        mocked_thread.return_value.start.assert_called_once()
+
+    @mock.patch.object(SberPriceService, 'get_fair_price', return_value=None)
+    @mock.patch.object(SberPriceService, 'get_moex_price', return_value=250.0)
+    def test_refresh_does_not_persist_incomplete_data(self, _mocked_moex, _mocked_fair):
+        self.service.refresh()
+
+        self.assertIsNone(caches['state'].get('last_known_good_snapshot'))
+
     @mock.patch.object(SberPriceService, 'get_fair_price', return_value=None)
     @mock.patch.object(SberPriceService, 'get_moex_price', return_value=250.0)
     def test_get_current_data_handles_none_values(self, _mocked_moex, _mocked_fair):
@@ -120,3 +371,822 @@ class SberPriceServiceTests(SimpleTestCase):
         self.assertIsNone(data['fair_price_20_percent'])
         self.assertIsNone(data['pb_ratio'])
         self.assertEqual(data['price_score'], 'неизвестно')
+
+
+@override_settings(CACHES=TEST_CACHES)
+class HealthCheckCommandTests(TestCase):
+    def setUp(self):
+        caches['shared'].clear()
+        caches['state'].clear()
+
+    def test_deep_check_changes_no_data(self):
+        ok = mock.Mock(raise_for_status=lambda: None)
+        with mock.patch.object(SberPriceService, 'refresh') as mocked_refresh, \
+                mock.patch('requests.Session.get', return_value=ok):
+            call_command('healthcheck', stdout=io.StringIO())
+
+        mocked_refresh.assert_not_called()
+        self.assertFalse(PriceHistory.objects.exists())
+        self.assertIsNone(caches['state'].get('last_known_good_snapshot'))
+        result = caches['shared'].get('deep_health_check')
+        self.assertEqual(result['checks']['moex_api'], 'ok')
+        self.assertEqual(result['checks']['snapshot'], 'missing')
+        self.assertEqual(result['status'], 'degraded')
+
+
+@override_settings(CACHES=TEST_CACHES)
+class HealthCheckViewTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        caches['shared'].clear()
+        self.factory = RequestFactory()
+
+    def test_liveness_is_always_ok(self):
+        response = views.liveness(self.factory.get('/api/health/live/'))
+
+        self.assertEqual(response.status_code, 200)
+
+    def test_health_check_does_not_call_upstream(self):
+        cache.set('moex_price_fallback', 300.0, 60)
+
+        with mock.patch.object(SberPriceService, 'get_moex_price') as mocked_moex:
+            with mock.patch.object(SberPriceService, '_make_api_call') as mocked_api:
+                response = views.health_check(self.factory.get('/api/health/'))
+
+        self.assertEqual(response.status_code, 200)
+        mocked_moex.assert_not_called()
+        mocked_api.assert_not_called()
+
+    @mock.patch.object(SberPriceService, 'get_fair_price', return_value=None)
+    @mock.patch.object(SberPriceService, 'get_moex_price', return_value=None)
+    def test_health_check_reports_failed_refresh_without_data(self, _mocked_moex, _mocked_fair):
+        views.sber_service.refresh()
+
+        response = views.health_check(self.factory.get('/api/health/'))
+
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('"consecutive_errors": 1', response.content.decode())
+
+
+class PublicPathMiddlewareTests(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.middleware = SessionMiddleware(lambda request: HttpResponse())
+
+    def test_public_paths_skip_sessions(self):
+        request = self.factory.get('/api/current/')
+
+        self.middleware(request)
+
+        self.assertFalse(hasattr(request, 'session'))
+
+    def test_admin_paths_keep_sessions(self):
+        request = self.factory.get('/admin/')
+
+        self.middleware(request)
+
+        self.assertTrue(hasattr(request, 'session'))
+
+
+@override_settings(CACHES=TEST_CACHES)
+class IndexViewTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+
+    @mock.patch('price.views.render', return_value=HttpResponse())
+    @mock.patch.object(SberPriceService, 'get_current_snapshot', return_value=CurrentSnapshot.create(
+        moex_price=None, fair_price=None, fair_price_20_percent=None,
+        pb_ratio=None, price_score='неизвестно', timestamp=dt.datetime(2026, 1, 5, 10, 0, tzinfo=dt.timezone.utc),
+    ))
+    def test_index_passes_error_banner_in_context(self, _mocked_data, mocked_render):
+        views.index(self.factory.get('/'))
+
+        context = mocked_render.call_args.args[2]
+        self.assertEqual(context['moex_price'], 'Н/Д')
+        self.assertIn('Не удалось получить', context['error_message'])
+
+    @mock.patch.object(SberPriceService, 'get_current_snapshot', return_value=CurrentSnapshot.create(
+        moex_price=300.0, fair_price=340.0, fair_price_20_percent=408.0,
+        pb_ratio=0.88, price_score='дешево', timestamp=dt.datetime(2026, 1, 5, 10, 0, tzinfo=dt.timezone.utc),
+    ))
+    def test_api_current_data_returns_pre_encoded_snapshot(self, mocked_snapshot):
+        response = views.api_current_data(self.factory.get('/api/current/'))
+
+        self.assertEqual(response.content, mocked_snapshot.return_value.api_json)
+        payload = json.loads(response.content)
+        self.assertEqual(payload['data']['price_score'], 'дешево')
+        self.assertEqual(payload['data']['timestamp'], '2026-01-05T10:00:00+00:00')
+
+
+def _snapshot(price, minute=0):
+    return CurrentSnapshot.create(
+        moex_price=price, fair_price=340.0, fair_price_20_percent=408.0, pb_ratio=round(price / 340.0, 2),
+        price_score='дешево', timestamp=dt.datetime(2026, 1, 5, 10, minute, tzinfo=dt.timezone.utc),
+    )
+
+
+@override_settings(CACHES=TEST_CACHES)
+class MicrocacheTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.service = SberPriceService()
+        patcher = mock.patch('price.views.sber_service', self.service)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_headers_follow_snapshot_ttl(self):
+        self.service.set_current_snapshot(_snapshot(300.0), timeout=90)
+
+        response = views.api_current_data(self.factory.get('/api/current/'))
+
+        self.assertEqual(response['Cache-Control'], 'public, max-age=15')
+        self.assertIn(int(response['X-Accel-Expires']), (89, 90))
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+
+    def test_new_snapshot_is_never_served_from_old_cache(self):
+        self.service.set_current_snapshot(_snapshot(300.0))
+        views.api_current_data(self.factory.get('/api/current/'))
+        self.service.set_current_snapshot(_snapshot(310.0, minute=2))
+
+        response = views.api_current_data(self.factory.get('/api/current/'))
+
+        self.assertEqual(json.loads(response.content)['data']['moex_price'], 310.0)
+
+    def test_query_strings_share_one_entry(self):
+        self.service.set_current_snapshot(_snapshot(300.0))
+        view = mock.Mock(return_value=HttpResponse(b'ok'))
+        cached_view = views.microcached(browser_max_age=30)(view)
+
+        for query in ({'x': 1}, {'x': 2}, {}):
+            cached_view(self.factory.get('/thesis/', query))
+
+        self.assertEqual(view.call_count, 1)
+
+    def test_refresh_purges_only_when_data_changes(self):
+        with mock.patch('price.services.purge_in_background') as mocked_purge, \
+                mock.patch.object(self.service, 'get_moex_price', return_value=300.0), \
+                mock.patch.object(self.service, 'get_fair_price', return_value=340.0), \
+                mock.patch.object(self.service, 'record_history'):
+            self.service.refresh()
+            self.service.refresh()
+            self.service.get_moex_price.return_value = 301.0
+            self.service.refresh()
+
+        self.assertEqual(mocked_purge.call_count, 2)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class BadgeTests(SimpleTestCase):
+    def setUp(self):
+        badges._rendered.clear()
+        self.factory = RequestFactory()
+        self.service = SberPriceService()
+        patcher = mock.patch('price.views.sber_service', self.service)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_svg_badge_shows_pb_in_score_color(self):
+        self.service.set_current_snapshot(_snapshot(300.0), timeout=90)
+
+        response = views.badge(self.factory.get('/badge/'))
+
+        self.assertEqual(response['Content-Type'], 'image/svg+xml')
+        self.assertIn(b'>0.88<', response.content)
+        self.assertIn(b'#4c1', response.content)
+        self.assertEqual(response['Access-Control-Allow-Origin'], '*')
+        self.assertIn(int(response['X-Accel-Expires']), (89, 90))
+
+    def test_badge_is_rendered_once_per_value_and_revalidated(self):
+        self.service.set_current_snapshot(_snapshot(300.0))
+        with mock.patch.dict(badges.BADGE_FORMATS, svg=(mock.Mock(return_value=b'<svg/>'), 'image/svg+xml')):
+            etag = views.badge(self.factory.get('/badge/'))['ETag']
+            # Same P/B, newer snapshot
+            self.service.set_current_snapshot(_snapshot(300.0, minute=2))
+            response = views.badge(self.factory.get('/badge/', HTTP_IF_NONE_MATCH=etag))
+            render = badges.BADGE_FORMATS['svg'][0]
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        render.assert_called_once()
+
+    def test_png_badge(self):
+        self.service.set_current_snapshot(_snapshot(500.0))
+
+        response = views.badge(self.factory.get('/badge/', {'format': 'png'}))
+
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertTrue(response.content.startswith(b'\x89PNG'))
+
+    def test_unknown_format(self):
+        response = views.badge(self.factory.get('/badge/', {'format': 'gif'}))
+
+        self.assertEqual(response.status_code, 400)
+
+
+class HistoryExportViewTests(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        start = dt.datetime(2026, 1, 5, 10, 0, tzinfo=dt.timezone.utc)
+        PriceHistory.objects.bulk_create([
+            PriceHistory(timestamp=start + dt.timedelta(minutes=i), moex_price=300.0 + i,
+                         fair_price=340.0, pb_ratio=round((300.0 + i) / 340.0, 2))
+            for i in range(3)
+        ])
+
+    def _export(self, export_format):
+        return views.history_export(self.factory.get('/api/history/export/', {'format': export_format}))
+
+    def test_export_csv_streams_all_rows(self):
+        response = self._export('csv')
+
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'timestamp,moex_price,fair_price,pb_ratio')
+        self.assertEqual(lines[1], '2026-01-05T10:00:00+00:00,300.0,340.0,0.88')
+        self.assertEqual(len(lines), 4)
+
+    def test_export_ndjson(self):
+        response = self._export('ndjson')
+
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertIn('"moex_price": 302.0', lines[2])
+
+    def test_export_rejects_unknown_format(self):
+        self.assertEqual(self._export('xlsx').status_code, 400)
+
+    def test_export_parquet(self):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            self.skipTest('pyarrow is not installed')
+
+        response = self._export('parquet')
+
+        table = pq.read_table(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(table.column('moex_price').to_pylist(), [300.0, 301.0, 302.0])
+
+
+def _unpack(data, dtype, shape):
+    import numpy as np
+
+    return np.frombuffer(base64.b64decode(data), dtype=dtype).reshape(shape).tolist()
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ScenarioTests(SimpleTestCase):
+    def setUp(self):
+        caches['shared'].clear()
+        self.factory = RequestFactory()
+        self.service = SberPriceService()
+        self.service.set_current_snapshot(_snapshot(300.0))
+        patcher = mock.patch('price.views.sber_service', self.service)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_parse_axis_range_and_list(self):
+        self.assertEqual(parse_axis('100:200:3', 'price'), [100.0, 150.0, 200.0])
+        self.assertEqual(parse_axis('1,2.5', 'price'), [1.0, 2.5])
+        with self.assertRaises(ScenarioError):
+            parse_axis('1:2:100000', 'price')
+        with self.assertRaises(ScenarioError):
+            parse_axis('abc', 'price')
+        for value in ('nan', '1,inf', '0:inf:3'):
+            with self.assertRaises(ScenarioError):
+                parse_axis(value, 'price')
+
+    def test_build_scenario_caps_total_cells(self):
+        with self.assertRaises(ScenarioError):
+            build_scenario(own_capital=1000, prices=[1.0] * 1000, growth_rates=[0.0] * 1000, shares=[100, 50])
+
+    def test_build_scenario_rejects_fair_price_rounding_to_zero(self):
+        with self.assertRaises(ScenarioError):
+            build_scenario(own_capital=7_000_000_000_000, prices=[100.0], growth_rates=[0.0], shares=[1e18])
+
+    def test_build_scenario_matches_service_formula(self):
+        scenario = build_scenario(
+            own_capital=1000, prices=[9.9, 10.0, 12.0, 13.0, 14.0], growth_rates=[0.0, 1.0], shares=[100, 50])
+
+        pb_ratio_x100 = _unpack(scenario['pb_ratio_x100'], '<u2', (2, 2, 5))
+        score = _unpack(scenario['score'], 'u1', (2, 2, 5))
+        self.assertEqual(scenario['fair_price'], [[10.0, 20.0], [20.0, 40.0]])
+        self.assertEqual(pb_ratio_x100[0][0], [99, 100, 120, 130, 140])
+        self.assertEqual(score[0][0], [0, 1, 1, 2, 3])
+        self.assertEqual(score[1][1], [0, 0, 0, 0, 0])
+
+    def test_build_scenario_saturates_packed_pb_ratio(self):
+        scenario = build_scenario(own_capital=1000, prices=[10000.0], growth_rates=[0.0], shares=[100])
+
+        self.assertEqual(_unpack(scenario['pb_ratio_x100'], '<u2', (1,)), [65535])
+        self.assertEqual(_unpack(scenario['score'], 'u1', (1,)), [3])
+
+    def test_api_scenario_rejects_invalid_growth(self):
+        response = views.api_scenario(self.factory.get('/api/scenario/', {'growth': '-1.5,0'}))
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_api_scenario_uses_published_snapshot(self):
+        with mock.patch.object(self.service, 'parse_own_capital') as mocked_capital:
+            response = views.api_scenario(self.factory.get('/api/scenario/', {'growth': '0'}))
+
+        data = json.loads(response.content)['data']
+        mocked_capital.assert_not_called()
+        self.assertEqual(data['fair_price'], [[340.0]])
+
+    def test_api_scenario_without_complete_snapshot(self):
+        self.service.set_current_snapshot(CurrentSnapshot.create(
+            moex_price=None, fair_price=None, fair_price_20_percent=None, pb_ratio=None,
+            price_score='неизвестно', timestamp=timezone.now()))
+
+        response = views.api_scenario(self.factory.get('/api/scenario/'))
+
+        self.assertEqual(response.status_code, 503)
+
+    def test_api_scenario_returns_cached_matrix(self):
+        request = self.factory.get('/api/scenario/', {'price': '200:400:5', 'growth': '0,0.1'})
+
+        with mock.patch('price.scenarios.build_scenario', wraps=build_scenario) as mocked_build:
+            first = views.api_scenario(request)
+            second = views.api_scenario(request)
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(mocked_build.call_count, 1)
+
+    def test_api_scenario_full_grid_for_one_share_count(self):
+        request = self.factory.get('/api/scenario/', {'price': '100:600:1000', 'growth': '-0.5:0.5:1000'})
+
+        with mock.patch('price.scenarios.build_scenario', wraps=build_scenario) as mocked_build:
+            first = views.api_scenario(request)
+            second = views.api_scenario(request)
+
+        self.assertEqual(first.status_code, 200)
+        data = json.loads(first.content)['data']
+        self.assertEqual(len(base64.b64decode(data['score'])), 1000 * 1000)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(mocked_build.call_count, 1)
+
+
+class CapitalCurveTests(SimpleTestCase):
+    def setUp(self):
+        self.curve = CapitalCurve(
+            [(dt.date(2026, 1, 1), 1000), (dt.date(2026, 1, 11), 2000)],
+            dividends=parse_dividends('2026-01-06:10, bad'),
+            shares=10,
+        )
+
+    def _timestamp(self, *args):
+        return dt.datetime(*args, tzinfo=dt.timezone(dt.timedelta(hours=3))).timestamp()
+
+    def test_value_is_linear_between_reports_with_dividend_step(self):
+        # 1000 -> 2000 including the 100 paid on Jan 6
+        self.assertAlmostEqual(self.curve.value_at(self._timestamp(2026, 1, 5, 12)), 1495.0)
+        self.assertAlmostEqual(self.curve.value_at(self._timestamp(2026, 1, 6)), 1450.0)
+        self.assertAlmostEqual(self.curve.value_at(self._timestamp(2026, 1, 11)), 2000.0)
+
+    def test_value_extrapolates_last_trend_then_stays_flat(self):
+        self.assertAlmostEqual(self.curve.value_at(self._timestamp(2026, 1, 12)), 2110.0)
+        self.assertAlmostEqual(self.curve.value_at(self._timestamp(2027, 1, 1)), 2000 + 110 * 62)
+        self.assertAlmostEqual(self.curve.value_at(self._timestamp(2025, 1, 1)), 1000.0)
+
+    def test_vectorized_values_match_lookup_table(self):
+        timestamps = [self._timestamp(2026, 1, day, hour) for day in range(1, 20) for hour in (0, 7, 23)]
+
+        vectorized = self.curve.values_at(timestamps).tolist()
+
+        for timestamp, value in zip(timestamps, vectorized):
+            self.assertAlmostEqual(self.curve.value_at(timestamp), value, places=6)
+
+
+class UpstreamSimulatorTests(SimpleTestCase):
+    def setUp(self):
+        self.simulator = UpstreamSimulator(SimulatorConfig(latency=0, jitter=0, seed=1))
+
+    def _get(self, path, query=''):
+        environ = {'PATH_INFO': path, 'QUERY_STRING': query}
+        setup_testing_defaults(environ)
+        statuses = []
+        body = b''.join(self.simulator(environ, lambda status, headers: statuses.append(status)))
+        return statuses[0], body
+
+    def test_iss_and_form123_are_parsed_like_real_upstreams(self):
+        service = SberPriceService()
+        query = service.moex_url_templates['current'].split('?', 1)[1]
+
+        status, body = self._get(ISS_PATH, query)
+        _, report = self._get('/f123/', 'regnum=1481&dt=2026-02-01')
+
+        self.assertEqual(status, '200 OK')
+        self.assertGreater(json.loads(body)['marketdata']['data'][0][0], 0)
+        self.assertEqual(get_own_capital(parse_form123(report)), 7_590_000_000_000)
+
+    def test_error_rate_returns_service_unavailable(self):
+        self.simulator.config.error_rate = 1.0
+
+        status, _ = self._get(ISS_PATH)
+
+        self.assertEqual(status, '503 Service Unavailable')
+        self.assertEqual(self.simulator.stats()['errors'], {'moex': 1})
+
+    def test_fake_telegram_measures_reply_latency(self):
+        telegram = FakeTelegram(rate=1000, chats=1, rng=random.Random(1))
+        time.sleep(0.01)
+
+        updates = telegram.get_updates({'timeout': '1'})
+        chat_id = (updates[0].get('message') or updates[0]['callback_query']['message'])['chat']['id']
+        telegram.send_message({'chat_id': str(chat_id), 'text': 'ok'})
+
+        stats = telegram.stats()
+        self.assertEqual(stats['replies'], 1)
+        self.assertEqual(stats['unanswered'], len(updates) - 1)
+
+
+class RollupTests(TestCase):
+    def _record(self, minute, price, pb_ratio):
+        return PriceHistory.objects.create(
+            timestamp=dt.datetime(2026, 3, 2, 7, minute, tzinfo=dt.timezone.utc),
+            moex_price=price, fair_price=300.0, pb_ratio=pb_ratio)
+
+    def test_incremental_updates_match_rebuild(self):
+        # Out of order insert must not replace the bucket's last value
+        for minute, price, pb_ratio in [(10, 300.0, 1.0), (50, 310.0, 1.03), (5, 290.0, 0.97)]:
+            update_rollups(self._record(minute, price, pb_ratio))
+
+        hour = PriceRollup.objects.get(resolution=PriceRollup.HOUR)
+        self.assertEqual(hour.bucket_start, dt.datetime(2026, 3, 2, 7, 0, tzinfo=dt.timezone.utc))
+        self.assertEqual((hour.count, hour.price_first, hour.price_last), (3, 290.0, 310.0))
+        self.assertEqual((hour.pb_min, hour.pb_max), (0.97, 1.03))
+        self.assertAlmostEqual(hour.price_avg, 300.0)
+        self.assertEqual(PriceRollup.objects.count(), 3)
+        self.assertEqual(verify_rollups(), [])
+
+    def test_day_bucket_starts_at_local_midnight(self):
+        timestamp = dt.datetime(2026, 3, 1, 22, 30, tzinfo=dt.timezone.utc)
+
+        bucket_start = get_bucket_start(timestamp, PriceRollup.DAY)
+
+        self.assertEqual(bucket_start, dt.datetime(2026, 3, 1, 21, 0, tzinfo=dt.timezone.utc))
+
+    def test_verifyrollups_rebuilds_drifted_buckets(self):
+        update_rollups(self._record(10, 300.0, 1.0))
+        PriceRollup.objects.filter(resolution=PriceRollup.DAY).update(count=5)
+
+        with self.assertRaises(CommandError):
+            call_command('verifyrollups', stdout=io.StringIO())
+        call_command('verifyrollups', '--rebuild', stdout=io.StringIO())
+
+        self.assertEqual(verify_rollups(), [])
+
+
+class HistoryWriterTests(SimpleTestCase):
+    def test_submitted_snapshots_are_written_in_one_batch(self):
+        batches = []
+        writer = HistoryWriter(write=batches.append, flush_interval=0.2)
+        snapshots = [
+            CurrentSnapshot.create(moex_price=300.0 + i, fair_price=340.0, fair_price_20_percent=408.0,
+                                   pb_ratio=0.88, price_score='дешево', timestamp=dt.datetime.now(dt.timezone.utc))
+            for i in range(3)
+        ]
+
+        for snapshot in snapshots:
+            writer.submit(snapshot)
+
+        self.assertTrue(writer.flush(timeout=5))
+        self.assertEqual(batches, [snapshots])
+
+
+class SQLiteTuningTests(TestCase):
+    def test_pragmas_are_applied_to_new_connections(self):
+        with connection.cursor() as cursor:
+            configure_connection(None, connection)
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute('PRAGMA temp_store')
+            self.assertEqual(cursor.fetchone()[0], 2)
+
+
+def _busy_wait(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+@override_settings(CACHES=TEST_CACHES, PROFILING_SAMPLE_RATE=0, OPS_TOKEN='secret')
+class ProfilingTests(SimpleTestCase):
+    def setUp(self):
+        caches['shared'].clear()
+        self.factory = RequestFactory()
+
+    def test_profiler_records_wall_and_cpu_stacks(self):
+        with SamplingProfiler('busy', interval=0.001) as profiler:
+            _busy_wait(0.1)
+
+        profile = get_profile(profiler.profile_id)
+        self.assertEqual(list_profiles()[0]['id'], profiler.profile_id)
+        self.assertTrue(any(stack.endswith('price.tests:_busy_wait') for stack in profile['wall']))
+        self.assertGreater(sum(profile['wall'].values()), 50_000)
+        if hasattr(time, 'pthread_getcpuclockid'):
+            self.assertGreater(sum(profile['cpu'].values()), 0)
+
+    def test_middleware_profiles_only_with_token(self):
+        middleware = ProfilingMiddleware(lambda request: HttpResponse())
+
+        plain = middleware(self.factory.get('/api/current/'))
+        wrong = middleware(self.factory.get('/api/current/', HTTP_X_PROFILE='wrong'))
+        profiled = middleware(self.factory.get('/api/current/', HTTP_X_PROFILE='secret'))
+
+        self.assertNotIn('X-Profile-Id', plain)
+        self.assertNotIn('X-Profile-Id', wrong)
+        self.assertEqual(list_profiles()[0]['id'], profiled['X-Profile-Id'])
+
+    def test_profile_endpoints_require_ops_access(self):
+        with SamplingProfiler('busy', interval=0.001) as profiler:
+            _busy_wait(0.02)
+
+        denied = views.profile_detail(self.factory.get('/ops/profiles/x/'), profiler.profile_id)
+        response = views.profile_detail(self.factory.get('/ops/profiles/x/', HTTP_X_OPS_TOKEN='secret'),
+                                        profiler.profile_id)
+
+        self.assertEqual(denied.status_code, 403)
+        self.assertEqual(response.status_code, 200)
+        for line in response.content.decode().splitlines():
+            stack, value = line.rsplit(' ', 1)
+            self.assertIn(':', stack)
+            self.assertGreater(int(value), 0)
+
+
+@override_settings(CACHES=TEST_CACHES, MEMORY_DIAGNOSTICS=True, MEMORY_SNAPSHOT_INTERVAL=60, OPS_TOKEN='secret')
+class MemoryDiagnosticsTests(SimpleTestCase):
+    def setUp(self):
+        caches['default'].clear()
+        caches['shared'].clear()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.addCleanup(tracemalloc.stop)
+
+    def test_locmem_sizes_count_pickled_entries(self):
+        caches['default'].set('blob', b'x' * 10_000)
+
+        sizes = get_locmem_sizes()
+
+        self.assertEqual(sizes['default']['entries'], 1)
+        self.assertGreater(sizes['default']['bytes'], 10_000)
+
+    def test_check_reports_growth_between_snapshots(self):
+        monitor = MemoryMonitor()
+        monitor.check()
+        leak = [bytearray(1024) for _ in range(1000)]
+
+        report = monitor.check()
+
+        self.assertGreater(report['rss_bytes'], 0)
+        self.assertTrue(any('price/tests.py' in item['where'] for item in report['growth_since_last']))
+        self.assertEqual([process['pid'] for process in list_process_reports()], [os.getpid()])
+        del leak
+
+    def test_memory_endpoint_requires_ops_access(self):
+        factory = RequestFactory()
+
+        denied = views.memory(factory.get('/ops/memory/'))
+        response = views.memory(factory.get('/ops/memory/?limit=5', HTTP_X_OPS_TOKEN='secret'))
+
+        self.assertEqual(denied.status_code, 403)
+        data = json.loads(response.content)
+        self.assertTrue(data['tracing'])
+        self.assertLessEqual(len(data['top_allocators']), 5)
+
+
+class LeaderElectionTests(TestCase):
+    def assert_lease_fails_over(self, backend):
+        self.assertTrue(backend.acquire('refresh', 'a', 60))
+        self.assertTrue(backend.acquire('refresh', 'a', 60))
+        self.assertFalse(backend.acquire('refresh', 'b', 60))
+
+        backend.release('refresh', 'a')
+        self.assertTrue(backend.acquire('refresh', 'b', -1))
+        # Expired lease goes to the next process asking
+        self.assertTrue(backend.acquire('refresh', 'a', 60))
+
+    def test_database_lease(self):
+        self.assert_lease_fails_over(DatabaseLease())
+
+    def test_file_lease(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.assert_lease_fails_over(FileLease(directory))
+
+    @override_settings(CACHES=TEST_CACHES, LEADER_ELECTION=True)
+    def test_follower_serves_published_snapshot_without_upstream_calls(self):
+        caches['shared'].clear()
+        leader = SberPriceService()
+        follower = SberPriceService()
+        election = LeaderElection('price-refresh', backend=DatabaseLease(), ttl=60)
+        with mock.patch('price.services.refresh_leader', election), \
+                mock.patch.object(leader, 'get_moex_price', return_value=300.0), \
+                mock.patch.object(leader, 'get_fair_price', return_value=340.0):
+            published = leader.get_current_snapshot()
+        self.assertTrue(election.is_leader)
+        election.release()
+
+        other = LeaderElection('price-refresh', backend=mock.Mock(acquire=mock.Mock(return_value=False)), ttl=60)
+        with mock.patch('price.services.refresh_leader', other), \
+                mock.patch.object(follower, 'get_moex_price') as mocked_price:
+            snapshot = follower.get_current_snapshot()
+
+        mocked_price.assert_not_called()
+        self.assertEqual(snapshot.moex_price, published.moex_price)
+        self.assertEqual(snapshot.pb_ratio, 0.88)
+
+
+def _moscow(*args):
+    return timezone.make_aware(dt.datetime(*args))
+
+
+class ExchangeCalendarTests(SimpleTestCase):
+    def setUp(self):
+        self.calendar = ExchangeCalendar()
+
+    def test_sessions_cover_evening_and_weekends(self):
+        # 2026-10-19 is a Monday, 2026-10-24 a Saturday
+        self.assertEqual(self.calendar.current_session(_moscow(2026, 10, 19, 12, 0)).name, 'main')
+        self.assertEqual(self.calendar.current_session(_moscow(2026, 10, 19, 21, 0)).name, 'evening')
+        self.assertEqual(self.calendar.current_session(_moscow(2026, 10, 24, 12, 0)).name, 'weekend')
+        self.assertIsNone(self.calendar.current_session(_moscow(2026, 10, 19, 23, 55)))
+
+    def test_holidays_and_overrides(self):
+        self.assertFalse(self.calendar.is_trading_day(dt.date(2026, 11, 4)))
+        calendar = ExchangeCalendar({dt.date(2026, 11, 4): True}, extra_holidays=[dt.date(2026, 11, 5)])
+
+        self.assertTrue(calendar.is_trading_day(dt.date(2026, 11, 4)))
+        self.assertFalse(calendar.is_trading_day(dt.date(2026, 11, 5)))
+
+    def test_ttl_lasts_until_next_session_when_closed(self):
+        self.assertEqual(self.calendar.ttl(120, 1800, _moscow(2026, 10, 19, 12, 0)), 120)
+        # Night: capped; five minutes before the morning session: until it opens
+        self.assertEqual(self.calendar.ttl(120, 1800, _moscow(2026, 10, 20, 1, 0)), 1800)
+        self.assertEqual(self.calendar.ttl(120, 1800, _moscow(2026, 10, 20, 6, 45)), 300)
+        # Holiday: next session is the morning after
+        self.assertEqual(self.calendar.next_open(_moscow(2026, 11, 3, 23, 55))[0], _moscow(2026, 11, 5, 6, 50))
+
+    def test_describe(self):
+        self.assertEqual(self.calendar.describe(_moscow(2026, 10, 19, 20, 0)), 'идет вечерняя сессия до 23:50')
+        self.assertEqual(self.calendar.describe(_moscow(2026, 11, 3, 23, 55)),
+                         'торги закрыты, утренняя сессия начнется 05.11 в 06:50')
+
+    def test_parse_iss_calendar(self):
+        data = {'off_days': {'columns': ['tradedate', 'is_work_day', 'stock_workday'],
+                             'data': [['2026-11-04', 0, 0], ['2026-11-07', 0, 1]]}}
+
+        self.assertEqual(parse_iss_calendar(data), {dt.date(2026, 11, 4): False, dt.date(2026, 11, 7): True})
+
+
+@override_settings(CACHES=TEST_CACHES)
+class TradesIngestionTests(TestCase):
+    def setUp(self):
+        self.simulator = UpstreamSimulator(SimulatorConfig(latency=0, jitter=0, trades_rate=1000, seed=1))
+        self.service = SberPriceService()
+        self.requests = []
+
+    def _fetch(self, url, params, timeout):
+        self.requests.append(dict(params))
+        environ = {'PATH_INFO': url.split('localhost', 1)[1], 'QUERY_STRING': urlencode(params)}
+        setup_testing_defaults(environ)
+        body = b''.join(self.simulator(environ, lambda status, headers: None))
+        return mock.Mock(json=lambda: json.loads(body), raise_for_status=lambda: None)
+
+    def test_polls_fetch_only_new_trades(self):
+        self.service.moex_base_urls = ['http://localhost']
+        time.sleep(0.05)
+        with mock.patch.object(self.service.session, 'get', side_effect=self._fetch):
+            first, _ = ingest_trades(self.service)
+            time.sleep(0.05)
+            second, last_price = ingest_trades(self.service)
+
+        cursor = TradeCursor.objects.get()
+        self.assertGreater(first, 0)
+        self.assertGreater(second, 0)
+        self.assertNotIn('tradeno', self.requests[0])
+        self.assertEqual(self.requests[-1]['next_trade'], 1)
+        bars = MinuteBar.objects.all()
+        self.assertEqual(sum(bar.trades for bar in bars), first + second)
+        self.assertEqual(max(bar.last_tradeno for bar in bars), cursor.tradeno)
+        self.assertIsNotNone(last_price)
+
+        totals = [(bar.value, bar.volume) for bar in bars]
+        expected = round(sum(value for value, _ in totals) / sum(volume for _, volume in totals), 2)
+        self.assertEqual(get_vwap(cursor.trade_date), expected)
+
+    def test_concurrent_polls_from_same_cursor_store_trades_once(self):
+        self.service.moex_base_urls = ['http://localhost']
+        TradeCursor.objects.create(name=CURSOR_NAME)
+        # Both polls read the cursor before either stored anything
+        stale = [(TradeCursor.objects.get(), False), (TradeCursor.objects.get(), False)]
+        time.sleep(0.05)
+        with mock.patch.object(self.service.session, 'get', side_effect=self._fetch), \
+                mock.patch.object(TradeCursor.objects, 'get_or_create', side_effect=stale):
+            first, _ = ingest_trades(self.service)
+            second, _ = ingest_trades(self.service)
+
+        cursor = TradeCursor.objects.get()
+        bars = MinuteBar.objects.all()
+        self.assertGreater(first, 0)
+        self.assertEqual(sum(bar.trades for bar in bars), first + second)
+        self.assertEqual(cursor.tradeno - min(bar.first_tradeno for bar in bars) + 1, first + second)
+
+    @mock.patch('price.trades.MAX_PAGES_PER_POLL', 1)
+    @mock.patch('price.trades.PAGE_SIZE', 5)
+    def test_capped_poll_returns_no_last_price(self):
+        self.service.moex_base_urls = ['http://localhost']
+        time.sleep(0.05)
+        with mock.patch.object(self.service.session, 'get', side_effect=self._fetch):
+            count, last_price = ingest_trades(self.service)
+
+        self.assertEqual(count, 5)
+        self.assertIsNone(last_price)
+
+
+def _record(msg, *args, level=logging.INFO, **extra):
+    record = logging.LogRecord('price', level, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+class LoggingPipelineTests(SimpleTestCase):
+    def test_json_formatter_keeps_template_and_extra_fields(self):
+        entry = json.loads(JsonFormatter().format(_record('Цена %s', 300.5, upstream='moex')))
+
+        self.assertEqual(entry['message'], 'Цена 300.5')
+        self.assertEqual(entry['template'], 'Цена %s')
+        self.assertEqual(entry['upstream'], 'moex')
+        self.assertEqual(entry['level'], 'INFO')
+
+    def test_rate_limit_counts_message_types_not_arguments(self):
+        rate_limit = RateLimitFilter(limit=2, window=60)
+        with mock.patch('price.logs.time.monotonic', return_value=100.0):
+            passed = [rate_limit.filter(_record('Using cached MOEX price: %s', price)) for price in range(5)]
+            other = rate_limit.filter(_record('Calculated P/B ratio: %s', 0.9))
+            error = rate_limit.filter(_record('Using cached MOEX price: %s', 1, level=logging.ERROR))
+        with mock.patch('price.logs.time.monotonic', return_value=161.0):
+            record = _record('Using cached MOEX price: %s', 6)
+            rate_limit.filter(record)
+
+        self.assertEqual(passed, [True, True, False, False, False])
+        self.assertTrue(other)
+        self.assertTrue(error)
+        self.assertEqual(record.suppressed, 3)
+
+    def test_queue_handler_is_configured_by_dict_config(self):
+        stream = io.StringIO()
+        logger = logging.getLogger('price.tests.dictconfig')
+        logging.config.dictConfig({
+            'version': 1,
+            'disable_existing_loggers': False,
+            'formatters': {'json': {'()': 'price.logs.JsonFormatter'}},
+            'handlers': {'queue': {'class': 'price.logs.QueueStreamHandler', 'formatter': 'json', 'stream': stream}},
+            'loggers': {logger.name: {'handlers': ['queue'], 'level': 'INFO', 'propagate': False}},
+        })
+        handler = logger.handlers[0]
+        self.addCleanup(logger.removeHandler, handler)
+        self.addCleanup(handler.close)
+
+        logger.info('Calculated P/B ratio: %s', 0.88)
+        handler.flush()
+
+        self.assertEqual(json.loads(stream.getvalue())['message'], 'Calculated P/B ratio: 0.88')
+
+    def test_queue_handler_formats_on_listener_thread(self):
+        stream = io.StringIO()
+        handler = QueueStreamHandler(stream)
+        handler.setFormatter(JsonFormatter())
+        self.addCleanup(handler.close)
+
+        with mock.patch.object(JsonFormatter, 'format', autospec=True,
+                               side_effect=lambda formatter, record: threading.current_thread().name) as mocked:
+            handler.handle(_record('Sent price info to user %s', 777))
+            handler.flush()
+
+        mocked.assert_called_once()
+        self.assertEqual(stream.getvalue().strip(), handler._listener.name)
+        self.assertNotEqual(stream.getvalue().strip(), threading.current_thread().name)
+
+
+class ProcessThreadTests(SimpleTestCase):
+    def test_forked_child_starts_its_own_thread(self):
+        stop = threading.Event()
+        self.addCleanup(stop.set)
+        worker = ProcessThread(stop.wait, 'test-worker')
+        self.assertTrue(worker.ensure_started())
+        self.assertFalse(worker.ensure_started())
+
+        read_end, write_end = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            started = not worker.is_running and worker.ensure_started()
+            os.write(write_end, b'1' if started else b'0')
+            os._exit(0)
+        os.close(write_end)
+        os.waitpid(pid, 0)
+
+        self.assertEqual(os.read(read_end, 1), b'1')
+        os.close(read_end)
+        self.assertTrue(worker.is_running)
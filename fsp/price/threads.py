@@ -0,0 +1,63 @@
+"""Per-process background threads for code running in forked workers.
+
+Threads do not survive fork: a gunicorn worker forked from a master that had
+started, say, the history writer inherits the thread object but not the
+thread, and possibly a lock some other thread held at fork time. Every
+``ProcessThread`` is reset in the child right after fork, so the next
+``ensure_started`` starts a fresh thread there.
+"""
+import os
+import threading
+import weakref
+from typing import Callable, Optional
+
+_instances = weakref.WeakSet()
+
+
+class ProcessThread:
+    """Daemon thread started on demand, once per process.
+
+    ``on_start`` runs (under the start lock) before each start, so the owner
+    can replace state inherited from the parent, such as its queue.
+    """
+
+    def __init__(self, target: Callable[[], None], name: str, on_start: Optional[Callable[[], None]] = None):
+        self.target = target
+        self.name = name
+        self.on_start = on_start
+        self._reset()
+        _instances.add(self)
+
+    def _reset(self) -> None:
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def ensure_started(self) -> bool:
+        """Start the thread unless it runs in this process, True if started now"""
+        if self.is_running:
+            return False
+        with self._lock:
+            if self.is_running:
+                return False
+            if self.on_start is not None:
+                self.on_start()
+            self._thread = threading.Thread(target=self.target, name=self.name, daemon=True)
+            self._thread.start()
+        return True
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+def _after_fork_in_child() -> None:
+    for instance in list(_instances):
+        instance._reset()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -0,0 +1,195 @@
+"""Incremental ingestion of SBER trades from ISS into minute bars.
+
+Every poll asks ISS only for trades after the last ingested trade number
+(``tradeno`` + ``next_trade=1``), which is persisted in ``TradeCursor``
+together with the bars in one transaction, so a poll downloads just the new
+rows and a crash never double counts. The cursor only advances from the value
+the poll started with, so two processes polling at once never both fold the
+same trades. The bars give minute-level history and the session VWAP.
+"""
+import datetime as dt
+import logging
+import time
+from collections import namedtuple
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import MinuteBar, TradeCursor
+
+logger = logging.getLogger('price')
+
+TRADES_PATH = '/iss/engines/stock/markets/shares/boards/TQBR/securities/SBER/trades.json'
+TRADE_COLUMNS = ('TRADENO', 'TRADEDATE', 'TRADETIME', 'PRICE', 'QUANTITY', 'VALUE')
+CURSOR_NAME = 'sber_tqbr'
+# ISS returns at most this many trades per request
+PAGE_SIZE = 5000
+# A poll after a long pause catches up over several refreshes
+MAX_PAGES_PER_POLL = 10
+
+Trade = namedtuple('Trade', 'tradeno timestamp price quantity value')
+
+
+def parse_trades(data: Dict[str, Any]) -> List[Trade]:
+    block = data['trades']
+    index = {name: block['columns'].index(name) for name in TRADE_COLUMNS}
+    trades = []
+    for row in block['data']:
+        moment = dt.datetime.combine(dt.date.fromisoformat(row[index['TRADEDATE']]),
+                                     dt.time.fromisoformat(row[index['TRADETIME']]))
+        trades.append(Trade(int(row[index['TRADENO']]), timezone.make_aware(moment), float(row[index['PRICE']]),
+                            int(row[index['QUANTITY']]), float(row[index['VALUE']])))
+    return sorted(trades)
+
+
+def aggregate_minutes(trades: List[Trade]) -> Dict[dt.datetime, Dict[str, Any]]:
+    """OHLC, volume and value per minute of trades sorted by trade number"""
+    bars: Dict[dt.datetime, Dict[str, Any]] = {}
+    for trade in trades:
+        minute = trade.timestamp.replace(second=0, microsecond=0)
+        bar = bars.get(minute)
+        if bar is None:
+            bars[minute] = {
+                'open': trade.price, 'high': trade.price, 'low': trade.price, 'close': trade.price,
+                'volume': trade.quantity, 'value': trade.value, 'trades': 1,
+                'first_tradeno': trade.tradeno, 'last_tradeno': trade.tradeno,
+            }
+            continue
+        bar['high'] = max(bar['high'], trade.price)
+        bar['low'] = min(bar['low'], trade.price)
+        bar['close'] = trade.price
+        bar['volume'] += trade.quantity
+        bar['value'] += trade.value
+        bar['trades'] += 1
+        bar['last_tradeno'] = trade.tradeno
+    return bars
+
+
+def _merge(bar: MinuteBar, values: Dict[str, Any]) -> None:
+    """Fold newer trades of the same minute into a stored bar"""
+    bar.high = max(bar.high, values['high'])
+    bar.low = min(bar.low, values['low'])
+    bar.close = values['close']
+    bar.volume += values['volume']
+    bar.value += values['value']
+    bar.trades += values['trades']
+    bar.last_tradeno = values['last_tradeno']
+
+
+def store_trades(trades: List[Trade], cursor: TradeCursor) -> int:
+    """Add trades newer than the cursor to the bars and advance it atomically.
+
+    When another process has moved the stored cursor since ``cursor`` was
+    read, nothing is stored and ``cursor`` is reloaded instead.
+    """
+    if cursor.tradeno is not None:
+        trades = [trade for trade in trades if trade.tradeno > cursor.tradeno]
+    if not trades:
+        return 0
+
+    bars = aggregate_minutes(trades)
+    with transaction.atomic():
+        # Claim the range first: the update takes the row (SQLite: database)
+        # write lock, so a concurrent poll waits here and then matches nothing
+        claimed = TradeCursor.objects.filter(name=cursor.name, tradeno=cursor.tradeno).update(
+            tradeno=trades[-1].tradeno, trade_date=timezone.localtime(trades[-1].timestamp).date(),
+            updated_at=timezone.now())
+        if not claimed:
+            cursor.refresh_from_db()
+            logger.info('Trade cursor %s was advanced concurrently to %s', cursor.name, cursor.tradeno)
+            return 0
+
+        existing = {bar.timestamp: bar for bar in MinuteBar.objects.filter(timestamp__in=list(bars))}
+        updated = []
+        for minute, values in bars.items():
+            if minute in existing:
+                _merge(existing[minute], values)
+                updated.append(existing[minute])
+        MinuteBar.objects.bulk_update(
+            updated, ['high', 'low', 'close', 'volume', 'value', 'trades', 'last_tradeno'])
+        MinuteBar.objects.bulk_create(
+            [MinuteBar(timestamp=minute, **values) for minute, values in bars.items() if minute not in existing])
+
+    cursor.tradeno = trades[-1].tradeno
+    cursor.trade_date = timezone.localtime(trades[-1].timestamp).date()
+    return len(trades)
+
+
+def fetch_trades_page(service, tradeno: Optional[int]) -> Optional[Dict[str, Any]]:
+    """One ISS page of trades after ``tradeno`` (the day's first page when None).
+
+    Goes around ``_make_api_call``: every page has its own URL, keeping
+    validators and bodies for them would only fill the cache.
+    """
+    params = {'iss.meta': 'off', 'iss.only': 'trades', 'trades.columns': ','.join(TRADE_COLUMNS),
+              'limit': PAGE_SIZE}
+    if tradeno is not None:
+        params.update(tradeno=tradeno, next_trade=1)
+
+    for base_url in service.moex_base_urls:
+        url = f'{base_url}{TRADES_PATH}'
+        breaker = service.get_breaker(url)
+        if not breaker.allow():
+            continue
+        started = time.monotonic()
+        try:
+            response = service.session.get(url, params=params,
+                                           timeout=breaker.get_timeout(service.moex_request_timeout))
+            response.raise_for_status()
+            data = response.json()
+        except Exception as e:
+            breaker.record_failure()
+            logger.warning('ISS trades request to %s failed: %s', base_url, e)
+            continue
+        breaker.record_success(time.monotonic() - started)
+        return data
+    return None
+
+
+def ingest_trades(service) -> Tuple[int, Optional[float]]:
+    """Fetch trades after the cursor into minute bars, (new trades, last price).
+
+    The last price is None unless the poll caught up with the tape: after a
+    capped or failed poll the last stored trade may be hours old.
+    """
+    cursor, _ = TradeCursor.objects.get_or_create(name=CURSOR_NAME)
+    if cursor.trade_date is not None and cursor.trade_date != timezone.localdate():
+        prune_minute_bars()
+
+    total, last_price, caught_up = 0, None, False
+    for _ in range(MAX_PAGES_PER_POLL):
+        data = fetch_trades_page(service, cursor.tradeno)
+        if data is None:
+            break
+        trades = parse_trades(data)
+        total += store_trades(trades, cursor)
+        if trades:
+            last_price = trades[-1].price
+        if len(trades) < PAGE_SIZE:
+            caught_up = True
+            break
+    if total:
+        logger.info('Ingested %s trades up to %s%s', total, cursor.tradeno, '' if caught_up else ', catching up')
+    return total, last_price if caught_up else None
+
+
+def get_vwap(day: Optional[dt.date] = None) -> Optional[float]:
+    """Volume weighted average price over the local day (today by default)"""
+    day = day or timezone.localdate()
+    start = timezone.make_aware(dt.datetime.combine(day, dt.time.min))
+    totals = MinuteBar.objects.filter(timestamp__gte=start, timestamp__lt=start + dt.timedelta(days=1)).aggregate(
+        volume=Sum('volume'), value=Sum('value'))
+    if not totals['volume']:
+        return None
+    return round(totals['value'] / totals['volume'], 2)
+
+
+def prune_minute_bars() -> int:
+    deleted, _ = MinuteBar.objects.filter(
+        timestamp__lt=timezone.now() - dt.timedelta(days=settings.MINUTE_BARS_RETENTION_DAYS)).delete()
+    if deleted:
+        logger.info('Pruned %s minute bars', deleted)
+    return deleted
@@ -8,6 +8,14 @@ app_name = 'price'
 urlpatterns = [
     path('', views.index, name='index'),
     path('thesis/', views.thesis, name='thesis'),
+    path('scenario/', views.scenario, name='scenario'),
     path('api/current/', views.api_current_data, name='api_current_data'),
+    path('badge/', views.badge, name='badge'),
+    path('api/scenario/', views.api_scenario, name='api_scenario'),
+    path('api/history/export/', views.history_export, name='history_export'),
     path('api/health/', views.health_check, name='health_check'),
+    path('api/health/live/', views.liveness, name='liveness'),
+    path('ops/memory/', views.memory, name='memory'),
+    path('ops/profiles/', views.profiles, name='profiles'),
+    path('ops/profiles/<str:profile_id>/', views.profile_detail, name='profile_detail'),
 ]
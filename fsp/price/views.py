@@ -1,158 +1,310 @@
+import hashlib
 import logging
+import tracemalloc
+from functools import wraps
+
 from django.shortcuts import render
-from django.http import JsonResponse
-from django.contrib import messages
+from django.conf import settings
 from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
+from django.utils.cache import add_never_cache_headers, get_conditional_response
+from django.utils.crypto import constant_time_compare
 from django.views.decorators.cache import cache_page
 
+from .badges import BADGE_FORMATS, BadgeUnavailable, get_badge
+from .export import EXPORT_CHUNK_SIZE, EXPORT_FIELDS, EXPORT_FORMATS
+from .health import get_health_status
+from .memory import GROUP_BY, get_process_report, list_process_reports, memory_monitor, top_allocators
+from .microcache import REFRESH_HEADER, set_microcache_headers
+from .models import PriceHistory
+from .profiling import get_profile, list_profiles, to_collapsed
+from .scenarios import ScenarioError, get_scenario_json, parse_axis
 from .services import sber_service
 
 logger = logging.getLogger('price')
 
+# nginx lifetime of pages rendered without complete data
+INCOMPLETE_MAX_AGE = 5
+# Browser lifetime of badges, revalidated by ETag afterwards
+BADGE_MAX_AGE = 300
+
+
+def microcached(browser_max_age):
+    """Cache the response per snapshot version here and, via headers, in nginx.
+
+    A new snapshot changes the cache key, so neither cache outlives the data
+    the page was rendered from (see price.microcache). The decorated views
+    read no query parameters, so the key is the path alone and a query
+    string never forces a render.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            if request.headers.get(REFRESH_HEADER):
+                # nginx refreshes right after another process published new data
+                sber_service.load_snapshot()
+            try:
+                snapshot = sber_service.get_current_snapshot()
+            except Exception as e:
+                logger.error('No snapshot for %s: %s', request.path, e)
+                return add_never_cache_headers(view(request, *args, **kwargs))
+            if not snapshot.is_complete:
+                return set_microcache_headers(view(request, *args, **kwargs), browser_max_age, INCOMPLETE_MAX_AGE)
 
-@cache_page(30)  # Cache for 30 seconds
+            path_hash = hashlib.md5(request.path.encode()).hexdigest()
+            cache_key = f'microcache_{path_hash}_{snapshot.timestamp.timestamp()}'
+            response = cache.get(cache_key)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return add_never_cache_headers(response)
+                cache.set(cache_key, response, sber_service.get_current_data_timeout())
+            return set_microcache_headers(response, browser_max_age, sber_service.current_expires_in())
+        return wrapper
+    return decorator
+
+
+@microcached(browser_max_age=30)
 def index(request):
     """Main page showing current price evaluation"""
     try:
-        data = sber_service.get_current_data()
+        snapshot = sber_service.get_current_snapshot()
+        data = snapshot.as_dict()
         
         # Check if we have valid data
-        if data['moex_price'] is None or data['fair_price'] is None:
-            messages.error(request, 'Не удалось получить актуальные данные. Попробуйте позже.')
+        if not snapshot.is_complete:
             data = {
                 'moex_price': 'Н/Д',
                 'fair_price': 'Н/Д',
                 'fair_price_20_percent': 'Н/Д',
-                'price_score': 'неизвестно'
+                'price_score': 'неизвестно',
+                'error_message': 'Не удалось получить актуальные данные. Попробуйте позже.',
             }
         
-        logger.info('Index page loaded successfully')
+        logger.debug('Index page loaded successfully')
         return render(request, 'index.html', data)
         
     except Exception as e:
-        logger.error(f'Error in index view: {e}')
-        messages.error(request, 'Произошла ошибка при загрузке данных.')
+        logger.error('Error in index view: %s', e)
         return render(request, 'index.html', {
             'moex_price': 'Ошибка',
             'fair_price': 'Ошибка',
             'fair_price_20_percent': 'Ошибка',
-            'price_score': 'неизвестно'
+            'price_score': 'неизвестно',
+            'error_message': 'Произошла ошибка при загрузке данных.',
         })
 
 
-@cache_page(60)  # Cache for 1 minute
+@microcached(browser_max_age=60)
 def thesis(request):
     """Investment thesis page"""
     try:
-        data = sber_service.get_current_data()
+        snapshot = sber_service.get_current_snapshot()
         context = {
-            'moex_price': data['moex_price'] or 'Н/Д',
-            'pb': data['pb_ratio'] or 'Н/Д',
+            'moex_price': snapshot.moex_price or 'Н/Д',
+            'pb': snapshot.pb_ratio or 'Н/Д',
         }
         
-        logger.info('Thesis page loaded successfully')
+        logger.debug('Thesis page loaded successfully')
         return render(request, 'thesis.html', context)
         
     except Exception as e:
-        logger.error(f'Error in thesis view: {e}')
-        messages.error(request, 'Произошла ошибка при загрузке данных.')
+        logger.error('Error in thesis view: %s', e)
         return render(request, 'thesis.html', {
             'moex_price': 'Ошибка',
-            'pb': 'Ошибка'
+            'pb': 'Ошибка',
+            'error_message': 'Произошла ошибка при загрузке данных.',
         })
 
 
-@cache_page(15)  # Cache API for 15 seconds
+@microcached(browser_max_age=15)
 def api_current_data(request):
     """API endpoint for current data (for AJAX calls)"""
     try:
-        data = sber_service.get_current_data()
-        
-        # Handle timestamp conversion
-        timestamp = data.get('timestamp')
-        if hasattr(timestamp, 'isoformat'):
-            timestamp_str = timestamp.isoformat()
-        else:
-            timestamp_str = str(timestamp)
-        
-        response = JsonResponse({
-            'success': True,
-            'data': {
-                'moex_price': data['moex_price'],
-                'fair_price': data['fair_price'],
-                'fair_price_20_percent': data['fair_price_20_percent'],
-                'pb_ratio': data['pb_ratio'],
-                'price_score': data['price_score'],
-                'timestamp': timestamp_str
-            }
-        })
-        
-        # Add cache headers for better performance
-        response['Cache-Control'] = 'public, max-age=15'
-        return response
+        snapshot = sber_service.get_current_snapshot()
+        # Body is encoded once per refresh, not on every request
+        return HttpResponse(snapshot.api_json, content_type='application/json')
         
     except Exception as e:
-        logger.error(f'Error in API endpoint: {e}')
+        logger.error('Error in API endpoint: %s', e)
         return JsonResponse({
             'success': False,
             'error': 'Не удалось получить данные'
         }, status=500)
 
 
-def health_check(request):
-    """Health check endpoint for monitoring (simplified)"""
+def badge(request):
+    """Embeddable P/B badge, SVG or ?format=png, rendered once per value"""
+    badge_format = request.GET.get('format', 'svg')
+    if badge_format not in BADGE_FORMATS:
+        return JsonResponse({'success': False, 'error': f'Формат: {", ".join(BADGE_FORMATS)}'}, status=400)
+    if request.headers.get(REFRESH_HEADER):
+        sber_service.load_snapshot()
     try:
-        from django.db import connection
-        
-        checks = {}
-        overall_status = 'healthy'
-        
-        # Check database connection
-        try:
-            with connection.cursor() as cursor:
-                cursor.execute("SELECT 1")
-            checks['database'] = 'ok'
-        except Exception as e:
-            checks['database'] = f'error: {str(e)[:100]}'
-            overall_status = 'unhealthy'
-        
-        # Check cache
-        try:
-            test_key = 'health_check_test'
-            cache.set(test_key, 'ok', 10)
-            cache_working = cache.get(test_key) == 'ok'
-            cache.delete(test_key)
-            checks['cache'] = 'ok' if cache_working else 'error'
-            if not cache_working:
-                overall_status = 'degraded'
-        except Exception as e:
-            checks['cache'] = f'error: {str(e)[:100]}'
-            overall_status = 'degraded'
-        
-        # Test external APIs
+        snapshot = sber_service.get_current_snapshot()
+        rendered = get_badge(snapshot, badge_format)
+    except BadgeUnavailable as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=404)
+    except Exception as e:
+        logger.error('Error rendering badge: %s', e)
+        return JsonResponse({'success': False, 'error': 'Не удалось получить данные'}, status=500)
+
+    response = get_conditional_response(request, etag=rendered.etag)
+    if response is None:
+        response = HttpResponse(rendered.body, content_type=rendered.content_type)
+    response['ETag'] = rendered.etag
+    # Embedded from any site
+    response['Access-Control-Allow-Origin'] = '*'
+    response['Cross-Origin-Resource-Policy'] = 'cross-origin'
+    proxy_max_age = sber_service.current_expires_in() if snapshot.is_complete else INCOMPLETE_MAX_AGE
+    return set_microcache_headers(response, BADGE_MAX_AGE, proxy_max_age)
+
+
+@cache_page(60)  # Cache for 1 minute
+def scenario(request):
+    """What-if calculator page, the heatmap is loaded from the scenario API"""
+    return render(request, 'scenario.html', {
+        'shares': settings.SBER_STOCKS_QUANTITY,
+    })
+
+
+def api_scenario(request):
+    """Fair price, P/B and score over grids of prices, capital growth and share counts"""
+    try:
+        snapshot = sber_service.get_current_snapshot()
+    except Exception as e:
+        logger.error('No snapshot for scenario: %s', e)
+        snapshot = None
+    if snapshot is None or not snapshot.is_complete:
+        return JsonResponse({
+            'success': False,
+            'error': 'Не удалось получить данные о капитале'
+        }, status=503)
+
+    # Capital behind the published fair price, whichever fair value model made it
+    fair_price = snapshot.fair_price
+    own_capital = round(fair_price * settings.SBER_STOCKS_QUANTITY)
+    # Default price axis: from half to twice the current fair price
+    default_prices = f'{round(fair_price * 0.5, 2)}:{round(fair_price * 2, 2)}:151'
+
+    try:
+        prices = parse_axis(request.GET.get('price', default_prices), 'price')
+        growth_rates = parse_axis(request.GET.get('growth', '-0.2:0.3:51'), 'growth')
+        shares = parse_axis(request.GET.get('shares', str(settings.SBER_STOCKS_QUANTITY)), 'shares')
+        content = get_scenario_json(own_capital, prices, growth_rates, shares)
+    except ScenarioError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+    response = HttpResponse(content, content_type='application/json')
+    response['Cache-Control'] = 'public, max-age=600'
+    return response
+
+
+def history_export(request):
+    """Stream the full price/P/B history as CSV, NDJSON, Parquet or Arrow"""
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return JsonResponse({
+            'success': False,
+            'error': f'Неизвестный формат, доступны: {", ".join(EXPORT_FORMATS)}'
+        }, status=400)
+
+    serializer, content_type, extension, requires_pyarrow = EXPORT_FORMATS[export_format]
+    if requires_pyarrow:
         try:
-            test_data = sber_service.get_moex_price()
-            checks['moex_api'] = 'ok' if test_data is not None else 'error'
-        except Exception as e:
-            checks['moex_api'] = f'error: {str(e)[:100]}'
-            if overall_status == 'healthy':
-                overall_status = 'degraded'
-        
-        status = {
-            'status': overall_status,
-            'timestamp': timezone.now().isoformat(),
-            'checks': checks,
-            'version': '2.0.0-simplified'
-        }
-        
-        status_code = 200 if overall_status == 'healthy' else (503 if overall_status == 'unhealthy' else 200)
+            import pyarrow  # noqa: F401
+        except ImportError:
+            return JsonResponse({
+                'success': False,
+                'error': f'Формат {export_format} недоступен на сервере'
+            }, status=501)
+
+    # iterator() streams rows from the database cursor without caching the queryset
+    rows = PriceHistory.objects.order_by('timestamp').values_list(*EXPORT_FIELDS).iterator(
+        chunk_size=EXPORT_CHUNK_SIZE)
+    response = StreamingHttpResponse(serializer(rows), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="sber_history.{extension}"'
+    return response
+
+
+def liveness(request):
+    """Liveness probe: the worker answers, no I/O at all"""
+    return JsonResponse({'status': 'alive', 'timestamp': timezone.now().isoformat()})
+
+
+def health_check(request):
+    """Readiness probe built from status recorded on data refresh.
+
+    Never calls MOEX/CBR or the database; deep checks run out-of-band via
+    ``manage.py healthcheck``.
+    """
+    try:
+        status = get_health_status(sber_service.get_breakers(), sber_service.peek_current_snapshot())
+        status['timestamp'] = timezone.now().isoformat()
+        status['version'] = '2.0.0-simplified'
+
+        status_code = 503 if status['status'] == 'unhealthy' else 200
         return JsonResponse(status, status=status_code)
         
     except Exception as e:
-        logger.error(f'Health check failed: {e}')
+        logger.error('Health check failed: %s', e)
         return JsonResponse({
             'status': 'unhealthy',
             'error': str(e)[:200],
             'timestamp': timezone.now().isoformat()
         }, status=500)
+
+
+def ops_access_required(view):
+    """Staff session (ops paths run the auth middleware) or X-Ops-Token header"""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        token = request.headers.get('X-Ops-Token')
+        has_token = bool(token) and bool(settings.OPS_TOKEN) and constant_time_compare(token, settings.OPS_TOKEN)
+        user = getattr(request, 'user', None)
+        if not has_token and not (user is not None and user.is_active and user.is_staff):
+            return JsonResponse({'error': 'Доступ запрещен'}, status=403)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+@ops_access_required
+def profiles(request):
+    """Recently recorded profiles, newest first"""
+    return JsonResponse({'profiles': list_profiles()})
+
+
+@ops_access_required
+def profile_detail(request, profile_id):
+    """Collapsed stacks of a profile for flamegraph.pl or speedscope"""
+    mode = request.GET.get('mode', 'wall')
+    if mode not in ('wall', 'cpu'):
+        return JsonResponse({'error': 'mode должен быть wall или cpu'}, status=400)
+    profile = get_profile(profile_id)
+    if profile is None:
+        return JsonResponse({'error': 'Профиль не найден'}, status=404)
+    response = HttpResponse(to_collapsed(profile[mode]), content_type='text/plain; charset=utf-8')
+    response['Content-Disposition'] = f'inline; filename="profile_{profile_id}_{mode}.folded"'
+    return response
+
+
+@ops_access_required
+def memory(request):
+    """RSS, LocMemCache sizes and top allocators of this worker, summaries of all processes"""
+    group_by = request.GET.get('group', 'lineno')
+    if group_by not in GROUP_BY:
+        return JsonResponse({'error': f'group должен быть одним из: {", ".join(GROUP_BY)}'}, status=400)
+    try:
+        limit = min(max(int(request.GET.get('limit', '20')), 1), 200)
+    except ValueError:
+        return JsonResponse({'error': 'limit должен быть числом'}, status=400)
+
+    report = get_process_report(memory_monitor.name)
+    if tracemalloc.is_tracing():
+        report['top_allocators'] = top_allocators(limit, group_by)
+        report['growth_since_start'] = memory_monitor.growth_since_start(limit, group_by)
+    report['processes'] = list_process_reports()
+    return JsonResponse(report)
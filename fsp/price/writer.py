@@ -0,0 +1,96 @@
+"""Single-writer queue batching history inserts off the request path"""
+import atexit
+import logging
+import queue
+import threading
+import time
+from typing import Callable, List, Optional
+
+from django.db import connections, transaction
+
+from .models import PriceHistory
+from .rollups import update_rollups
+from .snapshot import CurrentSnapshot
+from .threads import ProcessThread
+
+logger = logging.getLogger('price')
+
+
+def write_history(snapshots: List[CurrentSnapshot]) -> None:
+    """Insert history records and fold them into rollups in one transaction"""
+    with transaction.atomic():
+        records = PriceHistory.objects.bulk_create([
+            PriceHistory(timestamp=snapshot.timestamp, moex_price=snapshot.moex_price,
+                         fair_price=snapshot.fair_price, pb_ratio=snapshot.pb_ratio)
+            for snapshot in snapshots
+        ])
+        for record in records:
+            update_rollups(record)
+
+
+class HistoryWriter:
+    """Per-process background thread owning all history writes.
+
+    Submitted snapshots are collected for up to ``flush_interval`` seconds (or
+    ``max_batch`` items) and written in a single transaction, so SQLite takes
+    the write lock once per batch and requests never wait for it.
+    """
+
+    def __init__(self, write: Callable[[List[CurrentSnapshot]], None] = write_history,
+                 max_batch: int = 100, flush_interval: float = 1.0):
+        self.write = write
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self._queue: queue.Queue = queue.Queue()
+        self._thread = ProcessThread(self._run, 'history-writer', on_start=self._on_start)
+        self._atexit_registered = False
+
+    def _on_start(self) -> None:
+        # The queue inherited from the parent belongs to its writer
+        self._queue = queue.Queue()
+        if not self._atexit_registered:
+            atexit.register(self.flush, 5.0)
+            self._atexit_registered = True
+
+    def submit(self, snapshot: CurrentSnapshot) -> None:
+        self._thread.ensure_started()
+        self._queue.put(snapshot)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until everything submitted so far is written"""
+        if not self._thread.is_running:
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def _collect(self, first) -> list:
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.max_batch and not isinstance(batch[-1], threading.Event):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect(self._queue.get())
+            snapshots = [item for item in batch if not isinstance(item, threading.Event)]
+            if snapshots:
+                try:
+                    self.write(snapshots)
+                    logger.info('Wrote %s history records', len(snapshots))
+                except Exception as e:
+                    logger.error('Could not write price history: %s', e)
+                    connections.close_all()
+            for item in batch:
+                if isinstance(item, threading.Event):
+                    item.set()
+
+
+history_writer = HistoryWriter()
@@ -0,0 +1,9 @@
+from django.contrib import admin
+
+from .models import DigestSubscription
+
+
+@admin.register(DigestSubscription)
+class DigestSubscriptionAdmin(admin.ModelAdmin):
+    list_display = ('chat_id', 'period', 'last_sent_on', 'created_at')
+    list_filter = ('period',)
@@ -1,11 +1,21 @@
 import os
+import functools
 import logging
+import random
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.error import BadRequest
 from telegram.ext import ApplicationBuilder, CallbackQueryHandler, CommandHandler, ContextTypes, MessageHandler, filters
 from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.utils import timezone
+from price.exchange import get_calendar
+from price.profiling import SamplingProfiler, top_functions
 from price.services import sber_service
+from telegrambot.charts import (
+    CHART_RANGES, DEFAULT_CHART_RANGE, ChartUnavailable, delete_file_id, get_chart_png, get_file_id,
+    get_chart_version, set_file_id,
+)
+from telegrambot.models import DigestSubscription
 
 logger = logging.getLogger('telegrambot')
 
@@ -51,6 +61,7 @@ THESIS_TEXT = (
 def get_main_keyboard() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup([
         [InlineKeyboardButton("📊 Текущая оценка", callback_data="current")],
+        [InlineKeyboardButton("📈 График P/B", callback_data="chart")],
         [InlineKeyboardButton("🧠 Методология P/B", callback_data="method")],
         [InlineKeyboardButton("📌 Инвесттезис", callback_data="thesis")],
     ])
@@ -64,6 +75,8 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "/info - текущая оценка\n"
         "/thesis - инвестиционный тезис\n"
         "/method - методология P/B\n"
+        "/chart - график цены и P/B\n"
+        "/subscribe - ежедневный дайджест\n"
         "/help - справка"
     )
     await update.message.reply_text(welcome_msg, reply_markup=get_main_keyboard())
@@ -81,9 +94,13 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "📊 /info - текущие данные по акции\n"
         "📌 /thesis - инвестиционный тезис\n"
         "🧠 /method - методология оценки P/B\n"
+        "📈 /chart [1m|3m|1y|all] - график цены и P/B\n"
+        "🗞 /subscribe [daily|weekly] - дайджест P/B по расписанию\n"
+        "🔕 /unsubscribe - отписаться от дайджеста\n"
         "❓ /help - эта справка\n\n"
         "🔄 Данные обновляются автоматически с кешированием\n"
-        "⏰ Кеш: 1 минута в торговые часы, 5 минут в остальное время\n\n"
+        "⏰ Во время торгов — каждые 2 минуты, при закрытой бирже — к началу следующей сессии\n"
+        f"🏛 Биржа: {get_calendar().describe()}\n\n"
         "📝 Оценки:\n"
         "🟢 дешево - P/B < 1.0\n"
         "🔵 справедливо - P/B 1.0-1.2\n"
@@ -103,6 +120,75 @@ async def method(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(METHOD_TEXT, reply_markup=get_main_keyboard())
 
 
+def _save_subscription(chat_id: int, period: str) -> None:
+    DigestSubscription.objects.update_or_create(chat_id=chat_id, defaults={'period': period})
+
+
+def _delete_subscription(chat_id: int) -> int:
+    deleted, _ = DigestSubscription.objects.filter(chat_id=chat_id).delete()
+    return deleted
+
+
+async def subscribe(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /subscribe [daily|weekly] command"""
+    period = (context.args[0].lower() if context.args else DigestSubscription.DAILY)
+    periods = dict(DigestSubscription.PERIOD_CHOICES)
+    if period not in periods:
+        await update.message.reply_text("Использование: /subscribe daily или /subscribe weekly")
+        return
+
+    await sync_to_async(_save_subscription)(update.effective_chat.id, period)
+    await update.message.reply_text(
+        f"🗞 Дайджест P/B будет приходить {periods[period]}.\n"
+        "Отписаться: /unsubscribe",
+        reply_markup=get_main_keyboard(),
+    )
+
+
+async def unsubscribe(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /unsubscribe command"""
+    deleted = await sync_to_async(_delete_subscription)(update.effective_chat.id)
+    text = "🔕 Подписка на дайджест отключена." if deleted else "Подписки на дайджест нет."
+    await update.message.reply_text(text, reply_markup=get_main_keyboard())
+
+
+async def chart(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /chart [range] command"""
+    chart_range = (context.args[0].lower() if context.args else DEFAULT_CHART_RANGE)
+    if chart_range not in CHART_RANGES:
+        await update.message.reply_text(f"Использование: /chart {'|'.join(CHART_RANGES)}")
+        return
+    await send_chart(update, context, chart_range)
+
+
+async def send_chart(update: Update, context: ContextTypes.DEFAULT_TYPE, chart_range: str = DEFAULT_CHART_RANGE):
+    """Send price and P/B chart, reusing the uploaded file while its chart version is current"""
+    message = update.effective_message
+    try:
+        version = await sync_to_async(get_chart_version)(chart_range)
+        file_id = await sync_to_async(get_file_id)(chart_range, version)
+        if file_id is not None:
+            try:
+                await message.reply_photo(photo=file_id, reply_markup=get_main_keyboard())
+                return
+            except BadRequest as error:
+                logger.warning("Cached chart file_id rejected: %s", error)
+                await sync_to_async(delete_file_id)(chart_range, version)
+
+        await context.bot.send_chat_action(chat_id=update.effective_chat.id, action="upload_photo")
+        png = await sync_to_async(get_chart_png)(chart_range, version)
+        sent = await message.reply_photo(photo=png, filename=f"sber_pb_{chart_range}.png",
+                                         reply_markup=get_main_keyboard())
+        await sync_to_async(set_file_id)(chart_range, version, sent.photo[-1].file_id)
+
+    except ChartUnavailable as e:
+        logger.warning("Chart unavailable: %s", e)
+        await message.reply_text("📈 График пока недоступен: недостаточно истории.")
+    except Exception as e:
+        logger.error("Error sending chart: %s", e)
+        await message.reply_text("❌ Не удалось построить график. Попробуйте позже.")
+
+
 async def send_current_info(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Send current price information"""
     message = update.effective_message
@@ -115,36 +201,39 @@ async def send_current_info(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await context.bot.send_chat_action(chat_id=update.effective_chat.id, action="typing")
 
         # Use sync_to_async to call Django service methods
-        get_current_data = sync_to_async(sber_service.get_current_data)
-        data = await get_current_data()
+        get_current_snapshot = sync_to_async(sber_service.get_current_snapshot)
+        snapshot = await get_current_snapshot()
 
         # Check if we have valid data
-        if data['moex_price'] is None or data['fair_price'] is None:
+        if not snapshot.is_complete:
             await message.reply_text(
                 "⚠️ Не удалось получить актуальные данные.\n"
                 "Возможно, биржа закрыта или есть проблемы с API."
             )
             return
 
-        emoji = SCORE_EMOJI.get(data['price_score'], '⚪')
+        emoji = SCORE_EMOJI.get(snapshot.price_score, '⚪')
 
         server_now = timezone.localtime(timezone.now())
+        vwap_line = f"📉 VWAP дня: {snapshot.vwap} ₽ (P/B {snapshot.pb_vwap})\n" if snapshot.vwap is not None else ""
 
         msg = (
             f"📊 Данные по акции Сбербанка:\n\n"
-            f"💰 MOEX цена: {data['moex_price']} ₽\n"
-            f"⚖️ Справедливая цена: {data['fair_price']} ₽\n"
-            f"📈 Справедливая +20%: {data['fair_price_20_percent']} ₽\n"
-            f"📊 P/B коэффициент: {data['pb_ratio']}\n"
-            f"{emoji} Оценка: {data['price_score']}\n\n"
-            f"🕐 Обновлено: {server_now.strftime('%d.%m.%Y %H:%M')}"
+            f"💰 MOEX цена: {snapshot.moex_price} ₽\n"
+            f"⚖️ Справедливая цена: {snapshot.fair_price} ₽\n"
+            f"📈 Справедливая +20%: {snapshot.fair_price_20_percent} ₽\n"
+            f"📊 P/B коэффициент: {snapshot.pb_ratio}\n"
+            f"{vwap_line}"
+            f"{emoji} Оценка: {snapshot.price_score}\n\n"
+            f"🕐 Обновлено: {server_now.strftime('%d.%m.%Y %H:%M')}\n"
+            f"🏛 Биржа: {get_calendar().describe()}"
         )
 
         await message.reply_text(msg, reply_markup=get_main_keyboard())
-        logger.info(f"Sent price info to user {update.effective_user.id}")
+        logger.info('Sent price info to user %s', update.effective_user.id)
 
     except Exception as e:
-        logger.error(f"Error sending current info: {e}")
+        logger.error("Error sending current info: %s", e)
         await message.reply_text(
             "❌ Произошла ошибка при получении данных.\n"
             "Попробуйте позже или обратитесь к администратору."
@@ -157,10 +246,12 @@ async def handle_menu_action(update: Update, context: ContextTypes.DEFAULT_TYPE)
     try:
         await query.answer()
     except BadRequest as error:
-        logger.warning(f"Callback answer skipped: {error}")
+        logger.warning("Callback answer skipped: %s", error)
 
     if query.data == 'current':
         await send_current_info(update, context)
+    elif query.data == 'chart':
+        await send_chart(update, context)
     elif query.data == 'method':
         await query.message.reply_text(METHOD_TEXT, reply_markup=get_main_keyboard())
     elif query.data == 'thesis':
@@ -175,9 +266,54 @@ async def handle_unknown(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
 
+def get_admin_ids() -> set:
+    """Telegram user ids allowed to use admin commands (TELEGRAM_ADMIN_IDS)"""
+    return {int(user_id) for user_id in os.getenv("TELEGRAM_ADMIN_IDS", "").split(",") if user_id.strip()}
+
+
+def format_profile_summary(profiler: SamplingProfiler) -> str:
+    lines = [
+        f"⏱ Профиль {profiler.profile_id}: {profiler.duration * 1000:.0f} мс, "
+        f"CPU {sum(profiler.cpu.values()) / 1000:.0f} мс, {profiler.samples} выборок"
+    ]
+    for frame, wall_us in top_functions(profiler.wall, limit=5):
+        lines.append(f"• {frame} — {wall_us / 1000:.0f} мс")
+    return "\n".join(lines)
+
+
+def profiled(handler):
+    """Profile a sampled fraction of updates and ones armed by an admin with /profile"""
+    @functools.wraps(handler)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        armed = bool(context.user_data) and context.user_data.pop("profile_next", False)
+        sample_rate = settings.PROFILING_SAMPLE_RATE
+        if not armed and not (sample_rate and random.random() < sample_rate):
+            return await handler(update, context)
+
+        # All threads: database and HTTP work runs in the sync_to_async executor
+        with SamplingProfiler(f"bot {handler.__name__}", all_threads=True) as profiler:
+            result = await handler(update, context)
+        if armed and profiler.profile_id and update.effective_message:
+            await update.effective_message.reply_text(format_profile_summary(profiler))
+        return result
+    return wrapper
+
+
+async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /profile: profile the next update of this admin"""
+    if update.effective_user is None or update.effective_user.id not in get_admin_ids():
+        await handle_unknown(update, context)
+        return
+    context.user_data["profile_next"] = True
+    await update.message.reply_text(
+        "⏱ Следующая команда или кнопка будет профилирована.\n"
+        "Профили: /ops/profiles/ или manage.py profiles"
+    )
+
+
 async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle errors"""
-    logger.error(f"Update {update} caused error {context.error}")
+    logger.error("Update %s caused error %s", update, context.error)
     
     if update and update.message:
         await update.message.reply_text(
@@ -186,6 +322,12 @@ async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
 
 
+def get_api_base_url():
+    """Bot API base URL override, used by load tests against the simulator"""
+    api_base_url = os.getenv("TELEGRAM_API_BASE_URL")
+    return f"{api_base_url.rstrip('/')}/bot" if api_base_url else None
+
+
 def run_bot():
     """Run the Telegram bot"""
     token = os.getenv("TELEGRAM_BOT_TOKEN")
@@ -193,19 +335,27 @@ def run_bot():
         logger.error("TELEGRAM_BOT_TOKEN environment variable is not set!")
         raise RuntimeError("TELEGRAM_BOT_TOKEN environment variable is not set!")
     
-    logger.info(f"Initializing bot with token: {token[:10]}...")
+    logger.info("Initializing bot with token: %s...", token[:10])
     
     try:
         # Create application
-        app = ApplicationBuilder().token(token).build()
+        builder = ApplicationBuilder().token(token)
+        # Load tests point the bot at the local simulator (manage.py simulateupstream)
+        if get_api_base_url():
+            builder = builder.base_url(get_api_base_url())
+        app = builder.build()
         
         # Add command handlers
-        app.add_handler(CommandHandler("start", start))
-        app.add_handler(CommandHandler("info", info))
-        app.add_handler(CommandHandler("help", help_command))
-        app.add_handler(CommandHandler("thesis", thesis))
-        app.add_handler(CommandHandler("method", method))
-        app.add_handler(CallbackQueryHandler(handle_menu_action))
+        app.add_handler(CommandHandler("start", profiled(start)))
+        app.add_handler(CommandHandler("info", profiled(info)))
+        app.add_handler(CommandHandler("help", profiled(help_command)))
+        app.add_handler(CommandHandler("thesis", profiled(thesis)))
+        app.add_handler(CommandHandler("method", profiled(method)))
+        app.add_handler(CommandHandler("chart", profiled(chart)))
+        app.add_handler(CommandHandler("subscribe", profiled(subscribe)))
+        app.add_handler(CommandHandler("unsubscribe", profiled(unsubscribe)))
+        app.add_handler(CommandHandler("profile", profile_command))
+        app.add_handler(CallbackQueryHandler(profiled(handle_menu_action)))
         
         # Handle unknown commands
         app.add_handler(MessageHandler(filters.COMMAND, handle_unknown))
@@ -225,5 +375,5 @@ def run_bot():
         )
         
     except Exception as e:
-        logger.error(f"❌ Failed to start bot: {e}")
+        logger.error("❌ Failed to start bot: %s", e)
         raise
@@ -0,0 +1,118 @@
+"""Price and P/B history charts rendered to PNG for the bot"""
+import datetime as dt
+import io
+import logging
+from typing import Optional
+
+from django.core.cache import caches
+from django.utils import timezone
+
+from price.models import PriceRollup
+
+logger = logging.getLogger('telegrambot')
+
+# Range argument of /chart -> days of history (None for all) and rollup resolution
+CHART_RANGES = {'1m': 30, '3m': 90, '1y': 365, 'all': None}
+CHART_RESOLUTIONS = {'1m': PriceRollup.HOUR, '3m': PriceRollup.HOUR, '1y': PriceRollup.DAY, 'all': PriceRollup.DAY}
+DEFAULT_CHART_RANGE = '3m'
+# More points than pixels only costs rendering time
+MAX_CHART_POINTS = 1000
+# Cached charts are needed only until the next bucket starts a new version
+CHART_CACHE_TIMEOUTS = {PriceRollup.HOUR: 3600, PriceRollup.DAY: 24 * 3600}
+
+
+class ChartUnavailable(Exception):
+    """Chart can not be rendered: no history or no matplotlib"""
+
+
+def get_chart_version(chart_range: str) -> Optional[int]:
+    """Start of the latest rollup bucket plotted for the range.
+
+    Refreshes within that bucket only move its closing point, so a chart is
+    rendered and uploaded once per hour (1m, 3m) or day (1y, all) rather than
+    after every refresh.
+    """
+    bucket_start = PriceRollup.objects.filter(resolution=CHART_RESOLUTIONS[chart_range]).order_by(
+        '-bucket_start').values_list('bucket_start', flat=True).first()
+    return int(bucket_start.timestamp()) if bucket_start is not None else None
+
+
+def _cache_timeout(chart_range: str) -> int:
+    return CHART_CACHE_TIMEOUTS[CHART_RESOLUTIONS[chart_range]]
+
+
+def _cache_key(prefix: str, chart_range: str, version: Optional[int]) -> str:
+    return f'{prefix}_{chart_range}_{version}'
+
+
+def get_file_id(chart_range: str, version: Optional[int]) -> Optional[str]:
+    """Telegram file_id of an already uploaded chart"""
+    return caches['shared'].get(_cache_key('chart_file_id', chart_range, version))
+
+
+def set_file_id(chart_range: str, version: Optional[int], file_id: str) -> None:
+    caches['shared'].set(_cache_key('chart_file_id', chart_range, version), file_id, _cache_timeout(chart_range))
+
+
+def delete_file_id(chart_range: str, version: Optional[int]) -> None:
+    caches['shared'].delete(_cache_key('chart_file_id', chart_range, version))
+
+
+def get_chart_png(chart_range: str, version: Optional[int]) -> bytes:
+    """PNG for the range, rendered once per chart version"""
+    cache_key = _cache_key('chart_png', chart_range, version)
+    png = caches['shared'].get(cache_key)
+    if png is None:
+        png = render_chart(chart_range)
+        caches['shared'].set(cache_key, png, _cache_timeout(chart_range))
+    return png
+
+
+def render_chart(chart_range: str) -> bytes:
+    """Render price and P/B (with score bands) for the range to PNG"""
+    try:
+        import matplotlib
+        matplotlib.use('Agg')
+        from matplotlib.figure import Figure
+    except ImportError:
+        raise ChartUnavailable('matplotlib is not installed')
+
+    # Closing values of hourly/daily buckets instead of every raw record
+    buckets = PriceRollup.objects.filter(resolution=CHART_RESOLUTIONS[chart_range]).order_by('bucket_start')
+    days = CHART_RANGES[chart_range]
+    if days is not None:
+        buckets = buckets.filter(bucket_start__gte=timezone.now() - dt.timedelta(days=days))
+    rows = list(buckets.values_list('last_timestamp', 'price_last', 'pb_last'))
+    if len(rows) < 2:
+        raise ChartUnavailable('not enough history')
+
+    # Evenly thinned, the latest point is always kept
+    step = -(-len(rows) // MAX_CHART_POINTS)
+    rows = rows[::-1][::step][::-1]
+    timestamps = [timezone.localtime(timestamp) for timestamp, _, _ in rows]
+    prices = [price for _, price, _ in rows]
+    pb_ratios = [pb_ratio for _, _, pb_ratio in rows]
+
+    # Figure is used directly: pyplot keeps global state and is not thread safe
+    figure = Figure(figsize=(8, 5), dpi=100)
+    price_axes, pb_axes = figure.subplots(2, 1, sharex=True, gridspec_kw={'height_ratios': [3, 2]})
+    price_axes.plot(timestamps, prices, color='#212529', linewidth=1.2)
+    price_axes.set_ylabel('Цена, ₽')
+    price_axes.set_title(f'SBER: цена и P/B ({chart_range})')
+    price_axes.grid(alpha=0.3)
+
+    pb_axes.plot(timestamps, pb_ratios, color='#0d6efd', linewidth=1.2)
+    low, high = min(min(pb_ratios), 0.9), max(max(pb_ratios), 1.5)
+    for start, stop, color in [(low, 1.0, '#28a745'), (1.0, 1.2, '#007bff'),
+                               (1.2, 1.4, '#fd7e14'), (1.4, high, '#dc3545')]:
+        pb_axes.axhspan(start, stop, color=color, alpha=0.08)
+    pb_axes.set_ylim(low, high)
+    pb_axes.set_ylabel('P/B')
+    pb_axes.grid(alpha=0.3)
+    figure.autofmt_xdate()
+    figure.tight_layout()
+
+    output = io.BytesIO()
+    figure.savefig(output, format='png')
+    logger.info('Rendered %s chart from %s points', chart_range, len(rows))
+    return output.getvalue()
@@ -0,0 +1,110 @@
+"""Daily/weekly P/B digest, computed and rendered once per period"""
+import datetime as dt
+import logging
+from typing import Any, Dict, Optional
+
+from django.core.cache import caches
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from price.models import PriceHistory, PriceRollup
+from price.services import get_score
+
+from .bot import SCORE_EMOJI
+from .models import DigestSubscription
+
+logger = logging.getLogger('telegrambot')
+
+# Kept well past the period so that reruns and late sends reuse the same digest
+DIGEST_CACHE_TIMEOUT = 8 * 24 * 3600
+# Percentile of the current P/B is ranked against daily closes of this window
+PERCENTILE_WINDOW_DAYS = 365
+
+PERIOD_DAYS = {DigestSubscription.DAILY: 1, DigestSubscription.WEEKLY: 7}
+PERIOD_TITLES = {DigestSubscription.DAILY: 'Дневной', DigestSubscription.WEEKLY: 'Недельный'}
+
+
+def get_period_start(period: str, today: dt.date) -> dt.date:
+    """First day of the period containing ``today`` (weeks start on Monday)"""
+    if period == DigestSubscription.WEEKLY:
+        return today - dt.timedelta(days=today.weekday())
+    return today
+
+
+def _day_start(day: dt.date) -> dt.datetime:
+    return timezone.make_aware(dt.datetime.combine(day, dt.time()))
+
+
+def build_digest(period: str, today: dt.date) -> Optional[Dict[str, Any]]:
+    """Digest statistics, None without data.
+
+    Everything but the latest record comes from daily rollups: one row for
+    the previous close, seven for the week range and at most a year of rows
+    for the percentile of the current P/B among daily closes.
+    """
+    now_end = _day_start(today + dt.timedelta(days=1))
+    current = PriceHistory.objects.filter(timestamp__lt=now_end).order_by('-timestamp').first()
+    if current is None:
+        return None
+
+    days = PriceRollup.objects.filter(resolution=PriceRollup.DAY, bucket_start__lt=now_end)
+    previous = (days.filter(bucket_start__lt=_day_start(today - dt.timedelta(days=PERIOD_DAYS[period] - 1)))
+                .order_by('-bucket_start').values_list('pb_last', flat=True).first())
+    week = days.filter(bucket_start__gte=_day_start(today - dt.timedelta(days=6))).aggregate(
+        pb_min=Min('pb_min'), pb_max=Max('pb_max'), price_min=Min('price_min'), price_max=Max('price_max'))
+
+    year = days.filter(bucket_start__gte=_day_start(today - dt.timedelta(days=PERCENTILE_WINDOW_DAYS)))
+    total = year.count()
+    percentile = round(year.filter(pb_last__lte=current.pb_ratio).count() * 100 / total) if total else None
+
+    return {
+        'period': period,
+        'period_start': get_period_start(period, today),
+        'timestamp': current.timestamp,
+        'moex_price': current.moex_price,
+        'pb_ratio': current.pb_ratio,
+        'previous_pb_ratio': previous,
+        'week': week,
+        'percentile': percentile,
+    }
+
+
+def render_digest(digest: Dict[str, Any]) -> str:
+    """Message text of the digest, shared by all recipients"""
+    score = get_score(digest['pb_ratio'])
+    lines = [
+        f"🗞 {PERIOD_TITLES[digest['period']]} дайджест на {timezone.localtime(digest['timestamp']):%d.%m.%Y}\n",
+        f"💰 Цена MOEX: {digest['moex_price']} ₽",
+        f"📊 P/B: {digest['pb_ratio']} {SCORE_EMOJI.get(score, '⚪')} {score}",
+    ]
+    previous = digest['previous_pb_ratio']
+    if previous is not None:
+        label = 'вчера' if digest['period'] == DigestSubscription.DAILY else 'неделю назад'
+        change = digest['pb_ratio'] - previous
+        lines.append(f"↕️ {label.capitalize()}: {previous} ({change:+.2f})")
+    week = digest['week']
+    if week['pb_min'] is not None:
+        lines.append(f"📉📈 За 7 дней: P/B {week['pb_min']}–{week['pb_max']}, "
+                     f"цена {week['price_min']}–{week['price_max']} ₽")
+    if digest['percentile'] is not None:
+        lines.append(f"📐 Перцентиль P/B за год: {digest['percentile']}%")
+    return '\n'.join(lines)
+
+
+def get_digest_text(period: str, today: Optional[dt.date] = None) -> Optional[str]:
+    """Rendered digest for the current period, computed once and shared via cache"""
+    today = today or timezone.localdate()
+    cache_key = f'digest_{period}_{get_period_start(period, today).isoformat()}'
+    shared_cache = caches['shared']
+    text = shared_cache.get(cache_key)
+    if text is not None:
+        return text
+
+    digest = build_digest(period, today)
+    if digest is None:
+        logger.warning('No price history for the %s digest', period)
+        return None
+    text = render_digest(digest)
+    shared_cache.set(cache_key, text, DIGEST_CACHE_TIMEOUT)
+    logger.info('Built %s digest %s', period, cache_key)
+    return text
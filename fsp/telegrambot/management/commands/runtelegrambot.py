@@ -1,12 +1,15 @@
 import os
 import logging
 from django.core.management.base import BaseCommand
+from price.memory import memory_monitor
 from telegrambot.bot import run_bot
 
 logger = logging.getLogger('telegrambot')
 
 class Command(BaseCommand):
     help = 'Запуск Telegram бота'
+    # Checks load URLconf and every app; the bot serves no HTTP, skip them for faster startup
+    requires_system_checks = []
 
     def handle(self, *args, **options):
         # Проверяем наличие токена
@@ -21,6 +24,7 @@ class Command(BaseCommand):
             self.style.SUCCESS('🤖 Запуск Telegram бота...')
         )
         
+        memory_monitor.start('bot')
         try:
             run_bot()
         except KeyboardInterrupt:
@@ -28,7 +32,7 @@ class Command(BaseCommand):
                 self.style.WARNING('⏹️ Бот остановлен пользователем')
             )
         except Exception as e:
-            logger.error(f"Критическая ошибка бота: {e}")
+            logger.error("Критическая ошибка бота: %s", e)
             self.stdout.write(
                 self.style.ERROR(f'❌ Критическая ошибка: {e}')
             )
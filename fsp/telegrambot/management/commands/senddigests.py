@@ -0,0 +1,79 @@
+import asyncio
+import logging
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from telegrambot.bot import get_api_base_url
+from telegrambot.digest import get_digest_text, get_period_start
+from telegrambot.models import DigestSubscription
+
+logger = logging.getLogger('telegrambot')
+
+# Telegram allows about 30 messages per second to different chats
+MESSAGES_PER_SECOND = 25
+
+
+class Command(BaseCommand):
+    help = 'Рассылка дайджеста P/B подписанным чатам (запускать по cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--period', choices=[DigestSubscription.DAILY, DigestSubscription.WEEKLY],
+                            default=DigestSubscription.DAILY)
+        parser.add_argument('--dry-run', action='store_true', help='Только показать текст дайджеста')
+
+    def handle(self, *args, **options):
+        period = options['period']
+        today = timezone.localdate()
+        text = get_digest_text(period, today)
+        if text is None:
+            raise CommandError('❌ Нет данных в истории для дайджеста')
+
+        if options['dry_run']:
+            self.stdout.write(text)
+            return
+
+        token = os.getenv('TELEGRAM_BOT_TOKEN')
+        if not token:
+            raise CommandError('❌ TELEGRAM_BOT_TOKEN не установлен!')
+
+        period_start = get_period_start(period, today)
+        # Chats already served in this period are skipped, so a rerun resumes an interrupted fan-out
+        chat_ids = list(
+            DigestSubscription.objects.filter(period=period)
+            .exclude(last_sent_on=period_start)
+            .values_list('chat_id', flat=True)
+        )
+        sent, blocked = asyncio.run(send_to_chats(token, text, chat_ids))
+
+        DigestSubscription.objects.filter(chat_id__in=sent).update(last_sent_on=period_start)
+        DigestSubscription.objects.filter(chat_id__in=blocked).delete()
+        self.stdout.write(self.style.SUCCESS(
+            f'Отправлено: {len(sent)} из {len(chat_ids)}, удалено заблокировавших бота: {len(blocked)}'
+        ))
+
+
+async def send_to_chats(token, text, chat_ids):
+    """Send one pre-rendered text to all chats within the Bot API rate limit"""
+    from telegram import Bot
+    from telegram.error import Forbidden, RetryAfter, TelegramError
+
+    sent, blocked = [], []
+    kwargs = {'base_url': get_api_base_url()} if get_api_base_url() else {}
+    async with Bot(token, **kwargs) as bot:
+        for chat_id in chat_ids:
+            for _ in range(2):
+                try:
+                    await bot.send_message(chat_id=chat_id, text=text)
+                    sent.append(chat_id)
+                except RetryAfter as error:
+                    await asyncio.sleep(error.retry_after)
+                    continue
+                except Forbidden:
+                    blocked.append(chat_id)
+                except TelegramError as error:
+                    logger.warning('Could not send digest to %s: %s', chat_id, error)
+                break
+            await asyncio.sleep(1 / MESSAGES_PER_SECOND)
+    return sent, blocked
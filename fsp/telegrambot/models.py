@@ -0,0 +1,18 @@
+from django.db import models
+
+
+class DigestSubscription(models.Model):
+    """Chat subscribed to the scheduled P/B digest"""
+
+    DAILY = 'daily'
+    WEEKLY = 'weekly'
+    PERIOD_CHOICES = [(DAILY, 'ежедневно'), (WEEKLY, 'еженедельно')]
+
+    chat_id = models.BigIntegerField(unique=True)
+    period = models.CharField(max_length=10, choices=PERIOD_CHOICES, default=DAILY, db_index=True)
+    # Start of the last period the digest was delivered for, so reruns skip done chats
+    last_sent_on = models.DateField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.chat_id} ({self.period})'
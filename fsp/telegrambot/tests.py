@@ -1,9 +1,27 @@
 import datetime as dt
+import io
 from types import SimpleNamespace
 from unittest import IsolatedAsyncioTestCase
 from unittest.mock import AsyncMock, patch
 
-from telegrambot import bot
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from price.models import PriceHistory, PriceRollup
+from price.rollups import get_bucket_start, rebuild_rollups
+from price.snapshot import CurrentSnapshot
+from price.writer import write_history
+from telegrambot import bot, charts
+from telegrambot.digest import build_digest, get_digest_text
+from telegrambot.models import DigestSubscription
+
+TEST_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'test-default'},
+    'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'test-shared'},
+    'state': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'test-state'},
+}
 
 
 class TelegramBotCallbackTests(IsolatedAsyncioTestCase):
@@ -45,7 +63,7 @@ class TelegramBotCallbackTests(IsolatedAsyncioTestCase):
 
         def fake_sync_to_async(_func):
             async def runner():
-                return data
+                return CurrentSnapshot.from_dict(data)
             return runner
 
         with patch('telegrambot.bot.sync_to_async', side_effect=fake_sync_to_async):
@@ -79,7 +97,7 @@ class TelegramBotCallbackTests(IsolatedAsyncioTestCase):
 
         def fake_sync_to_async(_func):
             async def runner():
-                return data
+                return CurrentSnapshot.from_dict(data)
             return runner
 
         with patch('telegrambot.bot.sync_to_async', side_effect=fake_sync_to_async):
@@ -117,7 +135,7 @@ class TelegramBotCallbackTests(IsolatedAsyncioTestCase):
 
         def fake_sync_to_async(_func):
             async def runner():
-                return data
+                return CurrentSnapshot.from_dict(data)
             return runner
 
         with patch('telegrambot.bot.sync_to_async', side_effect=fake_sync_to_async):
@@ -125,3 +143,154 @@ class TelegramBotCallbackTests(IsolatedAsyncioTestCase):
 
         query.answer.assert_awaited_once()
         self.assertTrue(reply_text.await_count >= 1)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class DigestTests(TestCase):
+    def setUp(self):
+        caches['shared'].clear()
+        self.today = dt.date(2026, 3, 11)
+        records = []
+        for days_ago, pb_ratio in [(8, 0.8), (3, 0.9), (1, 0.95), (0, 1.05)]:
+            timestamp = timezone.make_aware(dt.datetime.combine(self.today - dt.timedelta(days=days_ago), dt.time(18)))
+            records.append(PriceHistory(timestamp=timestamp, moex_price=round(pb_ratio * 300, 2),
+                                        fair_price=300.0, pb_ratio=pb_ratio))
+        PriceHistory.objects.bulk_create(records)
+        rebuild_rollups()
+
+    def test_build_digest_compares_with_previous_day_and_week(self):
+        digest = build_digest(DigestSubscription.DAILY, self.today)
+
+        self.assertEqual(digest['pb_ratio'], 1.05)
+        self.assertEqual(digest['previous_pb_ratio'], 0.95)
+        self.assertEqual(digest['week']['pb_min'], 0.9)
+        self.assertEqual(digest['percentile'], 100)
+
+    def test_digest_text_is_rendered_once_per_period(self):
+        text = get_digest_text(DigestSubscription.WEEKLY, self.today)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_digest_text(DigestSubscription.WEEKLY, self.today + dt.timedelta(days=1)), text)
+        self.assertIn('Неделю назад: 0.8 (+0.25)', text)
+
+    def test_senddigests_skips_served_chats_and_drops_blocked(self):
+        DigestSubscription.objects.create(chat_id=1)
+        DigestSubscription.objects.create(chat_id=2)
+        DigestSubscription.objects.create(chat_id=3, last_sent_on=self.today)
+
+        async def fake_send(token, text, chat_ids):
+            self.assertEqual(sorted(chat_ids), [1, 2])
+            return [1], [2]
+
+        with patch('telegrambot.management.commands.senddigests.send_to_chats', side_effect=fake_send), \
+                patch('telegrambot.management.commands.senddigests.timezone.localdate', return_value=self.today), \
+                patch.dict('os.environ', {'TELEGRAM_BOT_TOKEN': '123:test'}):
+            call_command('senddigests', stdout=io.StringIO())
+
+        self.assertEqual(DigestSubscription.objects.get(chat_id=1).last_sent_on, self.today)
+        self.assertFalse(DigestSubscription.objects.filter(chat_id=2).exists())
+
+
+def _history_snapshot(timestamp, price):
+    return CurrentSnapshot.create(moex_price=price, fair_price=310.0, fair_price_20_percent=372.0,
+                                  pb_ratio=round(price / 310.0, 2), price_score='дешево', timestamp=timestamp)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ChartTests(TestCase):
+    def setUp(self):
+        caches['shared'].clear()
+        start = timezone.now() - dt.timedelta(days=10)
+        PriceHistory.objects.bulk_create([
+            PriceHistory(timestamp=start + dt.timedelta(days=day), moex_price=300.0 + day,
+                         fair_price=310.0, pb_ratio=round((300.0 + day) / 310.0, 2))
+            for day in range(10)
+        ])
+        rebuild_rollups()
+
+    def test_chart_is_rendered_once_per_version(self):
+        version = charts.get_chart_version('1m')
+
+        with patch('telegrambot.charts.render_chart', wraps=charts.render_chart) as mocked_render:
+            png = charts.get_chart_png('1m', version)
+            self.assertEqual(charts.get_chart_png('1m', version), png)
+
+        self.assertTrue(png.startswith(b'\x89PNG'))
+        self.assertEqual(mocked_render.call_count, 1)
+
+    def test_refresh_within_bucket_reuses_file_id(self):
+        latest = PriceHistory.objects.latest('timestamp')
+        hour = get_bucket_start(latest.timestamp, PriceRollup.HOUR)
+        version = charts.get_chart_version('1m')
+        charts.set_file_id('1m', version, 'uploaded')
+
+        write_history([_history_snapshot(hour + dt.timedelta(minutes=59), 320.0)])
+        self.assertEqual(charts.get_chart_version('1m'), version)
+        self.assertEqual(charts.get_file_id('1m', charts.get_chart_version('1m')), 'uploaded')
+
+        write_history([_history_snapshot(hour + dt.timedelta(hours=1), 321.0)])
+        self.assertNotEqual(charts.get_chart_version('1m'), version)
+        self.assertIsNone(charts.get_file_id('1m', charts.get_chart_version('1m')))
+
+    def test_chart_needs_history(self):
+        PriceRollup.objects.all().delete()
+
+        with self.assertRaises(charts.ChartUnavailable):
+            charts.render_chart('all')
+
+
+class SendChartTests(IsolatedAsyncioTestCase):
+    @override_settings(CACHES=TEST_CACHES)
+    async def test_uploaded_file_id_is_reused(self):
+        caches['shared'].clear()
+        reply_photo = AsyncMock(return_value=SimpleNamespace(photo=[SimpleNamespace(file_id='small'),
+                                                                    SimpleNamespace(file_id='large')]))
+        update = SimpleNamespace(
+            effective_message=SimpleNamespace(reply_photo=reply_photo),
+            effective_chat=SimpleNamespace(id=123),
+        )
+        context = SimpleNamespace(bot=SimpleNamespace(send_chat_action=AsyncMock()))
+
+        with patch('telegrambot.bot.sync_to_async', side_effect=lambda func: AsyncMock(side_effect=func)), \
+                patch('telegrambot.bot.get_chart_version', return_value=7), \
+                patch('telegrambot.bot.get_chart_png', return_value=b'png') as mocked_png:
+            await bot.send_chart(update, context, '3m')
+            await bot.send_chart(update, context, '3m')
+
+        mocked_png.assert_called_once_with('3m', 7)
+        self.assertEqual(reply_photo.await_args_list[0].kwargs['photo'], b'png')
+        self.assertEqual(reply_photo.await_args_list[1].kwargs['photo'], 'large')
+
+
+class ProfiledHandlerTests(IsolatedAsyncioTestCase):
+    @override_settings(CACHES=TEST_CACHES, PROFILING_SAMPLE_RATE=0)
+    async def test_admin_armed_update_is_profiled_once(self):
+        reply_text = AsyncMock()
+        update = SimpleNamespace(
+            message=SimpleNamespace(reply_text=reply_text),
+            effective_message=SimpleNamespace(reply_text=reply_text),
+            effective_user=SimpleNamespace(id=42),
+        )
+        context = SimpleNamespace(user_data={})
+        handler = AsyncMock(__name__='handler')
+
+        with patch.dict('os.environ', {'TELEGRAM_ADMIN_IDS': '42'}):
+            await bot.profile_command(update, context)
+        await bot.profiled(handler)(update, context)
+        await bot.profiled(handler)(update, context)
+
+        self.assertEqual(handler.await_count, 2)
+        # Confirmation of /profile and one profile summary
+        self.assertEqual(reply_text.await_count, 2)
+        self.assertIn('Профиль', reply_text.await_args_list[1].args[0])
+
+    async def test_profile_command_is_unknown_for_non_admins(self):
+        reply_text = AsyncMock()
+        update = SimpleNamespace(message=SimpleNamespace(reply_text=reply_text), effective_user=SimpleNamespace(id=1))
+        context = SimpleNamespace(user_data={})
+
+        with patch.dict('os.environ', {'TELEGRAM_ADMIN_IDS': '42'}):
+            await bot.profile_command(update, context)
+
+        self.assertNotIn('profile_next', context.user_data)
+        self.assertIn('Неизвестная команда', reply_text.await_args.args[0])